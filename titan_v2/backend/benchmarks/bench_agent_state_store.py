@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+agent状态存储基准：运行中titan.py进程持续更新状态，main.py进程同时轮询读取
+对比原实现（每次更新整文件重写JSON、每次读取重新解析，状态内嵌完整记忆）与SQLite WAL存储（状态只含记忆摘要）
+的每秒更新/读取次数，以及读取到的状态大小
+用法: python benchmarks/bench_agent_state_store.py [--seconds 3] [--agents 4] [--memory-size 20000]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from utils.agent_manager import AgentInfo, AgentManager
+
+AGENT_KEYS = ["planner", "assigner", "programmer", "analyst", "reviewer", "writer"]
+
+
+class JsonAgentManager:
+    """原实现：每次更新以indent=2重写整个文件，每次读取重新解析"""
+
+    def __init__(self, state_file):
+        self.state_file = state_file
+        self.agents = {}
+        self._load()
+
+    def _load(self):
+        if os.path.exists(self.state_file):
+            try:
+                with open(self.state_file, 'r', encoding='utf-8') as f:
+                    self.agents = {a['agent_id']: AgentInfo(**a) for a in json.load(f).get('agents', [])}
+            except ValueError:
+                pass  # 读到写入一半的文件
+
+    def _save(self):
+        with open(self.state_file, 'w', encoding='utf-8') as f:
+            json.dump({'agents': [asdict(a) for a in self.agents.values()], 'timestamp': time.time()}, f, ensure_ascii=False, indent=2)
+
+    def register_agent(self, agent_id, name, role_name, memory=""):
+        self.agents[agent_id] = AgentInfo(name, role_name, "idle", memory, agent_id)
+        self._save()
+
+    def publish_agent_memory(self, agent_id, status, entries, digest, size, records, reset=False):
+        agent = self.agents[agent_id]
+        delta = "".join(entry["content"] for entry in entries)
+        agent.status = status
+        agent.memory = delta if reset else agent.memory + delta
+        agent.memory_digest = digest
+        self._save()
+
+    def get_active_agents(self):
+        self._load()
+        return [asdict(a) for a in self.agents.values()]
+
+
+def make_manager(kind, path):
+    return JsonAgentManager(path + ".json") if kind == "json" else AgentManager(path + ".db")
+
+
+def writer(kind, path, agents, memory_size, seconds, counter):
+    """模拟titan.py：轮流更新agent状态并发布新增记忆记录，记忆增长到memory_size后重置"""
+    manager = make_manager(kind, path)
+    entry = {"role_name": "programmer", "role": "assistant", "content": "x" * 200}
+    records_per_reset = max(1, memory_size // len(entry["content"]))
+    updates = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        agent_key = AGENT_KEYS[updates % agents]
+        records = (updates // agents) % records_per_reset + 1
+        manager.publish_agent_memory(agent_key, "speaking", [entry], str(updates), records * len(entry["content"]),
+                                     records, reset=records == 1)
+        updates += 1
+    counter.value = updates
+
+
+def run(kind, path, agents, memory_size, seconds):
+    manager = make_manager(kind, path)
+    for agent_key in AGENT_KEYS[:agents]:
+        manager.register_agent(agent_key, agent_key, agent_key, "Waiting for Task")
+    counter = multiprocessing.Value("i", 0)
+    process = multiprocessing.Process(target=writer, args=(kind, path, agents, memory_size, seconds, counter))
+    process.start()
+    time.sleep(0.2)  # 等待写进程启动
+    reads = 0
+    payload_bytes = 0
+    started = time.perf_counter()
+    while process.is_alive():
+        payload_bytes += len(json.dumps(manager.get_active_agents(), ensure_ascii=False))
+        reads += 1
+    elapsed = time.perf_counter() - started
+    process.join()
+    return counter.value / seconds, reads / elapsed, payload_bytes / max(reads, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--agents", type=int, default=4)
+    parser.add_argument("--memory-size", type=int, default=20000)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    results = {}
+    for kind in ("json", "sqlite"):
+        updates, reads, payload = run(kind, os.path.join(work_dir, f"agent_states_{kind}"), args.agents, args.memory_size, args.seconds)
+        results[kind] = (updates, reads)
+        print(f"{kind:6s} updates/s={updates:10.0f} reads/s={reads:10.0f} state payload={payload / 1024:8.1f} KB")
+    print(f"speedup updates x{results['sqlite'][0] / max(results['json'][0], 1):.1f} "
+          f"reads x{results['sqlite'][1] / max(results['json'][1], 1):.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+取消延迟基准：测量从发送取消指令到worker回到空闲的耗时
+使用与titan.py相同的worker协议（WorkerStdinReader + CancellationMiddleware），模型调用替换为长时间阻塞的模拟请求：
+- cooperative: 阻塞在模型请求中，取消指令中止请求，worker立即返回
+- stuck: 任务忽略取消，超时后结束worker进程并重新拉起
+用法: python benchmarks/bench_cancel_latency.py [--runs 5] [--timeout 2]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BACKEND_DIR)
+
+from utils.titan_worker import TitanWorkerPool
+
+FAKE_WORKER = r'''
+import json, os, sys, time
+sys.path.insert(0, os.environ["BENCH_BACKEND_DIR"])
+from utils.cancellation import CancellationMiddleware, TaskCancelled, cancel_scope
+from utils.titan_worker import WorkerStdinReader, WORKER_READY_MARKER, WORKER_DONE_MARKER
+
+class SlowBackend:
+    _client = None
+
+def slow_request(messages, response_format=None, tools=None):
+    time.sleep(60)  # 模拟长时间的模型请求
+
+middleware = CancellationMiddleware(SlowBackend())
+reader = WorkerStdinReader()
+reader.start()
+print(WORKER_READY_MARKER, flush=True)
+while True:
+    request = reader.next_task()
+    if request is None:
+        break
+    token = reader.begin(request.get("task_id"))
+    status = "ok"
+    try:
+        print("用户: bench", flush=True)
+        if os.environ["BENCH_MODE"] == "stuck":
+            time.sleep(60)  # 不响应取消
+        else:
+            with cancel_scope(token):
+                middleware.run(slow_request, [])
+    except TaskCancelled:
+        status = "cancelled"
+    finally:
+        reader.end()
+    print(f"{WORKER_DONE_MARKER} {json.dumps({'task_id': request.get('task_id'), 'status': status})}", flush=True)
+'''
+
+
+async def measure(mode, runs, timeout, cancel_after):
+    script_path = os.path.join(tempfile.mkdtemp(), "fake_titan_worker.py")
+    with open(script_path, 'w', encoding='utf-8') as f:
+        f.write(FAKE_WORKER)
+    env = dict(os.environ, BENCH_BACKEND_DIR=os.path.abspath(BACKEND_DIR), BENCH_MODE=mode, PYTHONUNBUFFERED="1")
+    pool = TitanWorkerPool(1, sys.executable, script_path, os.path.dirname(script_path), env)
+    await pool.start()
+
+    async def ignore(_line):
+        pass
+
+    latencies, statuses = [], []
+    for i in range(runs):
+        worker = await pool.acquire()
+        task = asyncio.create_task(worker.run_task({"task_id": str(i), "task": "bench"}, on_output=ignore))
+        await asyncio.sleep(cancel_after)
+        latencies.append(await worker.cancel(timeout=timeout))
+        try:
+            statuses.append((await task).get("status"))
+        except RuntimeError:
+            statuses.append("killed")
+        pool.release(worker)
+    await pool.shutdown()
+    return latencies, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=2.0)
+    parser.add_argument("--cancel-after", type=float, default=0.5)
+    args = parser.parse_args()
+
+    for mode in ("cooperative", "stuck"):
+        started = time.perf_counter()
+        latencies, statuses = asyncio.run(measure(mode, args.runs, args.timeout, args.cancel_after))
+        print(f"{mode:12s} runs={args.runs} status={sorted(set(statuses))} "
+              f"cancel_to_idle avg={sum(latencies) / len(latencies) * 1000:.1f}ms max={max(latencies) * 1000:.1f}ms "
+              f"total={time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+上下文发布基准：对比每轮全量拼接记忆与ContextTracker增量发布
+用法: python benchmarks/bench_context_tracker.py [--rounds 400] [--record-size 2000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from utils.context_tracker import ContextTracker
+
+
+def make_record(content):
+    return SimpleNamespace(memory_record=SimpleNamespace(uuid=uuid.uuid4(), message=SimpleNamespace(content=content)))
+
+
+def run_full(records_per_round):
+    """原实现：每轮拼接全部记录并序列化整段内容"""
+    published = 0
+    started = time.perf_counter()
+    for context_records in records_per_round:
+        current_context = ''
+        for record in context_records:
+            current_context += record.memory_record.message.content
+        published += len(json.dumps({"memory": current_context}, ensure_ascii=False))
+    return time.perf_counter() - started, published
+
+
+def run_incremental(records_per_round):
+    """增量实现：只拼接和序列化新增记录"""
+    tracker = ContextTracker()
+    published = 0
+    started = time.perf_counter()
+    for context_records in records_per_round:
+        context = tracker.update("programmer", context_records)
+        published += len(json.dumps({"delta": context.delta, "digest": context.digest}, ensure_ascii=False))
+    return time.perf_counter() - started, published
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=400)
+    parser.add_argument("--record-size", type=int, default=2000)
+    args = parser.parse_args()
+
+    # 每轮新增一条用户消息和一条回复，模拟持续增长的对话
+    records = []
+    records_per_round = []
+    for i in range(args.rounds):
+        records.append(make_record(f"用户{i}:" + "x" * args.record_size))
+        records.append(make_record(f"programmer{i}:" + "y" * args.record_size))
+        records_per_round.append(list(records))
+
+    full_seconds, full_bytes = run_full(records_per_round)
+    incremental_seconds, incremental_bytes = run_incremental(records_per_round)
+    print(f"rounds={args.rounds} record_size={args.record_size}")
+    print(f"full        : {full_seconds * 1000:9.1f} ms  published {full_bytes / 1024 / 1024:9.1f} MB")
+    print(f"incremental : {incremental_seconds * 1000:9.1f} ms  published {incremental_bytes / 1024 / 1024:9.1f} MB")
+    print(f"speedup     : {full_seconds / max(incremental_seconds, 1e-9):9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+CSV分页预览基准：大文件上对比整文件读取解析（原文件查看器的做法）与CsvPreviewCache按页读取
+- full: 读入整个文件并用csv模块解析全部行
+- build: 首次请求构建缓存（arrow: Arrow IPC文件；index: 稀疏行偏移索引）
+- page: 缓存建好后在随机位置取一页（200行，3列）
+每种引擎在单独的子进程中执行，统计延迟与峰值RSS的增量
+用法: python benchmarks/bench_csv_preview.py [--rows 2000000] [--pages 50]
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import utils.csv_preview as csv_preview
+
+COLUMNS = ["coupon_id", "cust_id", "status", "issue_date", "expire_date", "discount_amount", "coupon_type"]
+
+
+def generate(path, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for i in range(rows):
+            writer.writerow([f"CP{i:08d}", 1000000 + i % 5000, "已用" if i % 3 else "可用", "2025/11/20",
+                             "2025/11/27", f"{i % 97 / 3:.1f}", "cash" if i % 2 else "discount"])
+
+
+def rss_mb(baseline):
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline) / 1024
+
+
+def run_engine(engine, path, pages):
+    if engine == "full":
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started = time.perf_counter()
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            rows = list(csv.reader(f))
+        return {"engine": engine, "seconds": time.perf_counter() - started, "rows": len(rows) - 1,
+                "rss_mb": rss_mb(baseline)}
+    if engine == "index":
+        csv_preview._pyarrow = False
+    elif csv_preview._import_pyarrow() is None:
+        return {"engine": engine, "skipped": "pyarrow not installed"}
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = csv_preview.CsvPreviewCache(cache_dir)
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started = time.perf_counter()
+        total = cache.page(path, 0, 1)["total_rows"]
+        build = time.perf_counter() - started
+        build_rss = rss_mb(baseline)
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        random.seed(0)
+        latencies = []
+        for _ in range(pages):
+            started = time.perf_counter()
+            cache.page(path, random.randrange(total), 200, ["coupon_id", "status", "discount_amount"])
+            latencies.append(time.perf_counter() - started)
+        return {"engine": engine, "build": build, "build_rss_mb": build_rss, "rows": total,
+                "p50": statistics.median(latencies), "max": max(latencies), "rss_mb": rss_mb(baseline)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000000)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--path")
+    parser.add_argument("--engine", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.engine:
+        print(json.dumps(run_engine(args.engine, args.path, args.pages)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.path
+        if not path:
+            path = os.path.join(tmp, "large.csv")
+            generate(path, args.rows)
+        print(f"file: {path} ({os.path.getsize(path) / 1024 / 1024:.0f} MB)")
+        for engine in ("full", "arrow", "index"):
+            output = subprocess.run([sys.executable, __file__, "--engine", engine, "--path", path,
+                                     "--pages", str(args.pages)], capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            if "skipped" in result:
+                print(f"{engine:6s} skipped: {result['skipped']}")
+            elif engine == "full":
+                print(f"{engine:6s} rows={result['rows']} parse={result['seconds'] * 1000:9.1f}ms "
+                      f"peak rss +{result['rss_mb']:8.1f}MB")
+            else:
+                print(f"{engine:6s} rows={result['rows']} build={result['build'] * 1000:9.1f}ms "
+                      f"(peak rss +{result['build_rss_mb']:6.1f}MB) page p50={result['p50'] * 1000:7.2f}ms "
+                      f"max={result['max'] * 1000:7.2f}ms peak rss while paging +{result['rss_mb']:6.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
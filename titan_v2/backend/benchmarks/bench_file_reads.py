@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+/api/file 读取基准：在几百MB的文件上对比原实现（整文件读入字符串并序列化为JSON）与分段读取
+每种读取方式在单独的子进程中执行，统计延迟与峰值RSS的增量（ru_maxrss）
+- legacy: 原实现，read()整个文件后json.dumps
+- head: 默认分页（开头一页，在换行处截断）
+- bytes: 文件中间的一段字节范围
+- lines_cold / lines_warm: 文件中间的行范围，首次（构建稀疏行索引）与再次请求
+- tail: 最后1000行
+- stream: 分块迭代整个文件（StreamingResponse路径）
+用法: python benchmarks/bench_file_reads.py [--size-mb 300] [--path 已有文件]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from utils.file_metadata import sniff_file
+from utils.file_reader import read_bytes, read_lines, read_tail, iter_range
+
+MODES = ("legacy", "head", "bytes", "lines_cold", "lines_warm", "tail", "stream")
+PAGE_BYTES = 1024 * 1024
+
+
+def generate(path, size_mb):
+    row = "2024-01-01,用户{0},coupon_{0},{1:.2f},已核销\n"
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("date,user,coupon,amount,status\n")
+        written, i = 0, 0
+        while written < size_mb * 1024 * 1024:
+            lines = "".join(row.format(i + j, (i + j) % 997 / 7) for j in range(10000))
+            f.write(lines)
+            written += len(lines.encode('utf-8'))
+            i += 10000
+
+
+def run_mode(mode, path):
+    size = os.path.getsize(path)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    if mode == "legacy":
+        with open(path, "r", encoding="utf-8") as f:
+            content = f.read()
+        payload = json.dumps({"filename": path, "content": content, "size": size})
+    else:
+        encoding = sniff_file(path).encoding
+        if mode == "head":
+            payload = json.dumps(read_bytes(path, 0, PAGE_BYTES, encoding, align_lines=True))
+        elif mode == "bytes":
+            payload = json.dumps(read_bytes(path, size // 2, PAGE_BYTES, encoding))
+        elif mode in ("lines_cold", "lines_warm"):
+            # 大约位于文件中间的行
+            middle = size // 2 // 50
+            if mode == "lines_warm":
+                read_lines(path, middle, 1000, encoding, PAGE_BYTES)
+                started = time.perf_counter()
+            payload = json.dumps(read_lines(path, middle, 1000, encoding, PAGE_BYTES))
+        elif mode == "tail":
+            payload = json.dumps(read_tail(path, 1000, encoding, PAGE_BYTES))
+        else:
+            payload = sum(len(chunk) for chunk in iter_range(path))
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"mode": mode, "seconds": elapsed, "rss_mb": (peak - baseline) / 1024}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=300)
+    parser.add_argument("--path")
+    parser.add_argument("--mode", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.path)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.path
+        if not path:
+            path = os.path.join(tmp, "large.csv")
+            generate(path, args.size_mb)
+        print(f"file: {path} ({os.path.getsize(path) / 1024 / 1024:.0f} MB)")
+        for mode in MODES:
+            output = subprocess.run([sys.executable, __file__, "--mode", mode, "--path", path],
+                                    capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{mode:11s} latency={result['seconds'] * 1000:9.1f}ms peak rss +{result['rss_mb']:8.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
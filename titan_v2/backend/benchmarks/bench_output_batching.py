@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+titan输出帧合并基准：回放backend/logs中的运行日志（外加一段token流），对比逐行发送与OutputBatcher合并发送
+- API端：每帧一次打印（输出到/dev/null）与一次入队，统计帧数、帧/秒、CPU时间
+- 客户端：模拟Workbench的onmessage处理（token帧解析JSON并拼接，文本帧追加到输出列表并重新渲染），统计CPU时间
+日志行按突发方式到达（每行之间让出一次事件循环），token每--token-interval秒一个
+用法: python benchmarks/bench_output_batching.py [--logs logs] [--tokens 2000] [--batch-ms 20]
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from utils.output_batcher import OutputBatcher, text_frames
+from utils.titan_events import make_event
+from utils.token_stream import TOKEN_PREFIX
+
+
+def load_events(log_dir, tokens):
+    events = []
+    for path in sorted(glob.glob(os.path.join(log_dir, "*.log"))):
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            events.extend(make_event("log", line.rstrip("\n")) for line in f)
+    token_events = [make_event("token", agent="programmer", round_index=1, delta="tok ") for _ in range(tokens)]
+    return events, token_events
+
+
+def client_cpu(frames):
+    """模拟前端处理：token帧拼接到流式输出，其他帧追加到输出列表（每帧复制一次列表，相当于setState重新渲染）"""
+    started = time.process_time()
+    outputs = []
+    streaming = ""
+    for frame in frames:
+        if frame.startswith(TOKEN_PREFIX):
+            token = json.loads(frame[len(TOKEN_PREFIX) + 1:])
+            streaming = streaming + token["delta"]
+        else:
+            streaming = ""
+            outputs = outputs + [frame]
+    return time.process_time() - started
+
+
+async def run(events, token_events, batch_ms, batch_bytes, token_interval):
+    frames = []
+    devnull = open(os.devnull, 'w')
+
+    async def publish(batch):
+        lines = [f"[TITAN OUTPUT][default] {event['payload'].get('text', '')}" for event in batch if event["kind"] != "token"]
+        if lines:
+            devnull.write("\n".join(lines) + "\n")
+        frames.extend(text_frames(batch))
+
+    batcher = OutputBatcher(publish, max_delay=batch_ms / 1000, max_bytes=batch_bytes)
+    started_wall, started_cpu = time.perf_counter(), time.process_time()
+    for event in events:
+        await batcher.add(event)
+        await asyncio.sleep(0)  # 管道逐行读取
+    for event in token_events:
+        await batcher.add(event)
+        await asyncio.sleep(token_interval)
+    await batcher.close()
+    wall, cpu = time.perf_counter() - started_wall, time.process_time() - started_cpu
+    devnull.close()
+    return len(frames), wall, cpu, client_cpu(frames)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logs", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'logs'))
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--token-interval", type=float, default=0.0005)
+    parser.add_argument("--batch-ms", type=float, default=20)
+    parser.add_argument("--batch-bytes", type=int, default=64 * 1024)
+    args = parser.parse_args()
+
+    events, token_events = load_events(args.logs, args.tokens)
+    print(f"events: {len(events)} log lines + {len(token_events)} tokens")
+    results = {}
+    for name, batch_ms in (("per-line", 0), ("batched", args.batch_ms)):
+        frames, wall, cpu, client = asyncio.run(run(events, token_events, batch_ms, args.batch_bytes, args.token_interval))
+        results[name] = (frames, client)
+        print(f"{name:9s} frames={frames:6d} frames/s={frames / wall:9.0f} api cpu={cpu * 1000:8.1f}ms "
+              f"client cpu={client * 1000:8.1f}ms wall={wall:6.2f}s")
+    print(f"frames x{results['per-line'][0] / max(results['batched'][0], 1):.1f} fewer, "
+          f"client cpu x{results['per-line'][1] / max(results['batched'][1], 1e-9):.1f} lower")
+
+
+if __name__ == "__main__":
+    main()
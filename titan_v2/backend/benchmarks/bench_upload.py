@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+上传基准：大文件上传期间事件循环的最大停顿（代表WebSocket推送被阻塞的时长），以及重复上传的开销
+- legacy: 原实现，在协程中同步shutil.copyfileobj
+- chunked: UploadStore，每1MB通过asyncio.to_thread写入并计算哈希
+- reupload: 客户端给出sha256，内容已存在时不传输数据，只在工作区创建副本（支持时为reflink）
+事件循环中另有一个每5ms唤醒一次的协程，记录实际唤醒间隔超出5ms的最大值
+用法: python benchmarks/bench_upload.py [--size-mb 200]
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from utils.upload_store import UploadStore
+
+WRITE_BYTES = 1024 * 1024
+
+
+async def watch_loop(stop, lags):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.005)
+        lags.append(time.perf_counter() - started - 0.005)
+
+
+async def run(mode, source, workspace, sha256):
+    stop = asyncio.Event()
+    lags = []
+    watcher = asyncio.create_task(watch_loop(stop, lags))
+    await asyncio.sleep(0.02)
+    store = UploadStore(workspace)
+    started = time.perf_counter()
+    source.seek(0)
+    if mode == "legacy":
+        with open(os.path.join(workspace, "legacy.bin"), "wb") as buffer:
+            shutil.copyfileobj(source, buffer)
+    elif mode == "chunked":
+        info = await asyncio.to_thread(store.init, "data.bin", None)
+        session = store.get(info["upload_id"])
+        while True:
+            data = source.read(WRITE_BYTES)
+            if not data:
+                break
+            await asyncio.to_thread(store.append, session, data)
+        await asyncio.to_thread(store.complete, session)
+    else:
+        result = await asyncio.to_thread(store.init, "again.bin", None, sha256)
+        assert result["deduplicated"]
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await watcher
+    return elapsed, max(lags) if lags else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workspace, tempfile.TemporaryFile() as source:
+        hasher = hashlib.sha256()
+        for _ in range(args.size_mb):
+            block = os.urandom(1024 * 1024)
+            hasher.update(block)
+            source.write(block)
+        sha256 = hasher.hexdigest()
+        for mode in ("legacy", "chunked", "reupload"):
+            elapsed, lag = asyncio.run(run(mode, source, workspace, sha256))
+            print(f"{mode:9s} {args.size_mb} MB in {elapsed * 1000:8.1f}ms, max event loop stall {lag * 1000:8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
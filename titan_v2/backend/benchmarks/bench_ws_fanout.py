@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+WebSocket广播基准：大量客户端中混有慢速客户端时，正常客户端收到每条消息的延迟
+- sequential: 原实现，广播时依次await每个连接的send_text
+- queued: 每个连接一个有界发送队列（ClientSendQueue），广播只入队
+模拟的连接只记录收到时间，慢速客户端每帧耗时--slow-delay秒
+用法: python benchmarks/bench_ws_fanout.py [--clients 10,100,500] [--slow 2] [--messages 200] [--policy coalesce]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from utils.ws_fanout import ClientSendQueue
+
+
+class FakeWebSocket:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.latencies = []
+        self.frames = 0
+
+    async def send_text(self, message):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        else:
+            await asyncio.sleep(0)  # 让出事件循环，模拟写入传输层
+        self.frames += 1
+        now = time.perf_counter()
+        # 合并帧中的每一行都带有自己的发送时间
+        for line in message.split("\n"):
+            self.latencies.append(now - float(line.split(" ", 1)[0]))
+
+    async def close(self, code=1000):
+        pass
+
+
+async def run(mode, clients, slow, messages, interval, slow_delay, policy, max_queue):
+    sockets = [FakeWebSocket(slow_delay if i < slow else 0.0) for i in range(clients)]
+    queues = [ClientSendQueue(ws, max_size=max_queue, policy=policy) for ws in sockets] if mode == "queued" else []
+    broadcast_seconds = []
+    started = time.perf_counter()
+    for i in range(messages):
+        message = f"{time.perf_counter()} line {i} " + "x" * 80
+        begin = time.perf_counter()
+        if mode == "queued":
+            for send_queue in queues:
+                send_queue.put(message)
+        else:
+            for ws in sockets:
+                await ws.send_text(message)
+        broadcast_seconds.append(time.perf_counter() - begin)
+        await asyncio.sleep(interval)
+    await asyncio.sleep(0.05)  # 等待正常客户端的队列发完
+    elapsed = time.perf_counter() - started
+    fast_latencies = sorted(latency for ws in sockets[slow:] for latency in ws.latencies)
+    dropped = sum(send_queue.dropped for send_queue in queues)
+    coalesced = sum(send_queue.coalesced for send_queue in queues)
+    for send_queue in queues:
+        send_queue.close()
+    return {
+        "p50": statistics.median(fast_latencies),
+        "p99": fast_latencies[int(len(fast_latencies) * 0.99) - 1],
+        "broadcast": statistics.mean(broadcast_seconds),
+        "elapsed": elapsed,
+        "dropped": dropped,
+        "coalesced": coalesced
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", default="10,100,500")
+    parser.add_argument("--slow", type=int, default=2, help="慢速客户端数量")
+    parser.add_argument("--slow-delay", type=float, default=0.05)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=0.002)
+    parser.add_argument("--policy", default="coalesce")
+    parser.add_argument("--max-queue", type=int, default=64)
+    args = parser.parse_args()
+
+    for clients in (int(value) for value in args.clients.split(",")):
+        for mode in ("sequential", "queued"):
+            result = asyncio.run(run(mode, clients, args.slow, args.messages, args.interval,
+                                     args.slow_delay, args.policy, args.max_queue))
+            print(f"clients={clients:4d} {mode:10s} fast-client latency p50={result['p50'] * 1000:8.2f}ms "
+                  f"p99={result['p99'] * 1000:8.2f}ms broadcast call={result['broadcast'] * 1000:7.2f}ms "
+                  f"total={result['elapsed']:6.2f}s dropped={result['dropped']} coalesced={result['coalesced']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, UploadFile, File, HTTPException, WebSocket, WebSocketDisconnect, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from typing import List, Optional, Dict
@@ -11,9 +12,29 @@ import queue
 import sys
 import io
 import json
+import time
 import subprocess
+import mimetypes
 from pathlib import Path
 from dotenv import load_dotenv
+from utils.titan_worker import TitanWorker, TitanWorkerPool, PIPE_LINE_LIMIT, pump_lines
+from utils.run_queue import RunQueue
+from utils.token_stream import TOKEN_PREFIX
+from utils.session import DEFAULT_SESSION_ID, normalize_session_id, get_session_dir
+from utils.checkpoint import CheckpointStore
+from utils.agent_manager import get_manager
+from utils.agent_state_channel import AgentStateChannel
+from utils.ws_fanout import ClientSendQueue, join_lines
+from utils.titan_events import EVENT_ENV, make_event, parse_event, event_to_text
+from utils.output_batcher import OutputBatcher, text_frames, event_frames
+from utils.replay_buffer import ReplayBuffer, ReplayCatchup, SpillBatch
+from utils.file_reader import read_bytes, read_lines, read_tail, parse_range_header, iter_range
+from utils.file_metadata import get_file_metadata
+from utils.csv_preview import CsvPreviewCache
+from utils.upload_store import UploadStore, UPLOAD_CHUNK_BYTES
+
+# 启动时加载.env，TITAN_*等服务端配置在下面创建管理器时读取
+load_dotenv(Path(__file__).parent / ".env")
 
 # 创建FastAPI应用
 app = FastAPI(title="Titan V Backend", version="1.0.0")
@@ -38,6 +59,14 @@ app.mount("/workspace", StaticFiles(directory=WORKSPACE_DIR), name="workspace")
 class ChatRequest(BaseModel):
     message: str
     filename: Optional[str] = None
+    session_id: Optional[str] = None
+
+class UploadInitRequest(BaseModel):
+    filename: str
+    size: int
+    sha256: Optional[str] = None
+    overwrite: bool = False
+    upload_id: Optional[str] = None  # 续传时带上之前返回的upload_id
 
 class AgentMessage(BaseModel):
     role: str
@@ -47,7 +76,11 @@ class AgentMessage(BaseModel):
 class AgentState(BaseModel):
     name: str
     status: str
-    memory: str
+    memory: str  # 记忆摘要，完整记忆通过 /api/agent-states/{agent_id}/memory 分页读取
+    agent_id: str = ""
+    memory_size: int = 0
+    memory_records: int = 0
+    memory_digest: str = ""
 
 class AgentResponse(BaseModel):
     messages: List[AgentMessage]
@@ -62,65 +95,318 @@ class EnvConfig(BaseModel):
 
 
 
+def merge_output_lines(previous: str, message: str) -> Optional[str]:
+    """titan输出行以换行合并；token增量由前端逐帧解析，不参与合并（队列满时直接丢弃，最终回复仍会完整发送）"""
+    if previous.startswith(TOKEN_PREFIX) or message.startswith(TOKEN_PREFIX):
+        return None
+    return f"{previous}\n{message}"
+
+# /ws/titan-output的消息格式：text为旧版文本行（默认），events为JSON事件（合并帧时以换行分隔）
+OUTPUT_FORMATS = ("text", "events")
+
 class WebSocketManager:
-    def __init__(self):
+    def __init__(self, max_queue: int = 256, overflow_policy: str = "coalesce", max_replay_events: int = 2000,
+                 replay_idle_seconds: float = 600):
         self.active_connections: List[WebSocket] = []
+        # 每个连接订阅的会话与消息格式
+        self.connection_sessions: Dict[WebSocket, str] = {}
+        self.connection_formats: Dict[WebSocket, str] = {}
+        # 每个连接的有界发送队列，由各自的任务发送，广播不等待慢速客户端
+        self.send_queues: Dict[WebSocket, ClientSendQueue] = {}
+        self.max_queue = max_queue
+        self.overflow_policy = overflow_policy
+        # 已断开连接的累计计数
+        self.closed_totals = {"sent": 0, "dropped": 0, "coalesced": 0, "overflow_disconnects": 0}
+        # 每个会话当前运行的输出回放缓冲，事件带序号，重连客户端据此补发
+        self.replay_buffers: Dict[str, ReplayBuffer] = {}
+        self.max_replay_events = max_replay_events
+        # 没有运行也没有订阅连接的会话，空闲replay_idle_seconds后释放回放缓冲
+        self.replay_idle_seconds = replay_idle_seconds
+        self.running_sessions: set = set()
+        self.idle_timers: Dict[str, asyncio.TimerHandle] = {}
+        self.replay_evictions = 0
+        # 正在后台写溢出文件的任务（保持引用）
+        self.spill_tasks: set = set()
+        # 正在构建补发帧的连接：期间广播的帧暂存在这里，补发帧入队后再依次入队
+        self.pending_frames: Dict[WebSocket, List[str]] = {}
+
+    def replay(self, session_id: str) -> ReplayBuffer:
+        if session_id not in self.replay_buffers:
+            session_dir = get_session_dir(str(Path(__file__).parent), session_id)
+            self.replay_buffers[session_id] = ReplayBuffer(
+                os.path.join(session_dir, "replay", "output.jsonl"), max_memory_events=self.max_replay_events
+            )
+        return self.replay_buffers[session_id]
+
+    def begin_run(self, session_id: str):
+        """新的运行开始，清空该会话的回放缓冲"""
+        self.running_sessions.add(session_id)
+        self._cancel_idle(session_id)
+        self.replay(session_id).begin_run()
+
+    def end_run(self, session_id: str):
+        """运行结束，没有订阅的连接时开始空闲计时"""
+        self.running_sessions.discard(session_id)
+        self._mark_idle(session_id)
+
+    def _cancel_idle(self, session_id: str):
+        timer = self.idle_timers.pop(session_id, None)
+        if timer is not None:
+            timer.cancel()
+
+    def _mark_idle(self, session_id: str):
+        if session_id in self.running_sessions or session_id not in self.replay_buffers:
+            return
+        if session_id in self.connection_sessions.values():
+            return
+        self._cancel_idle(session_id)
+        self.idle_timers[session_id] = asyncio.get_running_loop().call_later(
+            self.replay_idle_seconds, self._evict_replay, session_id
+        )
+
+    def _evict_replay(self, session_id: str):
+        """释放空闲会话的回放缓冲；之后重连的客户端会收到reset（序号已失效）"""
+        self.idle_timers.pop(session_id, None)
+        if self.replay_buffers.pop(session_id, None) is not None:
+            self.replay_evictions += 1
+            print(f"[INFO] 会话 {session_id} 空闲，已释放输出回放缓冲")
+
+    def _schedule_spill(self, replay: ReplayBuffer):
+        batch = replay.take_spill()
+        if batch is not None:
+            task = asyncio.create_task(self._write_spill(replay, batch))
+            self.spill_tasks.add(task)
+            task.add_done_callback(self.spill_tasks.discard)
+
+    async def _write_spill(self, replay: ReplayBuffer, batch: SpillBatch):
+        """在线程中写溢出文件，完成后继续写写入期间新增的超出部分"""
+        while batch is not None:
+            try:
+                await asyncio.to_thread(batch.write)
+            except OSError as e:
+                print(f"[ERROR] 写入输出回放溢出文件失败: {e}")
+                replay.finish_spill(batch, written=False)
+                return
+            replay.finish_spill(batch)
+            batch = replay.take_spill()
+
+    @staticmethod
+    def _catchup_frame(catchup: ReplayCatchup, output_format: str, resume_from: Optional[int]) -> Optional[str]:
+        """一帧补发seq > resume_from的输出（token增量不补发，完整回复已在其中）；可能读取溢出文件，在线程中调用"""
+        reset = catchup.reset
+        events = [event for event in catchup.load() if event["kind"] != "token"]
+        if output_format == "text":
+            return "\n".join(event_to_text(event) for event in events) if events else None
+        # 带resume_from的客户端需要得知序号已失效（新的运行或服务重启），即使没有可补发的事件
+        if not events and not (reset and resume_from is not None):
+            return None
+        header = make_event("replay", None, reset=reset,
+                            first_seq=events[0]["seq"] if events else None,
+                            last_seq=events[-1]["seq"] if events else None)
+        return "\n".join(json.dumps(event, ensure_ascii=False) for event in [header] + events)
         
-    async def connect(self, websocket: WebSocket):
+    async def connect(self, websocket: WebSocket, session_id: str = DEFAULT_SESSION_ID, output_format: str = "text",
+                      resume_from: Optional[int] = None):
         await websocket.accept()
         self.active_connections.append(websocket)
+        self.connection_sessions[websocket] = session_id
+        self._cancel_idle(session_id)
+        self.connection_formats[websocket] = output_format
+        self.send_queues[websocket] = ClientSendQueue(
+            websocket, max_size=self.max_queue, policy=self.overflow_policy,
+            merge=merge_output_lines if output_format == "text" else join_lines,
+            on_close=lambda send_queue: self.disconnect(send_queue.websocket)
+        )
+        # 补发帧先于之后广播的输出入队：取得补发范围与开始暂存广播在同一步完成，
+        # 溢出文件的读取与编码放到线程中，不阻塞其他连接
+        catchup = self.replay(session_id).catchup(resume_from)
+        self.pending_frames[websocket] = []
+        try:
+            frame = await asyncio.to_thread(self._catchup_frame, catchup, output_format, resume_from)
+        except (OSError, ValueError) as e:
+            print(f"[ERROR] 读取输出回放失败: {e}")
+            frame = None
+        finally:
+            pending = self.pending_frames.pop(websocket, [])
+        send_queue = self.send_queues.get(websocket)
+        if send_queue is None:
+            return
+        if frame is not None:
+            send_queue.put(frame)
+        for pending_frame in pending:
+            send_queue.put(pending_frame)
         
     def disconnect(self, websocket: WebSocket):
         if websocket in self.active_connections:
             self.active_connections.remove(websocket)
+        session_id = self.connection_sessions.pop(websocket, None)
+        self.connection_formats.pop(websocket, None)
+        self.pending_frames.pop(websocket, None)
+        if session_id is not None:
+            self._mark_idle(session_id)
+        send_queue = self.send_queues.pop(websocket, None)
+        if send_queue is not None:
+            send_queue.close()
+            self.closed_totals["overflow_disconnects"] += int(send_queue.overflowed)
+            for key in ("sent", "dropped", "coalesced"):
+                self.closed_totals[key] += getattr(send_queue, key)
             
-    async def send_message(self, message: str):
-        """向所有连接的客户端发送消息"""
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except Exception as e:
-                print(f"[WebSocket] 发送消息失败: {e}")
-                self.disconnect(connection)
+    async def send_events(self, events: List[Dict[str, object]], session_id: str = DEFAULT_SESSION_ID):
+        """向订阅该会话的客户端发送一批事件（分配序号并存入回放缓冲；每种格式只编码一次，只放入发送队列，立即返回）"""
+        replay = self.replay(session_id)
+        replay.extend(events)
+        self._schedule_spill(replay)
+        encoded: Dict[str, List[str]] = {}
+        for connection, send_queue in list(self.send_queues.items()):
+            if self.connection_sessions.get(connection) != session_id:
+                continue
+            output_format = self.connection_formats.get(connection, "text")
+            if output_format not in encoded:
+                encoded[output_format] = text_frames(events) if output_format == "text" else event_frames(events)
+            pending = self.pending_frames.get(connection)
+            if pending is not None:
+                pending.extend(encoded[output_format])
+                continue
+            for frame in encoded[output_format]:
+                send_queue.put(frame)
+
+    async def send_event(self, event: Dict[str, object], session_id: str = DEFAULT_SESSION_ID):
+        await self.send_events([event], session_id)
+
+    async def send_message(self, message: str, session_id: str = DEFAULT_SESSION_ID, kind: str = "system"):
+        """发送一行文本（包装为事件）"""
+        await self.send_event(make_event(kind, message), session_id)
+
+    def get_stats(self) -> Dict[str, object]:
+        """发送队列深度与丢弃/合并计数"""
+        clients = [
+            dict(send_queue.get_stats(), session_id=self.connection_sessions.get(connection),
+                 format=self.connection_formats.get(connection))
+            for connection, send_queue in self.send_queues.items()
+        ]
+        return {
+            "overflow_policy": self.overflow_policy,
+            "max_queue": self.max_queue,
+            "clients": clients,
+            "total_depth": sum(client["depth"] for client in clients),
+            "sent": self.closed_totals["sent"] + sum(client["sent"] for client in clients),
+            "dropped": self.closed_totals["dropped"] + sum(client["dropped"] for client in clients),
+            "coalesced": self.closed_totals["coalesced"] + sum(client["coalesced"] for client in clients),
+            "overflow_disconnects": self.closed_totals["overflow_disconnects"],
+            "replay": {session_id: replay.get_stats() for session_id, replay in self.replay_buffers.items()},
+            "replay_evictions": self.replay_evictions
+        }
 
 class CamelChatRunner:
     def __init__(self):
         self.camel_chat_path = Path(__file__).parent
         self.is_running = False
-        self.current_process = None
+        # 每个会话当前的titan子进程（仅非worker模式）与后台任务
+        self.current_processes: Dict[str, asyncio.subprocess.Process] = {}
+        self.session_tasks: Dict[str, asyncio.Task] = {}
+        # 运行队列：TITAN_MAX_CONCURRENT_RUNS限制同时运行的分析数量
+        self.run_queue = RunQueue(max_concurrency=int(os.getenv("TITAN_MAX_CONCURRENT_RUNS", "1")))
         self.output_queue = queue.Queue()
-        self.websocket_manager = WebSocketManager()
+        self.websocket_manager = WebSocketManager(
+            max_queue=int(os.getenv("TITAN_WS_QUEUE_SIZE", "256")),
+            overflow_policy=os.getenv("TITAN_WS_OVERFLOW", "coalesce"),
+            max_replay_events=int(os.getenv("TITAN_REPLAY_MEMORY_EVENTS", "2000")),
+            replay_idle_seconds=float(os.getenv("TITAN_REPLAY_IDLE_SECONDS", "600"))
+        )
+        # 常驻worker模式：titan.py预初始化后通过stdin/stdout接收任务，TITAN_WORKER_MODE=0时回退为每次启动子进程
+        self.use_worker = os.getenv("TITAN_WORKER_MODE", "1") != "0"
+        self.worker_pool: Optional[TitanWorkerPool] = None
+        # 首个输出耗时统计（秒），按运行模式区分，便于对比常驻worker与每次启动子进程
+        self.time_to_first_output: Dict[str, List[float]] = {"worker": [], "spawn": []}
+        # 每个会话正在使用的worker，用于取消；取消到空闲的耗时（秒）
+        self.session_workers: Dict[str, TitanWorker] = {}
+        self.cancelling: set = set()
+        self.cancel_latencies: List[float] = []
+
+    def get_python_executable(self) -> str:
+        """优先使用venv中的Python解释器"""
+        venv_python = Path(__file__).parent.parent / "venv" / "bin" / "python"
+        if not venv_python.exists():
+            # 尝试Windows路径
+            venv_python = Path(__file__).parent.parent / "venv" / "Scripts" / "python.exe"
+
+        if not venv_python.exists():
+            print(f"[WARNING] 虚拟环境Python解释器不存在: {venv_python}")
+            print("[INFO] 使用系统Python解释器...")
+            return sys.executable
+        print(f"[INFO] 使用虚拟环境Python: {venv_python}")
+        return str(venv_python)
+
+    def get_titan_env(self) -> Dict[str, str]:
+        env = os.environ.copy()
+        env['PYTHONUNBUFFERED'] = '1'
+        env[EVENT_ENV] = '1'  # titan.py输出类型化事件
+        return env
+
+    async def start_workers(self) -> None:
+        """启动常驻titan worker池"""
+        if not self.use_worker:
+            return
+        if self.worker_pool is None:
+            self.worker_pool = TitanWorkerPool(
+                size=int(os.getenv("TITAN_WORKER_POOL_SIZE", str(self.run_queue.max_concurrency))),
+                python_executable=self.get_python_executable(),
+                script_path=str(Path(__file__).parent / "titan.py"),
+                cwd=str(Path(__file__).parent),
+                env=self.get_titan_env()
+            )
+        await self.worker_pool.start()
+
+    async def stop_workers(self) -> None:
+        """关闭常驻titan worker池"""
+        if self.worker_pool is not None:
+            await self.worker_pool.shutdown()
+
+    def record_first_output(self, mode: str, started_at: float) -> None:
+        elapsed = time.monotonic() - started_at
+        self.time_to_first_output[mode].append(elapsed)
+        print(f"[INFO] 首个输出耗时({mode}): {elapsed:.2f}s")
+
+    def get_worker_stats(self) -> Dict[str, object]:
+        """worker池状态与首个输出耗时统计"""
+        def summarize(samples: List[float]) -> Dict[str, object]:
+            return {
+                "count": len(samples),
+                "last": samples[-1] if samples else None,
+                "avg": sum(samples) / len(samples) if samples else None,
+                "max": max(samples) if samples else None
+            }
+
+        return {
+            "worker_mode": self.use_worker,
+            "pool": self.worker_pool.get_stats() if self.worker_pool is not None else None,
+            "time_to_first_output": {mode: summarize(samples) for mode, samples in self.time_to_first_output.items()},
+            "cancel_to_idle": summarize(self.cancel_latencies)
+        }
         
-    def get_camel_agents(self) -> List[AgentState]:
+    def get_camel_agents(self, session_id: str = DEFAULT_SESSION_ID) -> List[AgentState]:
         """获取Camel agents状态"""
         try:
             # 使用agent_manager获取最新状态，确保实时更新
             from utils.agent_manager import get_agent_states_for_backend
             
-            agent_states = get_agent_states_for_backend()
-            return [
-                AgentState(
-                    name=agent["name"],
-                    status=agent["status"],
-                    memory=agent["memory"]
-                )
-                for agent in agent_states
-            ]
+            agent_states = get_agent_states_for_backend(session_id)
+            return [AgentState(**agent) for agent in agent_states]
                 
         except Exception as e:
             print(f"Error getting agent states: {e}")
             return []
 
-    async def process_request(self, message: str, file_path: Optional[str] = None) -> AgentResponse:
+    async def process_request(self, message: str, file_path: Optional[str] = None, session_id: str = DEFAULT_SESSION_ID) -> AgentResponse:
         """处理聊天请求"""
         try:
-            print(f"[INFO] 收到用户消息: {message}")
+            print(f"[INFO] 收到用户消息({session_id}): {message}")
             
             # 检查是否是启动分析的消息
             if message.strip() == "开始分析":
                 print("[INFO] 检测到'开始分析'指令，启动titan agent...")
                 # 运行titan分析
-                result = await self.run_camel_analysis()
+                result = await self.run_camel_analysis(session_id)
             else:
                 # 普通聊天消息
                 print("[INFO] 处理普通聊天消息...")
@@ -133,7 +419,7 @@ class CamelChatRunner:
                         )
                     ],
                     files=[],
-                    agentStates=self.get_camel_agents()
+                    agentStates=self.get_camel_agents(session_id)
                 )
             
             return result
@@ -151,13 +437,29 @@ class CamelChatRunner:
                     )
                 ],
                 files=[],
-                agentStates=self.get_camel_agents()
+                agentStates=self.get_camel_agents(session_id)
             )
 
-    async def run_camel_analysis(self) -> AgentResponse:
-        """运行Camel分析"""
+    async def run_camel_analysis(self, session_id: str = DEFAULT_SESSION_ID, resume: bool = False) -> AgentResponse:
+        """运行Camel分析，resume时从该会话最近的检查点继续"""
         try:
-            print("[INFO] 开始运行Camel分析...")
+            print(f"[INFO] 开始运行Camel分析, 会话: {session_id}, 恢复: {resume}")
+            
+            # 同一会话同时只允许一个分析：后台任务创建后要等到进入run_queue.slot才登记到队列中，
+            # 因此同时检查该会话是否已有未结束的后台任务
+            task = self.session_tasks.get(session_id)
+            if self.run_queue.is_active(session_id) or (task is not None and not task.done()):
+                return AgentResponse(
+                    messages=[
+                        AgentMessage(
+                            role="agent",
+                            content="[SYSTEM] Titan is already running or queued for this session.",
+                            timestamp=datetime.now()
+                        )
+                    ],
+                    files=[],
+                    agentStates=self.get_camel_agents(session_id)
+                )
             
             # 获取titan.py的路径
             titan_path = Path(__file__).parent / "titan.py"
@@ -168,155 +470,428 @@ class CamelChatRunner:
             
             print(f"[INFO] 启动titan agent: {titan_path}")
             
-            # 设置环境变量
-            env = os.environ.copy()
-            env['PYTHONUNBUFFERED'] = '1'
-            
-            # 使用venv中的Python解释器
-            venv_python = Path(__file__).parent.parent / "venv" / "bin" / "python"
-            if not venv_python.exists():
-                # 尝试Windows路径
-                venv_python = Path(__file__).parent.parent / "venv" / "Scripts" / "python.exe"
-            
-            if not venv_python.exists():
-                print(f"[WARNING] 虚拟环境Python解释器不存在: {venv_python}")
-                print("[INFO] 使用系统Python解释器...")
-                python_executable = sys.executable
-            else:
-                print(f"[INFO] 使用虚拟环境Python: {venv_python}")
-                python_executable = str(venv_python)
+            async def publish_output(events: List[Dict[str, object]]):
+                """整批打印与广播，token增量只转发不打印"""
+                lines = [f"[TITAN OUTPUT][{session_id}] {event_to_text(event)}" for event in events if event["kind"] != "token"]
+                if lines:
+                    print("\n".join(lines))
+                await self.websocket_manager.send_events(events, session_id)
+
+            # 时间/大小窗口内的输出合并为一帧发送，TITAN_OUTPUT_BATCH_MS=0时逐行发送
+            batcher = OutputBatcher(
+                publish_output,
+                max_delay=float(os.getenv("TITAN_OUTPUT_BATCH_MS", "20")) / 1000,
+                max_bytes=int(os.getenv("TITAN_OUTPUT_BATCH_BYTES", str(64 * 1024)))
+            )
+
+            async def send(message: str, kind: str = "system"):
+                await batcher.add(make_event(kind, message))
+
+            async def route_output(mode: str, started_at: float, output_line: str, state: Dict[str, bool]):
+                """按事件类型路由titan输出；非事件行（如camel在事件输出启用前的打印）作为log事件"""
+                event = parse_event(output_line) or make_event("log", output_line)
+                if state["first_output"] and event["kind"] == "task_start":
+                    state["first_output"] = False
+                    self.record_first_output(mode, started_at)
+                await batcher.add(event)
+
+            async def route_stderr(error_line: str):
+                await send(f"[ERROR] {error_line}", kind="stderr")
             
+            # 使用常驻worker执行任务，实时转发输出
+            async def run_titan_in_worker(started_at: float):
+                state = {"first_output": True}
+
+                async def forward_output(output_line: str):
+                    await route_output("worker", started_at, output_line, state)
+
+                worker = None
+                try:
+                    await self.start_workers()
+                    worker = await self.worker_pool.acquire()
+                    self.session_workers[session_id] = worker
+                    result = await worker.run_task(
+                        {"task_id": str(time.time_ns()), "session_id": session_id, "task": os.getenv("CAMEL_TASK", ""), "resume": resume},
+                        on_output=forward_output,
+                        on_stderr=route_stderr
+                    )
+                    if result.get("status") == "ok":
+                        completion_msg = "[SYSTEM] Task Finished"
+                        print(f"[INFO] {completion_msg}")
+                        await send(completion_msg, kind="task_end")
+                    elif result.get("status") == "cancelled":
+                        await send("[SYSTEM] Task Cancelled", kind="task_end")
+                    else:
+                        error_msg = f"[SYSTEM] titan agent运行失败: {result.get('status')}"
+                        print(f"[ERROR] {error_msg}")
+                        await send(error_msg, kind="task_end")
+                except Exception as e:
+                    if session_id in self.cancelling:
+                        # 取消超时后worker被强制结束
+                        await send("[SYSTEM] Task Cancelled", kind="task_end")
+                    else:
+                        error_msg = f"运行titan agent时出错: {e}"
+                        print(f"[ERROR] {error_msg}")
+                        await send(error_msg, kind="error")
+                finally:
+                    self.session_workers.pop(session_id, None)
+                    if worker is not None:
+                        self.worker_pool.release(worker)
+
             # 使用异步方式运行titan.py，实时读取输出
-            async def run_titan_streaming():
+            async def run_titan_streaming(started_at: float):
                 try:
+                    env = self.get_titan_env()
+                    env['TITAN_SESSION_ID'] = session_id
+                    env['TITAN_RESUME'] = "1" if resume else "0"
                     process = await asyncio.create_subprocess_exec(
-                        python_executable,
+                        self.get_python_executable(),
                         str(titan_path),
                         env=env,
                         cwd=str(Path(__file__).parent),
                         stdout=asyncio.subprocess.PIPE,
-                        stderr=asyncio.subprocess.PIPE
+                        stderr=asyncio.subprocess.PIPE,
+                        limit=PIPE_LINE_LIMIT
                     )
                     
-                    self.current_process = process
-                    
-                    # 实时读取stdout
-                    while True:
-                        line = await process.stdout.readline()
-                        if not line:
-                            break
-                        
-                        output_line = line.decode('utf-8').rstrip()
-                        print(f"[TITAN OUTPUT] {output_line}")  # 在API中打印
-                        
-                        # 通过WebSocket发送给前端
-                        await self.websocket_manager.send_message(output_line)
-                    
-                    # 实时读取stderr
-                    while True:
-                        line = await process.stderr.readline()
-                        if not line:
-                            break
-                        
-                        error_line = line.decode('utf-8').rstrip()
-                        print(f"[TITAN ERROR] {error_line}")  # 在API中打印错误
-                        await self.websocket_manager.send_message(f"[ERROR] {error_line}")
-                    
+                    self.current_processes[session_id] = process
+                    state = {"first_output": True}
+
+                    async def forward_output(output_line: str):
+                        await route_output("spawn", started_at, output_line, state)
+
+                    async def forward_error(error_line: str):
+                        print(f"[TITAN ERROR][{session_id}] {error_line}")  # 在API中打印错误
+                        await route_stderr(error_line)
+
+                    # 同时读取stdout与stderr，stderr实时转发，任一管道写满都不会阻塞子进程
+                    await asyncio.gather(
+                        pump_lines(process.stdout, forward_output),
+                        pump_lines(process.stderr, forward_error)
+                    )
                     await process.wait()
                     
                     if process.returncode == 0:
                         completion_msg = "[SYSTEM] Task Finished"
                         print(f"[INFO] {completion_msg}")
-                        await self.websocket_manager.send_message(completion_msg)
+                        await send(completion_msg, kind="task_end")
+                    elif session_id in self.cancelling:
+                        await send("[SYSTEM] Task Cancelled", kind="task_end")
                     else:
                         error_msg = f"[SYSTEM] titan agent运行失败，返回码: {process.returncode}"
                         print(f"[ERROR] {error_msg}")
-                        await self.websocket_manager.send_message(error_msg)
+                        await send(error_msg, kind="task_end")
                         
                 except Exception as e:
                     error_msg = f"运行titan agent时出错: {e}"
                     print(f"[ERROR] {error_msg}")
-                    await self.websocket_manager.send_message(error_msg)
+                    await send(error_msg, kind="error")
+                finally:
+                    self.current_processes.pop(session_id, None)
+            
+            # 排队等待运行槽位，首个输出耗时从获得槽位开始计算
+            async def run_queued():
+                try:
+                    async with self.run_queue.slot(session_id) as wait_time:
+                        if wait_time > 0.1:
+                            print(f"[INFO] 会话 {session_id} 排队 {wait_time:.2f}s 后开始运行")
+                        self.websocket_manager.begin_run(session_id)
+                        started_at = time.monotonic()
+                        if self.use_worker:
+                            await run_titan_in_worker(started_at)
+                        else:
+                            await run_titan_streaming(started_at)
+                except asyncio.CancelledError:
+                    await send("[SYSTEM] Task Cancelled Before Start", kind="task_end")
                 finally:
-                    self.current_process = None
+                    await batcher.close()
+                    self.websocket_manager.end_run(session_id)
+                    self.session_tasks.pop(session_id, None)
             
             # 启动后台任务
-            asyncio.create_task(run_titan_streaming())
+            queued = len(self.run_queue.running) >= self.run_queue.max_concurrency
+            self.session_tasks[session_id] = asyncio.create_task(run_queued())
             
             # 立即返回响应，titan将在后台运行
+            if queued:
+                content = f"[SYSTEM] Titan is queued, {len(self.run_queue.waiting) + 1} run(s) waiting..."
+            else:
+                content = "[SYSTEM] Titan has started and is outputting in real-time..."
             return AgentResponse(
                 messages=[
                     AgentMessage(
                         role="agent",
-                        content="[SYSTEM] Titan has started and is outputting in real-time...",
+                        content=content,
                         timestamp=datetime.now()
                     )
                 ],
                 files=[],
-                agentStates=self.get_camel_agents()
+                agentStates=self.get_camel_agents(session_id)
             )
             
         except Exception as e:
             print(f"[ERROR] Camel分析失败: {e}")
             raise e
 
+    def cancel_queued(self, session_id: str) -> bool:
+        """取消仍在排队、尚未开始运行的分析"""
+        task = self.session_tasks.get(session_id)
+        if task is not None and session_id in self.run_queue.waiting:
+            task.cancel()
+            return True
+        return False
+
+    async def cancel_running(self, session_id: str) -> Optional[float]:
+        """
+        立即取消正在运行的分析并等待其回到空闲，返回取消到空闲的耗时；没有运行中的分析时返回None。
+        worker模式通过stdin发送取消指令（中止模型请求、中断内核），超时则结束worker进程并重新拉起；
+        子进程模式直接结束titan进程。
+        """
+        timeout = float(os.getenv("TITAN_CANCEL_TIMEOUT", "10"))
+        worker = self.session_workers.get(session_id)
+        process = self.current_processes.get(session_id)
+        if worker is None and process is None:
+            return None
+        self.cancelling.add(session_id)
+        try:
+            if worker is not None:
+                latency = await worker.cancel(timeout=timeout)
+            else:
+                started = time.monotonic()
+                process.terminate()
+                try:
+                    await asyncio.wait_for(process.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    process.kill()
+                    await process.wait()
+                latency = time.monotonic() - started
+            # 等待后台任务处理完结束消息，确保会话已释放运行槽位
+            task = self.session_tasks.get(session_id)
+            if task is not None:
+                await asyncio.wait([task], timeout=timeout)
+        finally:
+            self.cancelling.discard(session_id)
+        if latency is not None:
+            self.cancel_latencies.append(latency)
+            print(f"[INFO] 会话 {session_id} 取消到空闲耗时: {latency:.2f}s")
+        return latency
+
 
 # 创建全局runner实例
 runner = CamelChatRunner()
+# agent状态推送通道，替代轮询/api/agent-states
+agent_state_channel = AgentStateChannel(get_manager)
+
+@app.on_event("startup")
+async def start_titan_workers():
+    """服务启动时预热titan worker，首个分析任务无需等待初始化"""
+    async def warm_up():
+        try:
+            await runner.start_workers()
+        except Exception as e:
+            print(f"[ERROR] 启动titan worker失败: {e}")
+
+    # 后台预热，不阻塞API服务启动
+    asyncio.create_task(warm_up())
+
+@app.on_event("shutdown")
+async def stop_titan_workers():
+    await runner.stop_workers()
+
+@app.get("/api/runs/queue")
+async def get_run_queue_stats():
+    """获取运行队列深度与等待时间"""
+    return runner.run_queue.get_stats()
+
+@app.get("/api/worker/stats")
+async def get_worker_stats():
+    """获取titan worker池状态与首个输出耗时"""
+    return runner.get_worker_stats()
+
+@app.get("/api/ws/stats")
+async def get_ws_stats():
+    """WebSocket发送队列深度与丢弃/合并/断开计数"""
+    return {
+        "titan_output": runner.websocket_manager.get_stats(),
+        "agent_states": agent_state_channel.get_stats()
+    }
 
 @app.post("/api/chat", response_model=AgentResponse)
 async def chat_with_agent(request: ChatRequest):
     """与Agent聊天"""
     try:
         print(f"[API] 收到聊天请求: {request.message}")
-        result = await runner.process_request(request.message, request.filename)
+        session_id = normalize_session_id(request.session_id)
+        result = await runner.process_request(request.message, request.filename, session_id)
         
         return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"[ERROR] 聊天API错误: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/runs/checkpoint")
+async def get_run_checkpoint(session_id: Optional[str] = None):
+    """获取会话最近的检查点概要"""
+    try:
+        session_id = normalize_session_id(session_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    summary = CheckpointStore(get_session_dir(os.path.dirname(__file__), session_id)).summary()
+    if summary is None:
+        raise HTTPException(status_code=404, detail="该会话没有检查点")
+    return summary
+
+@app.post("/api/runs/resume", response_model=AgentResponse)
+async def resume_run(session_id: Optional[str] = None):
+    """从最近的检查点继续运行，之前轮次的模型调用不会重放"""
+    try:
+        session_id = normalize_session_id(session_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    print(f"[API] 收到恢复运行请求, 会话: {session_id}")
+    if CheckpointStore(get_session_dir(os.path.dirname(__file__), session_id)).load_resumable() is None:
+        raise HTTPException(status_code=404, detail="该会话没有可恢复的检查点")
+    try:
+        return await runner.run_camel_analysis(session_id, resume=True)
+    except Exception as e:
+        print(f"[ERROR] 恢复运行失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/api/test_terminate")
-async def test_terminate():
+async def test_terminate(session_id: Optional[str] = None):
     """测试终止功能"""
     try:
         print("[API] 收到测试终止请求")
         print("[INFO] 正在执行终止操作")
-        # 生成终止信号文件，使用与titan.py相同的绝对路径
-        terminate_signal_file = os.path.join(os.path.dirname(__file__), 'terminate_signal.txt')
+        session_id = normalize_session_id(session_id)
+        # 排队中的分析直接取消
+        if runner.cancel_queued(session_id):
+            return {"message": "终止操作已完成"}
+        # 运行中的分析立即中止
+        latency = await runner.cancel_running(session_id)
+        if latency is not None:
+            return {"message": "终止操作已完成", "cancel_latency": latency}
+        # 生成终止信号文件，使用与titan.py相同的会话目录
+        terminate_signal_file = os.path.join(get_session_dir(os.path.dirname(__file__), session_id), 'terminate_signal.txt')
         with open(terminate_signal_file, 'w') as f:
             f.write('terminate')
         await asyncio.sleep(1)
         
         return {"message": "终止操作已完成"}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"[ERROR] 终止操作失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 
+# 内容寻址的上传存储（WORKSPACE_DIR/.cas），文件写入与哈希在线程中执行，不阻塞事件循环
+upload_store = UploadStore(str(WORKSPACE_DIR), chunk_size=int(os.getenv("TITAN_UPLOAD_CHUNK_BYTES", str(UPLOAD_CHUNK_BYTES))))
+# 攒够这么多字节再写一次磁盘
+UPLOAD_WRITE_BYTES = 1024 * 1024
+
+
 @app.post("/api/upload")
 async def upload_file(file: UploadFile = File(...)):
-    """上传文件"""
+    """上传文件（单次请求）；与分块上传共用内容寻址存储，与原有行为一致直接覆盖同名文件"""
     try:
         print(f"[API] 收到文件上传请求: {file.filename}")
-        
-        # 确保工作目录存在
-        WORKSPACE_DIR.mkdir(exist_ok=True)
-        
-        # 保存文件
-        file_path = WORKSPACE_DIR / file.filename
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-            
-        print(f"[SUCCESS] 文件已上传: {file_path}")
-        
-        return {"filename": file.filename, "status": "uploaded"}
+        info = await asyncio.to_thread(upload_store.init, file.filename or "", None, overwrite=True)
+        session = upload_store.get(info["upload_id"])
+        while True:
+            data = await file.read(UPLOAD_WRITE_BYTES)
+            if not data:
+                break
+            await asyncio.to_thread(upload_store.append, session, data)
+        return await asyncio.to_thread(upload_store.complete, session)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"[ERROR] 文件上传失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@app.post("/api/uploads")
+async def init_upload(request: UploadInitRequest):
+    """
+    开始或恢复分块上传，返回upload_id、已接收的offset与建议的分块大小
+    sha256已在内容存储中时直接返回status=complete，无需上传数据
+    """
+    try:
+        print(f"[API] 收到分块上传请求: {request.filename} ({request.size} bytes)")
+        return await asyncio.to_thread(upload_store.init, request.filename, request.size,
+                                       request.sha256, request.overwrite, request.upload_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def get_upload_session(upload_id: str):
+    # 服务重启后首次访问会从磁盘恢复并重新计算哈希
+    session = await asyncio.to_thread(upload_store.get, upload_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if session.lock is None:
+        session.lock = asyncio.Lock()
+    return session
+
+
+@app.get("/api/uploads/{upload_id}")
+async def get_upload_status(upload_id: str):
+    """上传状态，连接中断后据此从offset继续"""
+    session = await get_upload_session(upload_id)
+    return session.to_dict()
+
+
+@app.put("/api/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, offset: int, request: Request):
+    """从offset处追加一个分块（请求体为原始字节），边接收边写入并计算哈希"""
+    session = await get_upload_session(upload_id)
+    async with session.lock:
+        if offset != session.offset:
+            raise HTTPException(status_code=409, detail={"message": "offset mismatch", "offset": session.offset})
+        buffer = bytearray()
+        try:
+            async for piece in request.stream():
+                buffer += piece
+                if len(buffer) >= UPLOAD_WRITE_BYTES:
+                    await asyncio.to_thread(upload_store.append, session, bytes(buffer))
+                    buffer.clear()
+        except ValueError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except Exception:
+            # 连接中断时已收到的数据同样保留，客户端从新的offset续传；保存失败不掩盖原始异常
+            if buffer:
+                try:
+                    await asyncio.to_thread(upload_store.append, session, bytes(buffer))
+                except ValueError:
+                    pass
+            raise
+        if buffer:
+            try:
+                await asyncio.to_thread(upload_store.append, session, bytes(buffer))
+            except ValueError as e:
+                raise HTTPException(status_code=413, detail=str(e))
+    return session.to_dict()
+
+
+@app.post("/api/uploads/{upload_id}/complete")
+async def complete_upload(upload_id: str):
+    """校验并完成上传，返回工作区中的最终文件名（同名且内容不同的文件不会被覆盖）"""
+    session = await get_upload_session(upload_id)
+    async with session.lock:
+        try:
+            return await asyncio.to_thread(upload_store.complete, session)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            print(f"[ERROR] 完成上传失败: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/files")
 async def list_files():
     """列出工作目录中的文件"""
@@ -393,9 +968,52 @@ async def list_files_in_directory(path: str = "/"):
         print(f"[ERROR] 获取目录文件列表失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def file_metadata_response(metadata) -> dict:
+    """返回给前端的文件元数据（不含服务端路径）"""
+    return {
+        "encoding": metadata.encoding,
+        "line_ending": metadata.line_ending,
+        "delimiter": metadata.delimiter,
+        "has_header": metadata.has_header,
+        "is_text": metadata.is_text
+    }
+
+
+# 单次请求返回的最大字节数，超出的部分由客户端按offset/start_line继续读取或改用stream
+FILE_MAX_RANGE_BYTES = 32 * 1024 * 1024
+
+
+async def stream_file(file_path: Path, range_header: Optional[str]) -> StreamingResponse:
+    """分块流式返回文件，支持单个Range请求（206）；元数据试探在线程中执行"""
+    size = file_path.stat().st_size
+    try:
+        byte_range = parse_range_header(range_header, size)
+    except ValueError:
+        raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    start, end = byte_range if byte_range else (0, size - 1)
+    media_type = mimetypes.guess_type(file_path.name)[0] or "application/octet-stream"
+    if media_type.startswith("text/"):
+        metadata = await asyncio.to_thread(get_file_metadata, str(file_path))
+        # 未确认的编码（只根据开头的ASCII样本推断）不写入charset，由客户端自行判断
+        if metadata.encoding and metadata.encoding_confirmed:
+            media_type = f"{media_type}; charset={metadata.encoding}"
+    headers = {"Accept-Ranges": "bytes", "Content-Length": str(max(end - start + 1, 0))}
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return StreamingResponse(iter_range(str(file_path), start, end), status_code=206 if byte_range else 200,
+                             media_type=media_type, headers=headers)
+
+
 @app.get("/api/file/{filename:path}")
-async def get_file_content(filename: str):
-    """获取文件内容"""
+async def get_file_content(filename: str, request: Request, offset: Optional[int] = None, length: Optional[int] = None,
+                           start_line: Optional[int] = None, lines: Optional[int] = None, tail: Optional[int] = None,
+                           stream: bool = False):
+    """
+    获取文件内容，不会把整个文件读入内存
+    - 默认返回开头一页（TITAN_FILE_PAGE_BYTES，在换行处截断），truncated为True时用next_offset继续读取
+    - offset/length: 字节范围；start_line/lines: 行范围（从0开始）；tail: 最后N行
+    - stream=true: 分块流式返回原始内容，支持Range请求头
+    """
     try:
         print(f"[API] 收到文件内容请求: {filename}")
         
@@ -423,26 +1041,49 @@ async def get_file_content(filename: str):
         if not file_path.exists():
             print(f"[ERROR] 文件不存在: {filename}")
             raise HTTPException(status_code=404, detail="File not found")
-            
-        # 尝试以UTF-8读取，如果失败则尝试其他编码
-        try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                content = f.read()
-        except UnicodeDecodeError:
-            # 如果UTF-8失败，尝试其他编码
-            try:
-                with open(file_path, "r", encoding="gbk") as f:
-                    content = f.read()
-            except UnicodeDecodeError:
-                with open(file_path, "r", encoding="latin-1") as f:
-                    content = f.read()
-            
-        print(f"[SUCCESS] 文件内容已读取: {filename}")
+        if not file_path.is_file():
+            raise HTTPException(status_code=400, detail="Path is not a file")
+
+        if stream:
+            print(f"[SUCCESS] 开始流式返回文件: {filename}")
+            return await stream_file(file_path, request.headers.get("range"))
+
+        path = str(file_path)
+        page_bytes = int(os.getenv("TITAN_FILE_PAGE_BYTES", str(1024 * 1024)))
+        max_bytes = min(length if length is not None else page_bytes, FILE_MAX_RANGE_BYTES)
+        if max_bytes <= 0 or any(value is not None and value < 0 for value in (offset, start_line, lines, tail)):
+            raise HTTPException(status_code=400, detail="Invalid range")
+        # 编码等元数据按文件版本缓存，同一版本再次打开时不再试探解码
+        metadata = await asyncio.to_thread(get_file_metadata, path)
+
+        def read_page(encoding: str) -> dict:
+            if tail is not None:
+                return read_tail(path, tail, encoding, max_bytes)
+            if start_line is not None or lines is not None:
+                return read_lines(path, start_line or 0, lines if lines is not None else 1000, encoding, max_bytes)
+            # 默认分页在换行处截断，CSV等按行解析的内容每一页都是完整的行
+            return read_bytes(path, offset or 0, max_bytes, encoding, length is None)
+
+        encoding = metadata.encoding or "latin-1"
+        result = await asyncio.to_thread(read_page, encoding)
+        if not metadata.encoding_confirmed and "\ufffd" in result["content"]:
+            # 编码只由开头的ASCII样本推断，出现解码错误时扫描整个文件确认编码后重新读取
+            metadata = await asyncio.to_thread(get_file_metadata, path, True)
+            if metadata.encoding != encoding:
+                encoding = metadata.encoding
+                result = await asyncio.to_thread(read_page, encoding)
+        result["truncated"] = result["offset"] > 0 or not result["eof"]
+        result["next_offset"] = None if result["eof"] else result["end"]
+
+        stat = file_path.stat()
+        print(f"[SUCCESS] 文件内容已读取: {filename} ({result['offset']}-{result['end']}/{stat.st_size})")
         return {
-            "filename": filename, 
-            "content": content,
-            "size": file_path.stat().st_size,
-            "lastModified": datetime.fromtimestamp(file_path.stat().st_mtime).isoformat()
+            "filename": filename,
+            **result,
+            "encoding": encoding,
+            "metadata": file_metadata_response(metadata),
+            "size": stat.st_size,
+            "lastModified": datetime.fromtimestamp(stat.st_mtime).isoformat()
         }
     except HTTPException:
         raise
@@ -450,6 +1091,55 @@ async def get_file_content(filename: str):
         print(f"[ERROR] 读取文件失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# CSV预览缓存：每个文件版本构建一次，大小或mtime变化后重建
+csv_preview_cache = CsvPreviewCache(str(Path(__file__).parent / ".preview_cache"))
+
+
+@app.get("/api/preview/{filename:path}")
+async def preview_csv(filename: str, offset: int = 0, limit: int = 100, columns: Optional[List[str]] = Query(None)):
+    """
+    工作目录中CSV文件的分页预览：返回第offset行起的limit行（最多1000行）
+    columns可重复传入以只返回部分列，默认返回全部列
+    """
+    try:
+        print(f"[API] 收到CSV预览请求: {filename} offset={offset} limit={limit}")
+
+        import urllib.parse
+        decoded_filename = urllib.parse.unquote(filename)
+        file_path = WORKSPACE_DIR / decoded_filename
+
+        # 安全检查：确保文件路径在工作目录内
+        try:
+            file_path.resolve().relative_to(WORKSPACE_DIR.resolve())
+        except ValueError:
+            print(f"[ERROR] 尝试预览工作目录外的文件: {filename}")
+            raise HTTPException(status_code=403, detail="Access denied")
+
+        if not file_path.is_file():
+            print(f"[ERROR] 文件不存在: {filename}")
+            raise HTTPException(status_code=404, detail="File not found")
+
+        try:
+            page = await asyncio.to_thread(csv_preview_cache.page, str(file_path), offset, limit, columns)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        metadata = await asyncio.to_thread(get_file_metadata, str(file_path))
+        stat = file_path.stat()
+        return {
+            "filename": filename,
+            **page,
+            "metadata": file_metadata_response(metadata),
+            "size": stat.st_size,
+            "lastModified": datetime.fromtimestamp(stat.st_mtime).isoformat()
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"[ERROR] CSV预览失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.delete("/api/files/{filename:path}")
 async def delete_file(filename: str):
     """删除文件"""
@@ -538,21 +1228,71 @@ async def update_file_content(filename: str, request: dict):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/agent-states")
-async def get_agent_states():
+async def get_agent_states(session_id: Optional[str] = None):
     """获取Agent状态"""
     try:
         print("[API] 收到Agent状态请求")
-        states = runner.get_camel_agents()
+        states = runner.get_camel_agents(normalize_session_id(session_id))
         print(f"[INFO] 返回 {len(states)} 个Agent状态, 状态列表: {str(states)[:10]}")
         return {"agentStates": states}
     except Exception as e:
         print(f"[ERROR] 获取Agent状态失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/agent-states/changes")
+async def get_agent_state_changes(since: int = -1, session_id: Optional[str] = None):
+    """获取版本since之后的agent状态变更（断线重连后追赶），过旧时返回完整快照"""
+    try:
+        manager = get_manager(normalize_session_id(session_id))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await asyncio.to_thread(manager.get_changes, since)
+
+@app.get("/api/agent-states/{agent_id}/memory")
+async def get_agent_memory(agent_id: str, offset: int = 0, limit: int = 20, session_id: Optional[str] = None):
+    """按记录分页读取agent记忆（状态中只有摘要）"""
+    try:
+        manager = get_manager(normalize_session_id(session_id))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    page = await asyncio.to_thread(manager.get_memory_page, agent_id, offset, limit)
+    if page is None:
+        raise HTTPException(status_code=404, detail=f"Agent不存在: {agent_id}")
+    return page
+
+@app.websocket("/ws/agent-states")
+async def agent_states_websocket(websocket: WebSocket, session_id: Optional[str] = None, since: Optional[int] = None):
+    """WebSocket端点，订阅agent状态变更（按会话），since为客户端已有的版本"""
+    try:
+        session_id = normalize_session_id(session_id)
+    except ValueError:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    await agent_state_channel.subscribe(websocket, session_id, since)
+    try:
+        while True:
+            # 保持连接活跃
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        agent_state_channel.unsubscribe(websocket)
+
 @app.websocket("/ws/titan-output")
-async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket端点，用于实时接收titan.py的输出"""
-    await runner.websocket_manager.connect(websocket)
+async def websocket_endpoint(websocket: WebSocket, session_id: Optional[str] = None, format: str = "text",
+                             resume_from: Optional[int] = None):
+    """
+    WebSocket端点，用于实时接收titan.py的输出（按会话订阅）；format=events时接收带序号的JSON事件
+    连接时先用一帧补发当前运行中seq > resume_from的输出（未提供时补发当前运行的全部输出）
+    """
+    try:
+        session_id = normalize_session_id(session_id)
+    except ValueError:
+        await websocket.close(code=1008)
+        return
+    if format not in OUTPUT_FORMATS:
+        await websocket.close(code=1008)
+        return
+    await runner.websocket_manager.connect(websocket, session_id, format, resume_from)
     try:
         while True:
             # 保持连接活跃
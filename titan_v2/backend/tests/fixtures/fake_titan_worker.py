@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+模拟的titan worker：与titan.py相同的worker协议（就绪标记、stdin任务与取消指令、完成标记），
+每个任务是一次阻塞60秒的模型请求，不需要camel与模型服务
+FAKE_WORKER_MODE=cooperative: 请求经CancellationMiddleware，可被取消指令中止
+FAKE_WORKER_MODE=stuck: 任务不响应取消
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+from utils.cancellation import CancellationMiddleware, TaskCancelled, cancel_scope
+from utils.titan_worker import WorkerStdinReader, WORKER_READY_MARKER, WORKER_DONE_MARKER
+
+
+class SlowBackend:
+    _client = None
+
+
+def slow_request(messages, response_format=None, tools=None):
+    time.sleep(60)  # 模拟长时间的模型请求
+
+
+def main():
+    middleware = CancellationMiddleware(SlowBackend())
+    reader = WorkerStdinReader()
+    reader.start()
+    print(WORKER_READY_MARKER, flush=True)
+    while True:
+        request = reader.next_task()
+        if request is None:
+            break
+        token = reader.begin(request.get("task_id"))
+        status = "ok"
+        try:
+            print("用户: test", flush=True)
+            if os.environ.get("FAKE_WORKER_MODE") == "stuck":
+                time.sleep(60)  # 不响应取消
+            else:
+                with cancel_scope(token):
+                    middleware.run(slow_request, [])
+        except TaskCancelled:
+            status = "cancelled"
+        finally:
+            reader.end()
+        print(f"{WORKER_DONE_MARKER} {json.dumps({'task_id': request.get('task_id'), 'status': status})}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
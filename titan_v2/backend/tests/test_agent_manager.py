@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Agent状态库测试：版本号分配、无变化更新不产生版本、跨连接读取快照、按版本增量获取变更
+用法: python -m pytest tests/test_agent_manager.py
+"""
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from utils import agent_manager
+from utils.agent_manager import AgentManager
+
+
+class AgentManagerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.state_file = os.path.join(tempfile.mkdtemp(), "agent_states.db")
+        self.manager = self.open_manager()
+
+    def open_manager(self):
+        manager = AgentManager(self.state_file)
+        self.addCleanup(manager.close)
+        return manager
+
+
+class VersionTest(AgentManagerTestCase):
+
+    def test_each_write_gets_next_version(self):
+        self.assertEqual(self.manager.get_version(), 0)
+        self.manager.register_agent("a1", "Programmer", "程序员")
+        self.manager.update_agent_status("a1", "thinking")
+        self.manager.update_agent_status("a1", "working", "开始写代码")
+        self.assertEqual(self.manager.get_version(), 3)
+
+    def test_unchanged_update_does_not_consume_version(self):
+        self.manager.register_agent("a1", "Programmer", "程序员")
+        self.manager.update_agent_status("a1", "working", "开始写代码")
+        version = self.manager.get_version()
+        self.manager.update_agent_status("a1", "working")
+        self.manager.update_agent_status("a1", "working", "开始写代码")
+        self.manager.update_agent_status("missing", "working")
+        self.assertEqual(self.manager.get_version(), version)
+
+    def test_memory_is_stored_as_summary(self):
+        self.manager.register_agent("a1", "Programmer", "程序员")
+        self.manager.update_agent_status("a1", "speaking", "结果\n\n" + "x" * 500)
+        agent = self.manager.get_agent_by_id("a1")
+        self.assertTrue(agent.memory.startswith("结果 x"))
+        self.assertTrue(agent.memory.endswith("..."))
+
+    def test_other_connection_sees_updates(self):
+        reader = self.open_manager()
+        self.manager.register_agent("a1", "Programmer", "程序员")
+        self.assertEqual([agent["status"] for agent in reader.get_active_agents()], ["idle"])
+        self.manager.update_agent_status("a1", "working")
+        self.manager.register_agent("a2", "Reviewer", "审查员")
+        states = {agent["agent_id"]: agent["status"] for agent in reader.get_active_agents()}
+        self.assertEqual(states, {"a1": "working", "a2": "idle"})
+        # 删除行后快照整体重建
+        self.manager.clear_agents()
+        self.assertEqual(reader.get_active_agents(), [])
+        self.assertEqual(reader.get_version(), self.manager.get_version())
+
+
+class GetChangesTest(AgentManagerTestCase):
+
+    def test_changes_since_version_contain_only_changed_fields(self):
+        self.manager.register_agent("a1", "Programmer", "程序员")
+        since = self.manager.get_version()
+        self.manager.update_agent_status("a1", "thinking")
+        self.manager.update_agent_status("a1", "speaking", "完成")
+        result = self.manager.get_changes(since)
+        self.assertEqual(result["version"], since + 2)
+        self.assertEqual(result["changes"], [
+            {"op": "update", "status": "thinking", "version": since + 1, "agent_id": "a1"},
+            {"op": "update", "status": "speaking", "memory": "完成", "version": since + 2, "agent_id": "a1"},
+        ])
+
+    def test_up_to_date_subscriber_gets_no_changes(self):
+        self.manager.register_agent("a1", "Programmer", "程序员")
+        version = self.manager.get_version()
+        self.assertEqual(self.manager.get_changes(version), {"version": version, "changes": []})
+
+    def test_full_log_replays_from_zero(self):
+        self.manager.register_agent("a1", "Programmer", "程序员")
+        self.manager.clear_agents()
+        result = self.manager.get_changes(0)
+        self.assertEqual([change["op"] for change in result["changes"]], ["upsert", "clear"])
+        self.assertIsNone(result["changes"][1]["agent_id"])
+
+    def test_future_or_negative_version_returns_snapshot(self):
+        self.manager.register_agent("a1", "Programmer", "程序员")
+        for since in (self.manager.get_version() + 5, -1):
+            result = self.manager.get_changes(since)
+            self.assertTrue(result["reset"])
+            self.assertEqual([agent["agent_id"] for agent in result["agents"]], ["a1"])
+            self.assertEqual(result["version"], self.manager.get_version())
+
+    def test_pruned_log_returns_snapshot(self):
+        with mock.patch.object(agent_manager, "CHANGE_LOG_SIZE", 10):
+            self.manager.register_agent("a1", "Programmer", "程序员")
+            statuses = ["thinking", "working"]
+            # 版本号到达256的倍数时清理保留范围之外的日志
+            for i in range(255):
+                self.manager.update_agent_status("a1", statuses[i % 2])
+        version = self.manager.get_version()
+        self.assertEqual(version, 256)
+        self.assertTrue(self.manager.get_changes(0)["reset"])
+        self.assertTrue(self.manager.get_changes(version - 11)["reset"])
+        result = self.manager.get_changes(version - 10)
+        self.assertNotIn("reset", result)
+        self.assertEqual([change["version"] for change in result["changes"]], list(range(version - 9, version + 1)))
+
+
+if __name__ == "__main__":
+    unittest.main()
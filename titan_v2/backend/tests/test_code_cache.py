@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+代码单元执行缓存测试：纯单元白名单、可复现判定、代码类型参与缓存键、状态版本链中断
+用法: python -m pytest tests/test_code_cache.py
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from utils.code_cache import CodeExecutionMemo, InputFingerprints, is_pure_cell, is_reproducible_cell
+from utils.disk_cache import DiskLRUCache
+
+
+class IsPureCellTest(unittest.TestCase):
+
+    def test_read_only_cells_are_pure(self):
+        for code in [
+            "df.head()",
+            "print(df.describe())",
+            "df.groupby('a')['b'].mean()",
+            "len(df), df.shape",
+            "df['a'].value_counts().head(10)",
+            "pd.read_csv('data.csv').head()",
+            "# 查看前几行\ndf.head()",
+        ]:
+            self.assertTrue(is_pure_cell(code), code)
+
+    def test_unknown_calls_are_impure(self):
+        for code in [
+            "xgb.train(params, d)",
+            "joblib.dump(m, 'm.pkl')",
+            "pickle.dump(m, f)",
+            "fig.write_image('a.png')",
+            "cursor.execute('DELETE FROM t')",
+            "model.predict(X)",
+            "df.apply(f)",
+            "run_analysis(df)",
+        ]:
+            self.assertFalse(is_pure_cell(code), code)
+
+    def test_side_effects_are_impure(self):
+        for code in [
+            "x = 1",
+            "import pandas as pd",
+            "df.sort_values('a', inplace=True)",
+            "df.sample(5)",
+            "np.random.rand(3)",
+            "datetime.now()",
+            "items.append(1)",
+            "df.to_csv('out.csv')",
+            "plt.show()",
+            "(y := 1)",
+            "%matplotlib inline",
+            "",
+        ]:
+            self.assertFalse(is_pure_cell(code), code)
+
+    def test_inplace_false_is_allowed(self):
+        self.assertTrue(is_pure_cell("df.sort_values('a', inplace=False)"))
+
+
+class IsReproducibleCellTest(unittest.TestCase):
+
+    def test_deterministic_statements_are_reproducible(self):
+        for code in [
+            "import pandas as pd",
+            "df = pd.read_csv('data.csv')",
+            "df['c'] = df['a'] + df['b']",
+            "def f(x):\n    return x * 2",
+            "scaler = StandardScaler()",
+            "score = accuracy_score(y, p)",
+        ]:
+            self.assertTrue(is_reproducible_cell(code), code)
+
+    def test_nondeterministic_or_unknown_calls_are_not(self):
+        for code in [
+            "X_train, X_test = train_test_split(X)",
+            "df = df.sample(frac=1)",
+            "model.fit(X, y)",
+            "booster = xgb.train(params, d)",
+            "cursor.execute('SELECT 1')",
+            "now = datetime.now()",
+            "run_analysis(df)",
+            "%pip install xgboost",
+        ]:
+            self.assertFalse(is_reproducible_cell(code), code)
+
+
+class CodeExecutionMemoTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = DiskLRUCache(tempfile.mkdtemp())
+        self.calls = []
+
+    def make_memo(self):
+        return CodeExecutionMemo(self.cache, InputFingerprints(base_dirs=[tempfile.mkdtemp()]))
+
+    def execute(self, code, code_type="python"):
+        self.calls.append((code, code_type))
+        return f"{code_type}:{code}:{len(self.calls)}"
+
+    def test_pure_cell_hits_across_leases(self):
+        first = self.make_memo()
+        first.execute(self.execute, "import pandas as pd")
+        output = first.execute(self.execute, "len([1, 2])")
+        second = self.make_memo()
+        second.execute(self.execute, "import pandas as pd")
+        self.assertEqual(second.execute(self.execute, "len([1, 2])"), output)
+        self.assertEqual(second.hits, 1)
+        self.assertEqual(len(self.calls), 3)
+
+    def test_code_type_is_part_of_key(self):
+        memo = self.make_memo()
+        # bash单元不查找缓存，执行后状态版本链中断
+        memo.execute(self.execute, "len([1])", "bash")
+        self.assertIsNone(memo.state_version)
+        memo = self.make_memo()
+        python_output = memo.execute(self.execute, "len([1])")
+        self.assertTrue(python_output.startswith("python:"))
+        memo = self.make_memo()
+        self.assertTrue(memo.execute(self.execute, "len([1])", code_type="bash").startswith("bash:"))
+        self.assertEqual(memo.hits, 0)
+
+    def test_nondeterministic_cell_disables_cache(self):
+        memo = self.make_memo()
+        memo.execute(self.execute, "len([1])")
+        memo.execute(self.execute, "model.fit(X, y)")
+        self.assertIsNone(memo.state_version)
+        memo.execute(self.execute, "len([1])")
+        self.assertEqual(memo.hits, 0)
+        self.assertEqual(len(self.calls), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+CSV分页预览测试：Arrow与行索引两种方式的分页、列数与表头不一致的行、空文件与只有空行的文件
+用法: python -m pytest tests/test_csv_preview.py
+"""
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from utils import csv_preview, file_metadata
+from utils.csv_preview import ROW_STRIDE, CsvPreviewCache
+
+RAGGED_CSV = "a,b,c\n1,2,3\n4,5\n6,7,8,9\n10,11,12\n"
+
+
+class PreviewTestCase(unittest.TestCase):
+    """默认引擎（安装了pyarrow时为Arrow）；元数据缓存不写入仓库目录"""
+
+    engine = "arrow"
+
+    def setUp(self):
+        if self.engine == "arrow" and csv_preview._import_pyarrow() is None:
+            self.skipTest("pyarrow未安装")
+        self.directory = tempfile.mkdtemp()
+        self.cache = CsvPreviewCache(os.path.join(self.directory, "cache"))
+        for patcher in self.patchers():
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def patchers(self):
+        return [mock.patch.object(file_metadata, "_default_cache", file_metadata.FileMetadataCache())]
+
+    def write(self, name, text, encoding="utf-8"):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding=encoding, newline="") as f:
+            f.write(text)
+        return path
+
+    def test_pages_and_column_selection(self):
+        path = self.write("data.csv", "id,name\n" + "".join(f"{i},行{i}\n" for i in range(ROW_STRIDE * 2 + 10)))
+        page = self.cache.page(path, offset=ROW_STRIDE + 5, limit=3, columns=["name"])
+        self.assertEqual(page["engine"], self.engine)
+        self.assertEqual(page["total_rows"], ROW_STRIDE * 2 + 10)
+        self.assertEqual(page["rows"], [[f"行{i}"] for i in range(ROW_STRIDE + 5, ROW_STRIDE + 8)])
+        self.assertEqual(self.cache.page(path, offset=ROW_STRIDE * 2 + 9, limit=5)["rows"],
+                         [[str(ROW_STRIDE * 2 + 9), f"行{ROW_STRIDE * 2 + 9}"]])
+        with self.assertRaises(ValueError):
+            self.cache.page(path, columns=["missing"])
+
+    def test_gbk_file(self):
+        path = self.write("gbk.csv", "城市,人口\n北京,2189\n", encoding="gbk")
+        page = self.cache.page(path)
+        self.assertEqual((page["columns"], page["rows"]), (["城市", "人口"], [["北京", "2189"]]))
+
+    def test_ragged_rows(self):
+        page = self.cache.page(self.write("ragged.csv", RAGGED_CSV))
+        self.assertEqual(page["columns"], ["a", "b", "c"])
+        self.assertEqual(page["engine"], self.engine)
+        # Arrow跳过列数不一致的行并记录行数
+        self.assertEqual(page["rows"], [["1", "2", "3"], ["10", "11", "12"]])
+        self.assertEqual((page["total_rows"], page["skipped_rows"]), (2, 2))
+
+    def test_skipped_rows_survive_reopen(self):
+        path = self.write("ragged.csv", RAGGED_CSV)
+        self.cache.page(path)
+        reopened = CsvPreviewCache(self.cache.cache_dir)
+        page = reopened.page(path)
+        self.assertEqual(reopened.builds, 0)
+        self.assertEqual(page["skipped_rows"], self.cache.page(path)["skipped_rows"])
+
+    def test_empty_file(self):
+        path = self.write("empty.csv", "")
+        page = self.cache.page(path)
+        self.assertEqual((page["engine"], page["columns"], page["rows"], page["total_rows"]), ("empty", [], [], 0))
+        self.assertEqual(self.cache.builds, 0)
+        with self.assertRaises(ValueError):
+            self.cache.page(path, columns=["a"])
+
+    def test_blank_lines_only(self):
+        # Arrow无法推断列数，改用行索引方式
+        page = self.cache.page(self.write("blank.csv", "\n\n\n"))
+        self.assertEqual((page["engine"], page["columns"], page["rows"], page["total_rows"]), ("index", [], [], 0))
+
+    def test_header_only(self):
+        page = self.cache.page(self.write("header.csv", "a,b\n"))
+        self.assertEqual((page["columns"], page["rows"], page["total_rows"]), (["a", "b"], [], 0))
+
+    def test_rebuilt_when_file_changes(self):
+        path = self.write("data.csv", "a\n1\n")
+        self.cache.page(path)
+        self.write("data.csv", "a\n1\n2\n")
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        self.assertEqual(self.cache.page(path)["total_rows"], 2)
+        self.assertEqual(self.cache.builds, 2)
+
+
+class RowIndexPreviewTest(PreviewTestCase):
+    """未安装pyarrow时的行索引方式"""
+
+    engine = "index"
+
+    def patchers(self):
+        return super().patchers() + [mock.patch.object(csv_preview, "_pyarrow", False)]
+
+    def test_ragged_rows(self):
+        page = self.cache.page(self.write("ragged.csv", RAGGED_CSV))
+        # 行索引方式补空或截断，不跳过
+        self.assertEqual(page["rows"], [["1", "2", "3"], ["4", "5", ""], ["6", "7", "8"], ["10", "11", "12"]])
+        self.assertEqual((page["total_rows"], page["skipped_rows"]), (4, 0))
+
+    def test_quoted_newlines(self):
+        path = self.write("quoted.csv", 'a,b\n"多\n行",1\n2,3\n')
+        self.assertEqual(self.cache.page(path)["rows"], [["多\n行", "1"], ["2", "3"]])
+        self.assertEqual(self.cache.page(path, offset=1)["rows"], [["2", "3"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
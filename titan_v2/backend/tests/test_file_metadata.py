@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+文件元数据测试：编码/分隔符/表头试探、ASCII样本之后出现GBK时的编码确认、按文件版本缓存与持久化
+用法: python -m pytest tests/test_file_metadata.py
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from utils.file_metadata import SNIFF_BYTES, FileMetadataCache, sniff_file
+
+
+class MetadataTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def ascii_prefixed(self, tail):
+        """开头超过一个样本的纯ASCII行，之后是tail"""
+        row = b"1,2,3\n"
+        return b"a,b,c\n" + row * (SNIFF_BYTES // len(row) + 1) + tail
+
+
+class SniffFileTest(MetadataTestCase):
+
+    def test_sniffs_table_layout(self):
+        metadata = sniff_file(self.write("data.csv", "名称;数量\r\n苹果;3\r\n梨;5\r\n".encode("utf-8")))
+        self.assertEqual((metadata.encoding, metadata.line_ending, metadata.delimiter, metadata.has_header),
+                         ("utf-8", "\r\n", ";", True))
+        self.assertTrue(metadata.encoding_confirmed)
+
+    def test_gbk_and_binary(self):
+        self.assertEqual(sniff_file(self.write("gbk.csv", "名称,数量\n苹果,3\n".encode("gbk"))).encoding, "gbk")
+        binary = sniff_file(self.write("data.bin", b"\x00\x01\x02"))
+        self.assertFalse(binary.is_text)
+        self.assertIsNone(binary.encoding)
+
+    def test_numeric_first_row_is_not_header(self):
+        self.assertFalse(sniff_file(self.write("data.csv", b"1,2\n3,4\n")).has_header)
+
+    def test_short_ascii_file_is_confirmed(self):
+        self.assertTrue(sniff_file(self.write("data.csv", b"a,b\n1,2\n")).encoding_confirmed)
+
+    def test_ascii_sample_of_longer_file_is_unconfirmed(self):
+        metadata = sniff_file(self.write("data.csv", self.ascii_prefixed("北京,上海,广州\n".encode("gbk"))))
+        self.assertEqual(metadata.encoding, "utf-8")
+        self.assertFalse(metadata.encoding_confirmed)
+
+
+class FileMetadataCacheTest(MetadataTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.persist_path = os.path.join(self.directory, "metadata.json")
+
+    def test_confirms_gbk_after_ascii_sample(self):
+        cache = FileMetadataCache(self.persist_path)
+        path = self.write("data.csv", self.ascii_prefixed("北京,上海,广州\n".encode("gbk")))
+        self.assertFalse(cache.get(path).encoding_confirmed)
+        metadata = cache.get(path, confirm=True)
+        self.assertEqual((metadata.encoding, metadata.encoding_confirmed), ("gbk", True))
+        # 每个文件版本只确认一次
+        self.assertEqual(cache.get(path, confirm=True).encoding, "gbk")
+        self.assertEqual(cache.confirmations, 1)
+
+    def test_confirms_utf8_after_ascii_sample(self):
+        cache = FileMetadataCache(self.persist_path)
+        path = self.write("data.csv", self.ascii_prefixed("北京,上海,广州\n".encode("utf-8")))
+        metadata = cache.get(path, confirm=True)
+        self.assertEqual((metadata.encoding, metadata.encoding_confirmed), ("utf-8", True))
+
+    def test_cached_per_file_version(self):
+        cache = FileMetadataCache(self.persist_path)
+        path = self.write("data.csv", b"a,b\n1,2\n")
+        cache.get(path)
+        cache.get(path)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        with open(path, 'ab') as f:
+            f.write(b"3,4\n")
+        cache.get(path)
+        self.assertEqual(cache.misses, 2)
+
+    def test_confirmation_persists_across_processes(self):
+        path = self.write("data.csv", self.ascii_prefixed("北京,上海,广州\n".encode("gbk")))
+        FileMetadataCache(self.persist_path).get(path, confirm=True)
+        reopened = FileMetadataCache(self.persist_path)
+        metadata = reopened.get(path)
+        self.assertEqual((metadata.encoding, metadata.encoding_confirmed), ("gbk", True))
+        self.assertEqual((reopened.hits, reopened.misses), (1, 0))
+
+    def test_evicts_least_recently_used(self):
+        cache = FileMetadataCache(self.persist_path, max_entries=2)
+        paths = [self.write(f"{i}.csv", b"a,b\n1,2\n") for i in range(3)]
+        for path in paths:
+            cache.get(path)
+        self.assertEqual(cache.get_stats()["entries"], 2)
+        cache.get(paths[0])
+        self.assertEqual(cache.misses, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+LLM响应缓存测试：键的规范化（忽略状态栏时间、流式配置）与按总大小的LRU淘汰
+用法: python -m pytest tests/test_llm_cache.py
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from utils.llm_cache import CACHE_MODES, LLMCacheMiddleware, LLMResponseCache
+
+
+class FakeBackend:
+    model_type = "gpt-test"
+
+    def __init__(self, **config):
+        self.model_config_dict = dict({"temperature": 0.0}, **config)
+
+
+def messages_with_status(time_text):
+    return [
+        {"role": "system", "content": "你是数据分析助手"},
+        {"role": "user", "content": f"分析数据\n状态栏丨时间信息丨{time_text}\n状态栏丨文件信息丨data.csv"}
+    ]
+
+
+class MakeKeyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = LLMResponseCache(tempfile.mkdtemp())
+
+    def test_status_bar_time_is_ignored(self):
+        middleware = LLMCacheMiddleware(self.cache, FakeBackend())
+        self.assertEqual(middleware.make_key(messages_with_status("2025-01-01 10:00:00")),
+                         middleware.make_key(messages_with_status("2025-06-30 23:59:59")))
+
+    def test_other_content_changes_key(self):
+        middleware = LLMCacheMiddleware(self.cache, FakeBackend())
+        messages = messages_with_status("2025-01-01 10:00:00")
+        changed = messages_with_status("2025-01-01 10:00:00")
+        changed[1]["content"] = changed[1]["content"].replace("data.csv", "other.csv")
+        self.assertNotEqual(middleware.make_key(messages), middleware.make_key(changed))
+        tools = [{"type": "function", "function": {"name": "execute_code"}}]
+        self.assertNotEqual(middleware.make_key(messages), middleware.make_key(messages, tools=tools))
+
+    def test_stream_flag_shares_key_but_config_does_not(self):
+        messages = messages_with_status("2025-01-01 10:00:00")
+        key = LLMCacheMiddleware(self.cache, FakeBackend()).make_key(messages)
+        self.assertEqual(key, LLMCacheMiddleware(self.cache, FakeBackend(stream=True)).make_key(messages))
+        self.assertNotEqual(key, LLMCacheMiddleware(self.cache, FakeBackend(temperature=0.7)).make_key(messages))
+
+    def test_custom_volatile_patterns(self):
+        middleware = LLMCacheMiddleware(self.cache, FakeBackend(), volatile_patterns=[r"run-\d+"])
+        self.assertEqual(middleware.make_key([{"role": "user", "content": "run-1 结果"}]),
+                         middleware.make_key([{"role": "user", "content": "run-2 结果"}]))
+
+    def test_unknown_mode_rejected(self):
+        self.assertIn("replay", CACHE_MODES)
+        with self.assertRaises(ValueError):
+            LLMCacheMiddleware(self.cache, FakeBackend(), mode="offline")
+
+
+class EvictionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def entry_size(self):
+        probe = LLMResponseCache(tempfile.mkdtemp())
+        probe.put("0" * 64, {"text": "x" * 100})
+        return probe.total_bytes
+
+    def test_evicts_least_recently_used_down_to_90_percent(self):
+        size = self.entry_size()
+        cache = LLMResponseCache(self.directory, max_bytes=size * 10)
+        keys = [f"{i:064x}" for i in range(10)]
+        for key in keys:
+            cache.put(key, {"text": "x" * 100})
+        self.assertEqual(cache.evictions, 0)
+        # 最早写入的键被访问过，不应被淘汰
+        self.assertIsNotNone(cache.get(keys[0]))
+
+        cache.put(f"{10:064x}", {"text": "x" * 100})
+        self.assertLessEqual(cache.total_bytes, size * 10 * 0.9)
+        self.assertEqual(cache.evictions, 2)
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertIsNone(cache.get(keys[2]))
+        self.assertIsNotNone(cache.get(keys[3]))
+        self.assertFalse(os.path.exists(cache._path(keys[1])))
+
+    def test_index_and_order_survive_restart(self):
+        size = self.entry_size()
+        cache = LLMResponseCache(self.directory, max_bytes=size * 3)
+        for i in range(3):
+            cache.put(f"{i:064x}", {"text": "x" * 100})
+        cache.get(f"{0:064x}")
+
+        reopened = LLMResponseCache(self.directory, max_bytes=size * 3)
+        self.assertEqual(reopened.total_bytes, cache.total_bytes)
+        reopened.put(f"{3:064x}", {"text": "x" * 100})
+        self.assertIsNotNone(reopened.get(f"{0:064x}"))
+        self.assertIsNone(reopened.get(f"{1:064x}"))
+
+    def test_middleware_reports_evictions_per_task(self):
+        size = self.entry_size()
+        cache = LLMResponseCache(self.directory, max_bytes=size * 2)
+        middleware = LLMCacheMiddleware(cache, FakeBackend())
+        for i in range(4):
+            cache.put(f"{i:064x}", {"text": "x" * 100})
+        self.assertGreater(middleware.get_stats()["evictions"], 0)
+        middleware.reset_stats()
+        self.assertEqual(middleware.get_stats()["evictions"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+输出回放缓冲测试：溢出到文件、稀疏索引定位、补发边界，以及溢出写入期间与新运行的交错
+用法: python -m pytest tests/test_replay_buffer.py
+"""
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from utils import replay_buffer
+from utils.replay_buffer import ReplayBuffer
+
+
+def events(count, kind="output"):
+    return [{"kind": kind, "text": f"line {i}"} for i in range(count)]
+
+
+def seqs(catchup):
+    return [event["seq"] for event in catchup.load()]
+
+
+def spill(buffer):
+    """同步完成所有待写入的溢出（main.py中在线程里写）"""
+    batch = buffer.take_spill()
+    while batch is not None:
+        batch.write()
+        buffer.finish_spill(batch)
+        batch = buffer.take_spill()
+
+
+class ReplayBufferTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.spill_path = os.path.join(tempfile.mkdtemp(), "replay", "output.jsonl")
+        patcher = mock.patch.object(replay_buffer, "_INDEX_STRIDE", 4)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_buffer(self, max_memory_events=5):
+        return ReplayBuffer(self.spill_path, max_memory_events=max_memory_events)
+
+
+class SpillTest(ReplayBufferTestCase):
+
+    def test_overflow_spills_oldest_events(self):
+        buffer = self.make_buffer()
+        buffer.extend(events(5))
+        self.assertIsNone(buffer.take_spill())
+        self.assertFalse(os.path.exists(self.spill_path))
+        buffer.extend(events(8))
+        spill(buffer)
+        stats = buffer.get_stats()
+        self.assertEqual((stats["memory_events"], stats["spilled_events"]), (5, 8))
+        self.assertEqual(stats["spilled_bytes"], os.path.getsize(self.spill_path))
+        # 每_INDEX_STRIDE条溢出事件记录一次偏移
+        self.assertEqual([seq for seq, _ in buffer._spill_index], [1, 5])
+
+    def test_index_offsets_point_at_lines(self):
+        buffer = self.make_buffer(max_memory_events=1)
+        for _ in range(11):
+            buffer.extend(events(1))
+            spill(buffer)
+        self.assertEqual([seq for seq, _ in buffer._spill_index], [1, 5, 9])
+        with open(self.spill_path, 'rb') as f:
+            data = f.read()
+        for seq, offset in buffer._spill_index:
+            self.assertTrue(data[offset:].startswith(b'{'))
+            self.assertIn(f'"seq": {seq}}}'.encode(), data[offset:].split(b"\n", 1)[0])
+
+    def test_events_stay_visible_while_batch_is_written(self):
+        buffer = self.make_buffer()
+        buffer.extend(events(8))
+        batch = buffer.take_spill()
+        self.assertEqual([event["seq"] for event in batch.events], [1, 2, 3])
+        # 上一批写完之前不会取出下一批
+        buffer.extend(events(2))
+        self.assertIsNone(buffer.take_spill())
+        self.assertEqual(seqs(buffer.catchup(None)), list(range(1, 11)))
+        batch.write()
+        buffer.finish_spill(batch)
+        self.assertEqual(seqs(buffer.catchup(None)), list(range(1, 11)))
+        spill(buffer)
+        self.assertEqual(buffer.get_stats()["memory_events"], 5)
+        self.assertEqual(seqs(buffer.catchup(None)), list(range(1, 11)))
+
+    def test_failed_write_keeps_events_in_memory(self):
+        buffer = self.make_buffer()
+        buffer.extend(events(8))
+        batch = buffer.take_spill()
+        buffer.finish_spill(batch, written=False)
+        self.assertEqual(buffer.get_stats()["memory_events"], 8)
+        self.assertIsNotNone(buffer.take_spill())
+
+    def test_new_run_during_write_discards_batch_and_overwrites_file(self):
+        buffer = self.make_buffer()
+        buffer.extend(events(8))
+        batch = buffer.take_spill()
+        buffer.begin_run()
+        batch.write()
+        buffer.finish_spill(batch)
+        self.assertEqual(buffer.get_stats()["memory_events"], 0)
+        buffer.extend(events(7))
+        spill(buffer)
+        self.assertEqual(seqs(buffer.catchup(None)), list(range(9, 16)))
+        with open(self.spill_path, encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 2)
+
+
+class CatchupTest(ReplayBufferTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.buffer = self.make_buffer()
+        self.buffer.extend(events(20))
+        spill(self.buffer)
+
+    def test_resume_from_every_position(self):
+        for after_seq in range(0, 21):
+            catchup = self.buffer.catchup(after_seq)
+            self.assertFalse(catchup.reset, after_seq)
+            self.assertEqual(seqs(catchup), list(range(after_seq + 1, 21)), after_seq)
+
+    def test_spill_file_only_read_when_needed(self):
+        self.assertIsNone(self.buffer.catchup(15).spill_path)
+        self.assertIsNotNone(self.buffer.catchup(14).spill_path)
+        # 从索引点开始读，而不是文件开头
+        self.assertGreater(self.buffer.catchup(10).spill_offset, 0)
+        self.assertEqual(self.buffer.catchup(0).spill_offset, 0)
+
+    def test_up_to_date_client_gets_nothing(self):
+        catchup = self.buffer.catchup(20)
+        self.assertFalse(catchup.reset)
+        self.assertEqual(catchup.load(), [])
+
+    def test_unknown_sequence_replays_current_run(self):
+        for after_seq in (None, 21, 100):
+            catchup = self.buffer.catchup(after_seq)
+            self.assertTrue(catchup.reset)
+            self.assertEqual(seqs(catchup), list(range(1, 21)))
+
+    def test_previous_run_sequence_resets(self):
+        self.buffer.begin_run()
+        self.buffer.extend(events(3))
+        self.assertEqual(self.buffer.first_seq, 21)
+        catchup = self.buffer.catchup(10)
+        self.assertTrue(catchup.reset)
+        self.assertEqual(seqs(catchup), [21, 22, 23])
+        self.assertFalse(self.buffer.catchup(20).reset)
+
+    def test_load_ignores_events_spilled_after_catchup(self):
+        catchup = self.buffer.catchup(0)
+        self.buffer.extend(events(10))
+        spill(self.buffer)
+        self.assertEqual(seqs(catchup), list(range(1, 21)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+分块上传存储测试：按内容去重、按upload_id续传（包括服务重启后）、同名文件改名或覆盖
+用法: python -m pytest tests/test_upload_store.py
+"""
+import hashlib
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from utils.upload_store import UploadStore
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class UploadStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.workspace = tempfile.mkdtemp()
+        self.store = UploadStore(self.workspace, chunk_size=4)
+
+    def upload(self, filename, data, overwrite=False, store=None):
+        store = store or self.store
+        info = store.init(filename, len(data), sha256(data), overwrite)
+        if info["status"] == "complete":
+            return info
+        session = store.get(info["upload_id"])
+        for start in range(0, len(data), store.chunk_size):
+            store.append(session, data[start:start + store.chunk_size])
+        return store.complete(session)
+
+    def read(self, filename):
+        with open(os.path.join(self.workspace, filename), 'rb') as f:
+            return f.read()
+
+    def write(self, filename, data):
+        with open(os.path.join(self.workspace, filename), 'wb') as f:
+            f.write(data)
+
+
+class DeduplicationTest(UploadStoreTestCase):
+
+    def test_known_hash_completes_at_init(self):
+        self.upload("a.csv", b"x,y\n1,2\n")
+        info = self.store.init("b.csv", 8, sha256(b"x,y\n1,2\n"))
+        self.assertEqual((info["status"], info["deduplicated"], info["filename"]), ("complete", True, "b.csv"))
+        self.assertEqual(self.read("b.csv"), b"x,y\n1,2\n")
+        self.assertEqual(self.store.uploaded_bytes, 8)
+
+    def test_same_content_without_hash_is_stored_once(self):
+        for name in ("a.csv", "b.csv"):
+            info = self.store.init(name, 4)
+            session = self.store.get(info["upload_id"])
+            self.store.append(session, b"data")
+            result = self.store.complete(session)
+        self.assertTrue(result["deduplicated"])
+        self.assertEqual((self.store.stored, self.store.deduplicated), (1, 1))
+
+    def test_size_mismatch_is_not_deduplicated(self):
+        self.upload("a.csv", b"data")
+        self.assertEqual(self.store.init("b.csv", 5, sha256(b"data"))["status"], "pending")
+
+    def test_workspace_copy_is_independent(self):
+        self.upload("a.csv", b"data")
+        self.write("a.csv", b"edited")
+        info = self.upload("b.csv", b"data")
+        self.assertTrue(info["deduplicated"])
+        self.assertEqual(self.read("b.csv"), b"data")
+
+    def test_hash_mismatch_discards_upload(self):
+        info = self.store.init("a.csv", 4, sha256(b"good"))
+        session = self.store.get(info["upload_id"])
+        self.store.append(session, b"evil")
+        with self.assertRaises(ValueError):
+            self.store.complete(session)
+        self.assertIsNone(self.store.get(info["upload_id"]))
+        self.assertFalse(os.path.exists(os.path.join(self.workspace, "a.csv")))
+
+    def test_rejects_data_beyond_declared_size(self):
+        session = self.store.get(self.store.init("a.csv", 3)["upload_id"])
+        with self.assertRaises(ValueError):
+            self.store.append(session, b"data")
+
+
+class ResumeTest(UploadStoreTestCase):
+
+    def test_resume_with_upload_id(self):
+        data = b"0123456789"
+        info = self.store.init("a.csv", len(data), sha256(data))
+        self.store.append(self.store.get(info["upload_id"]), data[:4])
+        resumed = self.store.init("a.csv", len(data), sha256(data), upload_id=info["upload_id"])
+        self.assertEqual((resumed["upload_id"], resumed["offset"]), (info["upload_id"], 4))
+
+    def test_resume_after_restart(self):
+        data = b"0123456789"
+        info = self.store.init("a.csv", len(data), sha256(data))
+        self.store.append(self.store.get(info["upload_id"]), data[:6])
+        restarted = UploadStore(self.workspace, chunk_size=4)
+        resumed = restarted.init("a.csv", len(data), sha256(data), upload_id=info["upload_id"])
+        self.assertEqual(resumed["offset"], 6)
+        session = restarted.get(resumed["upload_id"])
+        restarted.append(session, data[6:])
+        self.assertEqual(restarted.complete(session)["sha256"], sha256(data))
+        self.assertEqual(self.read("a.csv"), data)
+
+    def test_changed_parameters_start_new_upload(self):
+        info = self.store.init("a.csv", 10)
+        self.store.append(self.store.get(info["upload_id"]), b"0123")
+        for args in (("b.csv", 10), ("a.csv", 11)):
+            other = self.store.init(*args, upload_id=info["upload_id"])
+            self.assertNotEqual(other["upload_id"], info["upload_id"])
+            self.assertEqual(other["offset"], 0)
+        self.assertEqual(self.store.init("a.csv", 10, overwrite=True, upload_id=info["upload_id"])["offset"], 0)
+
+    def test_unknown_or_invalid_upload_id(self):
+        self.assertIsNone(self.store.get("0" * 32))
+        self.assertIsNone(self.store.get("../uploads"))
+        self.assertEqual(self.store.init("a.csv", 4, upload_id="../x")["offset"], 0)
+
+
+class ConflictTest(UploadStoreTestCase):
+
+    def test_different_content_is_renamed(self):
+        self.write("data.csv", b"old")
+        self.assertEqual(self.upload("data.csv", b"new")["filename"], "data (1).csv")
+        self.assertEqual(self.upload("data.csv", b"newer")["filename"], "data (2).csv")
+        self.assertEqual(self.read("data.csv"), b"old")
+        self.assertEqual(self.store.renamed, 2)
+
+    def test_same_content_is_not_renamed(self):
+        self.upload("data.csv", b"same")
+        self.assertEqual(self.upload("data.csv", b"same")["filename"], "data.csv")
+        self.assertEqual(self.store.renamed, 0)
+
+    def test_overwrite_replaces_file(self):
+        self.write("data.csv", b"old")
+        self.assertEqual(self.upload("data.csv", b"new", overwrite=True)["filename"], "data.csv")
+        self.assertEqual(self.read("data.csv"), b"new")
+
+    def test_single_request_upload_overwrites(self):
+        # /api/upload：未知大小与哈希，指定overwrite
+        self.write("data.csv", b"old")
+        info = self.store.init("data.csv", None, overwrite=True)
+        session = self.store.get(info["upload_id"])
+        self.store.append(session, b"new")
+        self.assertEqual(self.store.complete(session)["filename"], "data.csv")
+        self.assertEqual(self.read("data.csv"), b"new")
+
+    def test_invalid_filenames(self):
+        for name in ("", ".env", "dir/"):
+            with self.assertRaises(ValueError):
+                self.store.init(name, 1)
+        self.assertEqual(self.upload("../../a.csv", b"x")["filename"], "a.csv")
+
+
+if __name__ == "__main__":
+    unittest.main()
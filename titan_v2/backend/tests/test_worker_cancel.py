@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+取消到空闲的延迟测试：使用tests/fixtures/fake_titan_worker.py模拟worker（与titan.py相同的worker协议）
+- cooperative: 取消指令中止阻塞中的模型请求，worker很快回到空闲并可继续接收任务
+- stuck: 任务不响应取消，超时后结束进程并在后台重新拉起；shutdown时不留下任何worker进程
+用法: python -m pytest tests/test_worker_cancel.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BACKEND_DIR)
+
+from utils.titan_worker import TitanWorkerPool
+
+FAKE_WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "fake_titan_worker.py")
+
+COOPERATIVE_MAX_SECONDS = 1.0
+CANCEL_TIMEOUT = 1.0
+
+
+async def ignore(_line):
+    pass
+
+
+class WorkerCancelTest(unittest.IsolatedAsyncioTestCase):
+
+    def make_pool(self, mode):
+        env = dict(os.environ, FAKE_WORKER_MODE=mode, PYTHONUNBUFFERED="1")
+        return TitanWorkerPool(1, sys.executable, FAKE_WORKER, tempfile.mkdtemp(), env)
+
+    async def run_and_cancel(self, pool, task_id):
+        worker = await pool.acquire()
+        task = asyncio.create_task(worker.run_task({"task_id": task_id, "task": "test"}, on_output=ignore))
+        await asyncio.sleep(0.3)
+        latency = await worker.cancel(timeout=CANCEL_TIMEOUT)
+        try:
+            status = (await task).get("status")
+        except RuntimeError:
+            status = "killed"
+        pool.release(worker)
+        return worker, latency, status
+
+    async def test_cooperative_cancel_to_idle(self):
+        pool = self.make_pool("cooperative")
+        try:
+            for i in range(3):
+                worker, latency, status = await self.run_and_cancel(pool, str(i))
+                self.assertEqual(status, "cancelled")
+                self.assertLess(latency, COOPERATIVE_MAX_SECONDS)
+                # 同一个进程回到空闲，没有被重启
+                self.assertTrue(worker.is_alive)
+                self.assertEqual(worker.kills, 0)
+        finally:
+            await pool.shutdown()
+
+    async def test_stuck_task_is_killed_and_respawned(self):
+        pool = self.make_pool("stuck")
+        try:
+            worker, latency, status = await self.run_and_cancel(pool, "0")
+            self.assertEqual(status, "killed")
+            self.assertGreaterEqual(latency, CANCEL_TIMEOUT)
+            self.assertLess(latency, CANCEL_TIMEOUT + COOPERATIVE_MAX_SECONDS)
+            self.assertEqual(worker.kills, 1)
+            # 后台重启后worker重新可用
+            respawned = await asyncio.wait_for(pool.acquire(), timeout=10)
+            self.assertTrue(respawned.is_alive)
+            pool.release(respawned)
+        finally:
+            await pool.shutdown()
+
+    async def test_shutdown_during_respawn_leaves_no_process(self):
+        pool = self.make_pool("stuck")
+        worker, _, status = await self.run_and_cancel(pool, "0")
+        self.assertEqual(status, "killed")
+        # release已在后台开始重启，立即关闭进程池
+        await pool.shutdown()
+        self.assertFalse(pool._respawn_tasks)
+        self.assertIsNone(worker.process)
+        self.assertTrue(worker.stderr_task is None or worker.stderr_task.done())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Mermaid工作流编译测试：节点形状与标签、链式边、起点识别与回边标记
+用法: python -m pytest tests/test_workflow_engine.py
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BACKEND_DIR)
+
+from utils.workflow_engine import load_workflow, parse_mermaid
+
+
+def back_edges(workflow):
+    return sorted((edge.source, edge.target) for edges in workflow.edges.values() for edge in edges if edge.is_back_edge)
+
+
+class ParseMermaidTest(unittest.TestCase):
+
+    def test_node_shapes_and_labels(self):
+        workflow = parse_mermaid("""
+flowchart TD
+    S(["开始"])
+    P["Programmer"]
+    R[[Reviewer]]
+    D{"结果是否满意?"}
+    E((结束))
+    X
+""")
+        kinds = {node_id: (node.kind, node.label) for node_id, node in workflow.nodes.items()}
+        self.assertEqual(kinds, {
+            "S": ("terminal", "开始"),
+            "P": ("task", "Programmer"),
+            "R": ("task", "Reviewer"),
+            "D": ("decision", "结果是否满意?"),
+            "E": ("terminal", "结束"),
+            "X": ("task", "X"),
+        })
+
+    def test_chained_and_labelled_edges(self):
+        workflow = parse_mermaid("""
+graph LR
+    A --> B -->|是| C;  %% 注释
+    B -.-> D
+    C ==> D
+""")
+        self.assertEqual([(edge.target, edge.label) for edge in workflow.outgoing("A")], [("B", "")])
+        self.assertEqual([(edge.target, edge.label) for edge in workflow.outgoing("B")], [("C", "是"), ("D", "")])
+        self.assertEqual([edge.target for edge in workflow.outgoing("C")], ["D"])
+        self.assertEqual(workflow.outgoing("D"), [])
+
+    def test_later_definition_updates_edge_only_node(self):
+        workflow = parse_mermaid("""
+flowchart TD
+    A --> B
+    B{"继续?"}
+""")
+        self.assertEqual(workflow.nodes["B"].kind, "decision")
+        self.assertEqual(workflow.nodes["B"].label, "继续?")
+
+    def test_ignores_styling_and_subgraphs(self):
+        workflow = parse_mermaid("""
+flowchart TD
+    subgraph 分析
+    A --> B
+    end
+    classDef hot fill:#f00
+    class A hot
+    style B fill:#0f0
+""")
+        self.assertEqual(set(workflow.nodes), {"A", "B"})
+
+    def test_start_nodes(self):
+        # 终端形状且无入边的节点优先
+        workflow = parse_mermaid('flowchart TD\n    X --> A\n    S(["开始"]) --> A\n')
+        self.assertEqual(workflow.start_nodes, ["S"])
+        # 没有终端形状时取所有无入边节点
+        workflow = parse_mermaid("flowchart TD\n    X --> A\n    Y --> A\n")
+        self.assertEqual(workflow.start_nodes, ["X", "Y"])
+        # 纯环图取第一个声明的节点
+        workflow = parse_mermaid("flowchart TD\n    B --> C\n    C --> B\n")
+        self.assertEqual(workflow.start_nodes, ["B"])
+
+
+class BackEdgeTest(unittest.TestCase):
+
+    def test_acyclic_graph_has_no_back_edges(self):
+        workflow = parse_mermaid("""
+flowchart TD
+    S(["开始"]) --> A
+    S --> B
+    A --> C
+    B --> C
+""")
+        self.assertEqual(back_edges(workflow), [])
+
+    def test_simple_cycle(self):
+        workflow = parse_mermaid("flowchart TD\n    A --> B\n    B --> C\n    C --> A\n")
+        self.assertEqual(back_edges(workflow), [("C", "A")])
+
+    def test_decision_loop_and_self_loop(self):
+        workflow = parse_mermaid("""
+flowchart TD
+    S(["开始"]) --> P[Programmer]
+    P --> D{"结果是否满意?"}
+    D -->|否| P
+    D -->|是| E(["结束"])
+    E --> E
+""")
+        self.assertEqual(back_edges(workflow), [("D", "P"), ("E", "E")])
+
+    def test_nested_cycles(self):
+        workflow = parse_mermaid("""
+flowchart TD
+    S(["开始"]) --> A
+    A --> B
+    B --> C
+    C --> B
+    C --> A
+    C --> E(["结束"])
+""")
+        self.assertEqual(back_edges(workflow), [("C", "A"), ("C", "B")])
+
+    def test_back_edges_found_from_start_node(self):
+        # 深度优先从起点开始，回边是指回起点方向的边，而不是声明顺序中先出现的节点
+        workflow = parse_mermaid("""
+flowchart TD
+    B --> C
+    C --> B
+    S(["开始"]) --> C
+""")
+        self.assertEqual(back_edges(workflow), [("B", "C")])
+
+    def test_repository_workflows_compile(self):
+        directory = os.path.join(BACKEND_DIR, "fresh_workflow")
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".mmd"):
+                workflow = load_workflow(os.path.join(directory, name))
+                self.assertTrue(workflow.start_nodes, name)
+                self.assertTrue(set(workflow.start_nodes) <= set(workflow.nodes), name)
+
+
+class LoadWorkflowTest(unittest.TestCase):
+
+    def test_cached_per_file_version(self):
+        path = os.path.join(tempfile.mkdtemp(), "flow.mmd")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("flowchart TD\n    A --> B\n")
+        first = load_workflow(path)
+        self.assertIs(load_workflow(path), first)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("flowchart TD\n    A --> B\n    B --> A\n")
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        second = load_workflow(path)
+        self.assertIsNot(second, first)
+        self.assertEqual(back_edges(second), [("B", "A")])
+
+
+if __name__ == "__main__":
+    unittest.main()
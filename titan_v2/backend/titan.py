@@ -1,138 +1,373 @@
 # -*- coding: utf-8 -*-
 import json
 import sys
-from tqdm import tqdm
 import os
+import threading
 
 sys.stdout.reconfigure(line_buffering=True)   # 非缓冲模式实时输出
 os.environ['PYTHONUNBUFFERED'] = '1'  # 设置环境变量PYTHONUNBUFFERED环境变量
 
 from camel.models import ModelFactory
 from camel.types import ModelPlatformType
-from camel.toolkits import CodeExecutionToolkit
 from camel.messages import BaseMessage
+from camel.types import OpenAIBackendRole
 
 from dotenv import load_dotenv
-from utils.utils import chat_terminate
+from utils.utils import chat_terminate, dump_memory, restore_memory
 from utils.status_bar import create_status_bar
-from utils.agent_manager import update_agent_status
+from utils.agent_manager import update_agent_status, publish_agent_memory, use_session
+from utils.context_tracker import ContextTracker
+from utils.memory_compactor import MemoryCompactor
+from utils.workflow_engine import WorkflowEngine, load_workflow
+from utils.async_steps import AgentStep, AsyncAgentStepper
 from utils.agent_factory import create_agents_from_config
 from utils.logger import auto_logger
+from utils.kernel_pool import KernelPool
+from utils.model_middleware import install_model_middleware, get_model_middleware
+from utils.llm_cache import LLMResponseCache, LLMCacheMiddleware
+from utils.disk_cache import DiskLRUCache
+from utils.token_stream import TokenStreamMiddleware, token_stream_tags, current_stream_tags
+from utils.titan_events import emit, install_event_stdout
+from utils.prompt_cache_stats import PromptCacheStatsMiddleware, StatusSuffixMiddleware
+from utils.tool_output_spill import ArtifactStore, create_run_artifact_store, wrap_tools_with_spill
+from utils.checkpoint import CheckpointStore, wrap_tools_with_checkpoint
+from utils.code_cache import CodeExecutionMemo, InputFingerprints, wrap_tools_with_memo
+from utils.session import get_session_dir
+from utils.cancellation import CancellationMiddleware, TaskCancelled, cancel_scope
+from utils.titan_worker import WORKER_FLAG, WORKER_READY_MARKER, WORKER_DONE_MARKER, TASK_START_PREFIX, WorkerStdinReader
 
 
 # load .env
 load_dotenv()
-api_key = os.getenv("DEEPSEEK_API_KEY")
-model_type = os.getenv("MODEL_TYPE")
-api_url = os.getenv("API_URL")
-initial_message = os.getenv("CAMEL_TASK")
 work_dir = os.path.dirname(os.path.abspath(__file__)) # 获取当前脚本所在目录
+log_directory = os.path.join(work_dir, "logs")
+packages_to_install = ["numpy","pandas", "matplotlib","seaborn","scikit-learn"]
 
 
-# clean terminate signal file 
-terminate_signal_file = os.path.join(work_dir, 'terminate_signal.txt')
-if os.path.exists(terminate_signal_file):
-    os.remove(terminate_signal_file)
+def clear_terminate_signal(session_dir=work_dir):
+    """clean terminate signal file"""
+    terminate_signal_file = os.path.join(session_dir, 'terminate_signal.txt')
+    if os.path.exists(terminate_signal_file):
+        os.remove(terminate_signal_file)
 
 
-if __name__ == "__main__":
-    # log to backend/logs
-    log_directory = os.path.join(work_dir, "logs")
-    with auto_logger(log_dir=log_directory):
-        
-        # llm config
-        model = ModelFactory.create(
-            model_platform=ModelPlatformType.OPENAI_COMPATIBLE_MODEL,
-            model_type=model_type, 
-            api_key=api_key,       
-            url=api_url, 
-            model_config_dict={ "temperature": 0.7,"max_tokens": 8000}
+clear_terminate_signal()
+
+
+_llm_cache = None
+
+
+def get_llm_cache():
+    """LLM响应缓存在进程内只加载一次索引"""
+    global _llm_cache
+    if _llm_cache is None:
+        _llm_cache = LLMResponseCache(
+            cache_dir=os.path.join(work_dir, '.llm_cache'),
+            max_bytes=int(os.getenv("TITAN_LLM_CACHE_MAX_MB", "512")) * 1024 * 1024
         )
+    return _llm_cache
 
-        # tool: code execution
-        print("--------------------------------------------------")
-        code_toolkit = CodeExecutionToolkit(sandbox="jupyter",verbose=False,require_confirm=True  )
-        packages_to_install = ["numpy","pandas", "matplotlib","seaborn","scikit-learn"]
-        print("[SYSTEM] Loading Python Environment: ", packages_to_install)
-        for package in tqdm(packages_to_install, desc="Installing Dependencies Progress"):
-            try:
-                result = code_toolkit.execute_command(f"pip install {package}")
-            except Exception as e:
-                print(f"[ERROR] Failed to install {package}: {e}")
-        print("[SYSTEM] Python Environment Loading Complete")
-        print("--------------------------------------------------")
-        code_tools = code_toolkit.get_tools() 
-
-        # bar : status_bar for programmer
-        status_bar = create_status_bar(packages=packages_to_install)
-
-        # group chat config
-        agent_map = create_agents_from_config(
-            prompts_json_path=os.path.join(work_dir, 'prompts.json'),
-            model=model,
-            status=status_bar,
-            code_tools=code_tools,
-            token_limit=36000  # max history context
+
+_code_cache = None
+
+
+def get_code_cache():
+    """代码单元执行缓存与输入文件哈希在进程内共享，跨运行复用"""
+    global _code_cache
+    if _code_cache is None:
+        _code_cache = (
+            DiskLRUCache(
+                cache_dir=os.path.join(work_dir, '.code_cache'),
+                max_bytes=int(os.getenv("TITAN_CODE_CACHE_MAX_MB", "256")) * 1024 * 1024
+            ),
+            InputFingerprints(base_dirs=[os.getcwd(), work_dir])
         )
-        AGENT_LIST = list(agent_map.keys())
-        conversation_history = []
-        max_rounds = 10
+    return _code_cache
+
+
+def create_model():
+    # llm config
+    cache_mode = os.getenv("TITAN_LLM_CACHE_MODE", "passthrough")
+    model = ModelFactory.create(
+        model_platform=ModelPlatformType.OPENAI_COMPATIBLE_MODEL,
+        model_type=os.getenv("MODEL_TYPE"),
+        # replay模式完全离线，不需要真实的API key
+        api_key=os.getenv("DEEPSEEK_API_KEY") or ("replay" if cache_mode == "replay" else None),
+        url=os.getenv("API_URL"),
+        model_config_dict={ "temperature": 0.7,"max_tokens": 8000}
+    )
+    # token streaming: 需位于缓存内层，缓存命中时不再产生token
+    if os.getenv("TITAN_STREAM", "0") == "1":
+        install_model_middleware(model, TokenStreamMiddleware(model))
+    # provider prompt cache: 统计提供方前缀缓存命中率，位于本地缓存内层
+    install_model_middleware(model, PromptCacheStatsMiddleware())
+    # llm cache: record / replay / passthrough
+    if cache_mode != "passthrough":
+        install_model_middleware(model, LLMCacheMiddleware(get_llm_cache(), model, mode=cache_mode))
+    # status bar: cache_friendly布局下追加在每次请求末尾，位于缓存外层，状态栏参与缓存键
+    install_model_middleware(model, StatusSuffixMiddleware())
+    # cancellation: 最外层，取消时中止进行中的模型请求
+    install_model_middleware(model, CancellationMiddleware(model))
+    return model
+
+
+def create_kernel_pool(size=1):
+    # tool: code execution, 预热的jupyter内核池，依赖按环境指纹只检查一次
+    kernel_pool = KernelPool(
+        size=size,
+        packages=packages_to_install,
+        fingerprint_file=os.path.join(work_dir, '.kernel_env.json')
+    )
+    kernel_pool.provision()
+    return kernel_pool
+
+
+def run_task(model, code_toolkit, initial_message, session_id=None, resume=False):
+    """运行一次完整的群聊分析任务，agent状态与终止信号按会话隔离；resume时从最近的检查点继续"""
+    session_dir = get_session_dir(work_dir, session_id)
+    use_session(session_id)
+    clear_terminate_signal(session_dir)
+    workflow_path = os.getenv("TITAN_WORKFLOW")
+    mode = "workflow" if workflow_path else "loop"
+
+    # checkpoint: 每轮结束后保存，resume时恢复记忆与流程状态，不重放之前的模型调用
+    checkpoint_store = CheckpointStore(session_dir)
+    checkpoint = checkpoint_store.load_resumable() if resume else None
+    if resume and checkpoint is None:
+        emit("warning", "[WARNING] No Resumable Checkpoint, Starting From Scratch")
+    elif checkpoint is not None and checkpoint.get("mode") != mode:
+        emit("warning", f"[WARNING] Checkpoint Mode [{checkpoint.get('mode')}] Does Not Match Current Mode [{mode}], Starting From Scratch")
+        checkpoint = None
+    if checkpoint is not None:
+        initial_message = checkpoint.get("task") or initial_message
+
+    # large tool outputs are spilled to artifacts, the conversation keeps an excerpt
+    spill_bytes = int(os.getenv("TITAN_TOOL_OUTPUT_SPILL_BYTES", "8000"))
+    if checkpoint is not None and checkpoint.get("artifact_dir"):
+        # 恢复的记忆中引用的artifact仍可读取
+        artifact_store = ArtifactStore(checkpoint["artifact_dir"], threshold_bytes=spill_bytes)
+    else:
+        artifact_store = create_run_artifact_store(session_dir, spill_bytes)
+    code_tools = code_toolkit.get_tools()
+    # memoized code cells: 纯单元在代码与输入文件不变时直接返回缓存的输出
+    code_memo = None
+    if os.getenv("TITAN_CODE_CACHE", "0") == "1":
+        code_memo = CodeExecutionMemo(*get_code_cache())
+        code_tools = wrap_tools_with_memo(code_tools, code_memo)
+    code_tools = wrap_tools_with_spill(code_tools, artifact_store)
+    # 循环模式下每次工具调用前写入检查点（见checkpoint_tool_round），轮次中途崩溃时不丢失之前的工具结果
+    current_round = {}
+    code_tools = wrap_tools_with_checkpoint(code_tools, lambda tool_name: checkpoint_tool_round(tool_name))
+    # worker跨任务复用模型，缓存命中统计按任务清零
+    llm_cache = get_model_middleware(model, LLMCacheMiddleware)
+    if llm_cache is not None:
+        llm_cache.reset_stats()
+    prompt_cache = get_model_middleware(model, PromptCacheStatsMiddleware)
+    if prompt_cache is not None:
+        prompt_cache.reset_stats()
+
+    # bar : status_bar for programmer
+    status_bar = create_status_bar(packages=packages_to_install)
+
+    # group chat config
+    agent_map = create_agents_from_config(
+        prompts_json_path=os.path.join(work_dir, 'prompts.json'),
+        model=model,
+        status=status_bar,
+        code_tools=code_tools,
+        token_limit=36000,  # max history context
+        prompt_layout=os.getenv("TITAN_PROMPT_LAYOUT", "legacy")
+    )
+    AGENT_LIST = list(agent_map.keys())
+    context_tracker = ContextTracker()
+    memory_compactor = MemoryCompactor(
+        threshold_tokens=int(os.getenv("TITAN_MEMORY_COMPACT_TOKENS", "24000")),
+        keep_recent=int(os.getenv("TITAN_MEMORY_KEEP_RECENT", "6"))
+    )
+    conversation_history = []
+    max_rounds = 10
+    resume_note = []
+
+    if checkpoint is not None:
+        for agent_key, records in checkpoint.get("agents", {}).items():
+            if agent_key in agent_map:
+                restore_memory(agent_map[agent_key], records)
+        conversation_history.extend(checkpoint.get("conversation_history", []))
+        # 内核已重建，提醒programmer之前的变量不存在
+        lost_variables = checkpoint.get("kernel_variables", [])
+        if lost_variables and 'programmer' in agent_map:
+            agent_map['programmer'].update_memory(
+                BaseMessage.make_assistant_message(
+                    role_name="checkpoint",
+                    content=f"【断点恢复】代码内核已重启，之前定义的变量 {', '.join(lost_variables)} 已不存在，如需使用请重新计算。"
+                ),
+                OpenAIBackendRole.SYSTEM
+            )
+        if checkpoint.get("in_round"):
+            resume_note.append("【断点恢复】上一轮在工具调用之间中断，本轮的输入与已完成的工具调用结果都在上文中，请从中断处继续完成任务。")
+        emit("system", f"[SYSTEM] Resumed From Checkpoint: round {checkpoint.get('round')}, next agent {checkpoint.get('next_agent')}",
+             name="resumed", checkpoint_round=checkpoint.get('round'), next_agent=checkpoint.get('next_agent'))
+
+    # 内核中的变量名只在写入检查点、且上次列出后执行过代码时才重新列出
+    kernel_state = {"dirty": True, "variables": []}
 
-        # group chat
-        print(f"用户: {initial_message}")
+    def save_checkpoint(round_index, completed=False, **flow_state):
+        """保存本轮结束后（in_round时为轮次中途）的状态"""
+        if not completed and kernel_state["dirty"]:
+            kernel_state["variables"] = KernelPool.list_variables(code_toolkit)
+            kernel_state["dirty"] = False
+        size = checkpoint_store.save(dict(
+            flow_state,
+            mode=mode,
+            round=round_index,
+            completed=completed,
+            task=initial_message,
+            artifact_dir=artifact_store.artifact_dir,
+            conversation_history=conversation_history,
+            agents={agent_key: dump_memory(agent) for agent_key, agent in agent_map.items()},
+            kernel_variables=[] if completed else kernel_state["variables"]
+        ))
+        emit("system", f"[SYSTEM] Checkpoint Saved: round {round_index} ({size} bytes)", round_index=round_index,
+             name="checkpoint", bytes=size, completed=completed)
+
+    def checkpoint_tool_round(tool_name):
+        """
+        循环模式下每次工具调用之前保存检查点：上一次工具调用及其结果已写入agent记忆，
+        恢复时重新运行本轮（round记为上一轮），agent从已有的工具结果继续
+        """
+        if current_round:
+            if current_round["tool_calls"] > 0:
+                save_checkpoint(current_round["round"] - 1, in_round=True, next_agent=current_round["next_agent"],
+                                response_content=current_round["response_content"])
+            current_round["tool_calls"] += 1
+        if tool_name == "execute_code":
+            kernel_state["dirty"] = True
+
+    def prepare_step(next_agent, i, previous_content):
+        """发言前：发布状态、构造输入"""
+        print("--------------------------------------------------")
+        agent = agent_map.get(next_agent)
+
+        # fold older rounds into a summary record once memory exceeds the threshold
+        compaction = memory_compactor.compact(next_agent, agent)
+        if compaction.folded_records:
+            emit("system", f"[SYSTEM] Memory Compacted({next_agent}): folded {compaction.folded_records} records, prompt tokens {compaction.tokens_before} -> {compaction.tokens_after}",
+                 next_agent, i, name="memory_compacted", folded_records=compaction.folded_records,
+                 tokens_before=compaction.tokens_before, tokens_after=compaction.tokens_after)
+        else:
+            emit("system", f"[SYSTEM] Prompt Tokens({next_agent}): {compaction.tokens_before}", next_agent, i,
+                 name="prompt_tokens", tokens=compaction.tokens_before)
+
+        # get agent memory, publish only the records added since last round (status carries summary/size/digest only)
+        context = context_tracker.update(next_agent, agent.memory.retrieve())
+        publish_agent_memory(next_agent, "speaking", context.entries, context.digest, context.size, context.records, context.reset)
+
+        # input message
+        if resume_note:
+            # 从轮次中途的检查点恢复：输入已在记忆中，提示agent根据已有的工具结果继续
+            message = BaseMessage.make_user_message(role_name="用户", content=resume_note.pop())
+        elif next_agent == 'programmer' or previous_content is None:
+            message = BaseMessage.make_user_message(role_name="用户", content=initial_message)
+        elif next_agent == 'analyst':
+            conversation_str = "\n".join(conversation_history)
+            message = BaseMessage.make_user_message(role_name="用户", content=conversation_str)
+        else:
+            message = BaseMessage.make_user_message(role_name="用户", content=previous_content)
+        return AgentStep(agent_key=next_agent, agent=agent, message=message, round_index=i)
+
+    def finish_step(step, response):
+        """发言后：整理工具输出并打印"""
+        next_agent = step.agent_key
+        response_content = response.msgs[0].content
+        # update agent status
+        update_agent_status(next_agent, "waiting")
+        usage = response.info.get('usage') if hasattr(response, 'info') else None
+        if usage:
+            emit("system", f"[SYSTEM] Usage({next_agent}): prompt tokens {usage.get('prompt_tokens')}, completion tokens {usage.get('completion_tokens')}",
+                 next_agent, step.round_index, name="usage", prompt_tokens=usage.get('prompt_tokens'), completion_tokens=usage.get('completion_tokens'))
+        cache_round = prompt_cache.pop_round(next_agent) if prompt_cache is not None else None
+        if cache_round:
+            cached, prompt = cache_round
+            emit("system", f"[SYSTEM] Prompt Cache({next_agent}): cached tokens {cached}/{prompt} ({PromptCacheStatsMiddleware.ratio(cached, prompt):.1%})",
+                 next_agent, step.round_index, name="prompt_cache", cached_tokens=cached, prompt_tokens=prompt)
+
+        # process output
+        if next_agent == 'programmer' and hasattr(response, 'info') and 'tool_calls' in response.info:
+            execution_results = []
+            # tool results
+            for tool_call_record in response.info['tool_calls']:
+                if hasattr(tool_call_record, 'result') and tool_call_record.result:
+                    execution_results.append(tool_call_record.result)
+            # execution results
+            if execution_results:
+                response_content += "\n" + "\n".join(execution_results)
+
+        tool_output = artifact_store.pop_round(step.round_index)
+        if tool_output:
+            emit("system", f"[SYSTEM] Tool Output({next_agent}): {tool_output['bytes']} bytes, inlined {tool_output['inlined_bytes']} bytes, spilled {tool_output['spilled']}, tokens saved {tool_output['tokens_saved']}",
+                 next_agent, step.round_index, name="tool_output", **tool_output)
+
+        # print output
+        emit("message", f"{next_agent}: {response_content}", next_agent, step.round_index, content=response_content)
+        conversation_history.append(f"{next_agent}:{response_content}")
+        return response_content
+
+    def step_agent(next_agent, i, previous_content):
+        """一次同步的agent发言"""
+        step = prepare_step(next_agent, i, previous_content)
+        # talk
+        with token_stream_tags(next_agent, i):
+            response = step.agent.step(step.message)
+        return finish_step(step, response)
+
+    # group chat
+    emit("task_start", f"{TASK_START_PREFIX} {initial_message}", task=initial_message, mode=mode)
+    if workflow_path:
+        # chat flow from mermaid workflow, e.g. fresh_workflow/base01.mmd
+        engine = WorkflowEngine(
+            workflow=load_workflow(os.path.join(work_dir, workflow_path)),
+            agent_keys=AGENT_LIST,
+            prepare_fn=prepare_step,
+            finish_fn=finish_step,
+            # 独立分支并发发言，限制同时在途的LLM调用数
+            stepper=AsyncAgentStepper(max_inflight=int(os.getenv("TITAN_MAX_INFLIGHT_LLM", "4"))),
+            max_steps=max_rounds,
+            max_cycle_iterations=int(os.getenv("TITAN_WORKFLOW_MAX_CYCLES", "3")),
+            should_stop=lambda: chat_terminate(session_dir),
+            on_checkpoint=lambda state: save_checkpoint(state["steps"] - 1, workflow_state=state)
+        )
+        if checkpoint is not None:
+            engine.restore_state(checkpoint.get("workflow_state", {}))
+        if engine.run():
+            save_checkpoint(engine.steps - 1, completed=True)
+            emit("system", "[SYSTEM] Task Completed", name="task_completed")
+        elif engine.steps >= max_rounds:
+            emit("warning", "[SYSTEM] Conversation Not Completed But Reached Max Rounds. Please Check Task Flow Or Increase Loop Times.", name="max_rounds")
+    else:
         next_agent = 'programmer'
-        for i in range(max_rounds):
-            # index
-            print("--------------------------------------------------")
-            agent = agent_map.get(next_agent)
-            
+        response_content = None
+        start_round = 0
+        if checkpoint is not None:
+            next_agent = checkpoint.get("next_agent") or next_agent
+            response_content = checkpoint.get("response_content")
+            start_round = checkpoint.get("round", -1) + 1
+        completed = False
+        # 循环模式下每轮的输入依赖上一轮的回复，没有可以并发的发言；并发只在工作流的独立分支中进行
+        for i in range(start_round, max_rounds):
             # check terminate
-            if chat_terminate(work_dir):
+            if chat_terminate(session_dir):
                 break
-            
-            # get agent memory
-            context_records = agent.memory.retrieve()
-            current_context = ''
-            for record in context_records:
-                current_context += record.memory_record.message.content
-            update_agent_status(next_agent, "speaking", current_context)
-            
-            # input message
-            if next_agent == 'programmer':
-                message = BaseMessage.make_user_message(role_name="用户", content=initial_message)
-            elif next_agent == 'analyst':
-                conversation_str = "\n".join(conversation_history)
-                message = BaseMessage.make_user_message(role_name="用户", content=conversation_str)
-            else: 
-                message = BaseMessage.make_user_message(role_name="用户", content=response_content)
-
-            # talk
-            response = agent.step(message)
-            response_content = response.msgs[0].content
-            # update agent status
-            update_agent_status(next_agent, "waiting", current_context)
-            
-            # process output
-            if next_agent == 'programmer' and hasattr(response, 'info') and 'tool_calls' in response.info:
-                execution_results = []
-                # tool results
-                for tool_call_record in response.info['tool_calls']:
-                    if hasattr(tool_call_record, 'result') and tool_call_record.result:
-                        execution_results.append(tool_call_record.result)
-                # execution results
-                if execution_results:
-                    response_content += "\n" + "\n".join(execution_results)
-
-            # print output
-            print(f"{next_agent}: {response_content}", flush=True)
-            conversation_history.append(f"{next_agent}:{response_content}")
+
+            current_round.update(round=i, next_agent=next_agent, response_content=response_content, tool_calls=0)
+            response_content = step_agent(next_agent, i, response_content)
+            current_round.clear()
 
             # chat flow
             use_agentic_llm  = True #dpsk v3.2
 
             if not use_agentic_llm: # dpsk v3
                 if next_agent == 'planner':
-                    next_agent = 'assigner' 
+                    next_agent = 'assigner'
                 elif next_agent == 'assigner':
                     if "{计划已完成}" in response_content:
                         next_agent = 'analyst'
@@ -141,23 +376,97 @@ if __name__ == "__main__":
                 elif next_agent == 'programmer':
                     next_agent = 'assigner'
                 elif next_agent == 'analyst':
-                    print("[SYSTEM] Task Completed", flush=True)
-                    break
+                    completed = True
 
             else:  #dpsk v3.2
                 if  next_agent == 'programmer':
-                    print("[SYSTEM] Task Completed", flush=True)
-                    break
+                    completed = True
+
+            if completed:
+                # 先保存完成状态再结束，完成的检查点不会被恢复
+                save_checkpoint(i, completed=True)
+                emit("system", "[SYSTEM] Task Completed", name="task_completed")
+                break
+            save_checkpoint(i, next_agent=next_agent, response_content=response_content)
         else:
-            print("[SYSTEM] Conversation Not Completed But Reached Max Rounds. Please Check Task Flow Or Increase Loop Times.", flush=True)
+            emit("warning", "[SYSTEM] Conversation Not Completed But Reached Max Rounds. Please Check Task Flow Or Increase Loop Times.", name="max_rounds")
 
-        #shut down
-        for agent_key in AGENT_LIST:
-            update_agent_status(agent_key, "waiting")    
-        print("--------------------------------------------------")
+    #shut down
+    for agent_key in AGENT_LIST:
+        update_agent_status(agent_key, "waiting")
+    if llm_cache is not None:
+        emit("system", f"[SYSTEM] LLM Cache: {llm_cache.get_stats()}", name="llm_cache", stats=llm_cache.get_stats())
+    if artifact_store.bytes_total:
+        emit("system", f"[SYSTEM] Tool Output: {artifact_store.get_stats()}", name="tool_output_total", stats=artifact_store.get_stats())
+    if code_memo is not None:
+        emit("system", f"[SYSTEM] Code Cache: {code_memo.get_stats()}", name="code_cache", stats=code_memo.get_stats())
+    if prompt_cache is not None and prompt_cache.calls:
+        emit("system", f"[SYSTEM] Prompt Cache: {prompt_cache.get_stats()}", name="prompt_cache_total", stats=prompt_cache.get_stats())
+    print("--------------------------------------------------")
 
 
+def serve_worker():
+    """
+    常驻worker模式：模型客户端与代码沙箱只初始化一次，
+    之后从stdin逐行读取JSON任务 {"task_id": ..., "session_id": ..., "task": ...}，每个任务结束输出完成标记；
+    运行中收到 {"control": "cancel"} 时中止模型请求并中断内核
+    """
+    kernel_pool = create_kernel_pool(size=int(os.getenv("TITAN_KERNEL_POOL_SIZE", "1")))
+    kill_after = float(os.getenv("TITAN_KERNEL_INTERRUPT_GRACE", "3"))
+    model_settings = None
+    model = None
+    reader = WorkerStdinReader()
+    reader.start()
+    print(WORKER_READY_MARKER, flush=True)
 
+    while True:
+        request = reader.next_task()
+        if request is None:
+            break  # stdin关闭，worker退出
 
+        # .env可能已通过/api/env更新，每个任务重新加载；模型配置变化时才重建模型
+        load_dotenv(override=True)
+        settings = (os.getenv("MODEL_TYPE"), os.getenv("DEEPSEEK_API_KEY"), os.getenv("API_URL"), os.getenv("TITAN_LLM_CACHE_MODE"), os.getenv("TITAN_STREAM"))
+        status = "ok"
+        token = reader.begin(request.get("task_id"))
+        try:
+            # 取消会关闭模型客户端，之后需要重建
+            if model is None or settings != model_settings or get_model_middleware(model, CancellationMiddleware).aborted:
+                model = create_model()
+                model_settings = settings
+            with auto_logger(log_dir=log_directory), kernel_pool.lease() as code_toolkit, cancel_scope(token):
+                finished = threading.Event()
+                token.add_callback(lambda: kernel_pool.interrupt(code_toolkit, finished, kill_after))
+                try:
+                    run_task(model, code_toolkit, request.get("task") or os.getenv("CAMEL_TASK"), request.get("session_id"), request.get("resume", False))
+                finally:
+                    finished.set()
+        except Exception as e:
+            # 取消可能以TaskCancelled或被中断的下游异常形式出现
+            if token.is_cancelled or isinstance(e, TaskCancelled):
+                status = "cancelled"
+                emit("system", "[SYSTEM] Task Cancelled", name="task_cancelled")
+            else:
+                status = "error"
+                emit("error", f"[ERROR] Task failed: {e}", error=str(e))
+        finally:
+            reader.end()
+        if status == "ok" and token.is_cancelled:
+            status = "cancelled"
+        done = {"task_id": request.get("task_id"), "status": status}
+        print(f"{WORKER_DONE_MARKER} {json.dumps(done)}", flush=True)
 
 
+if __name__ == "__main__":
+    # main.py设置TITAN_EVENTS=1时stdout输出类型化事件，worker协议标记原样输出
+    install_event_stdout(tags=current_stream_tags, passthrough=(WORKER_READY_MARKER, WORKER_DONE_MARKER))
+    if WORKER_FLAG in sys.argv[1:]:
+        serve_worker()
+    else:
+        # log to backend/logs
+        with auto_logger(log_dir=log_directory):
+            model = create_model()
+            kernel_pool = create_kernel_pool()
+            with kernel_pool.lease() as code_toolkit:
+                run_task(model, code_toolkit, os.getenv("CAMEL_TASK"), os.getenv("TITAN_SESSION_ID"), os.getenv("TITAN_RESUME") == "1")
+            kernel_pool.shutdown()
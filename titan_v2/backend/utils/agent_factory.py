@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import hashlib
 import json
 import os
 from typing import Dict, Any, List
@@ -6,13 +7,16 @@ from camel.agents import ChatAgent
 from camel.messages import BaseMessage
 from utils.utils import load_work_documents
 from utils.agent_manager import register_agent
+from utils.model_middleware import get_model_middleware
+from utils.prompt_cache_stats import PromptCacheStatsMiddleware, StatusSuffixMiddleware
 
 def create_agents_from_config(
     prompts_json_path: str,
     model: Any,
     status: str = "",
     code_tools: List[Any] = None,
-    token_limit: int = 8000
+    token_limit: int = 8000,
+    prompt_layout: str = "legacy"
 ) -> Dict[str, ChatAgent]:
     """
     Dynamically create agents based on the prompts.json configuration.
@@ -23,6 +27,10 @@ def create_agents_from_config(
         status: Status information (used for status_bar).
         code_tools: List of code tools.
         token_limit: Maximum number of tokens for context memory (default: 8000).
+        prompt_layout: "legacy" puts status, DataCard and role prompt into one system message;
+            "cache_friendly" keeps the stable role prompt + DataCard as the system message and
+            appends the volatile status as the last message of every request (StatusSuffixMiddleware,
+            after the system message and history), so the prefix can hit provider caches.
     
     Returns:
         Dict[str, ChatAgent]: A dictionary of agents with role_name as the key.
@@ -32,6 +40,12 @@ def create_agents_from_config(
     with open(prompts_json_path, 'r', encoding='utf-8') as f:
         prompts_config = json.load(f)
     
+    prompt_cache = get_model_middleware(model, PromptCacheStatsMiddleware)
+    status_suffix = get_model_middleware(model, StatusSuffixMiddleware)
+    if prompt_layout == "cache_friendly" and status_suffix is None:
+        print("[WARNING] StatusSuffixMiddleware Not Installed, Status Bar Kept In System Message")
+        prompt_layout = "legacy"
+
     # create agent dict
     agents = {}
     created_agents = []  # 记录成功创建的agent
@@ -41,6 +55,7 @@ def create_agents_from_config(
         # # base system_content
         content = agent_config.get("content", "")
         system_content = content
+        agent_status = ""
         
         # llm config
         for field_key, field_value in agent_config.items():
@@ -56,7 +71,10 @@ def create_agents_from_config(
                             file_name = os.path.basename(document_path)
                             work_document = load_work_documents(path=file_dir, file_name=file_name)
                             print(f"[SYSTEM] Document Config:\n {work_document}")
-                            system_content = f"{work_document}{system_content}"
+                            if prompt_layout == "cache_friendly":
+                                system_content = f"{system_content}{work_document}"
+                            else:
+                                system_content = f"{work_document}{system_content}"
                         except Exception as e:
                             print(f"[WARNING] Document Config [{document_path}] Load Failed: {e}")
                     else:
@@ -64,7 +82,10 @@ def create_agents_from_config(
             # status_bar config
             if field_key == "status_bar" and field_value and status:
                 print(f"[SYSTEM] Status Config:\n {status}")
-                system_content = f"{status}\n{system_content}"
+                if prompt_layout == "cache_friendly":
+                    agent_status = status
+                else:
+                    system_content = f"{status}\n{system_content}"
         
         # join system_content
         system_message = BaseMessage.make_assistant_message(role_name=role_name,content=system_content)
@@ -84,6 +105,11 @@ def create_agents_from_config(
             tools=tools,
             token_limit=token_limit  # 使用传入的token_limit参数
         )
+        # 易变的状态栏不写入记忆，请求时追加在稳定前缀与历史之后
+        if status_suffix is not None:
+            status_suffix.set_status(role_name, agent_status)
+        if prompt_cache is not None:
+            prompt_cache.record_prefix(role_name, hashlib.sha256(system_content.encode("utf-8")).hexdigest())
         register_agent(agent_key, agent_key, role_name, "Waiting for Task")
         agents[role_name] = agent
         created_agents.append(role_name)  # 记录成功创建的agent
@@ -3,13 +3,22 @@
 Agent管理器 - 统一的Agent注册和状态管理
 合并了原有的agent_registry.py和agent_state_manager.py功能
 为main.py和titan.py提供统一的Agent管理接口
+
+状态保存在SQLite(WAL模式)中，每个agent一行：titan.py只更新变化的行，
+不再整文件重写；main.py读取时通过PRAGMA data_version判断是否有其他进程提交，未变化时直接返回内存中的快照。
+每次更新分配递增的全局版本号，记录在行上，并在同一事务中写入变更日志（只含变化的字段），
+订阅方可以按 "自版本N以来" 增量获取变化（见get_changes），日志只保留最近CHANGE_LOG_SIZE条。
+agent的完整记忆按记录存放在memory_records表中，状态里只保留记忆摘要、字符数、记录数和摘要哈希，
+状态与变更的大小不随对话长度增长；记忆内容通过get_memory_page按需分页读取。
 """
 import json
 import os
+import sqlite3
 import threading
 import time
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from dataclasses import dataclass, asdict
+from utils.session import DEFAULT_SESSION_ID, normalize_session_id, get_session_dir
 
 @dataclass
 class AgentInfo:
@@ -19,60 +28,158 @@ class AgentInfo:
     status: str
     memory: str
     agent_id: str
+    memory_digest: str = ""
+    memory_size: int = 0
+    memory_records: int = 0
+
+_AGENT_FIELDS = ("name", "role_name", "status", "memory", "agent_id", "memory_digest", "memory_size", "memory_records")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS agents (
+    agent_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    role_name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    memory TEXT NOT NULL DEFAULT '',
+    memory_digest TEXT NOT NULL DEFAULT '',
+    memory_size INTEGER NOT NULL DEFAULT 0,
+    memory_records INTEGER NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_agents_version ON agents(version);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+CREATE TABLE IF NOT EXISTS changes (
+    version INTEGER PRIMARY KEY,
+    agent_id TEXT,
+    payload TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS memory_records (
+    agent_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role_name TEXT NOT NULL DEFAULT '',
+    role TEXT NOT NULL DEFAULT '',
+    content TEXT NOT NULL,
+    PRIMARY KEY (agent_id, seq)
+);
+"""
+
+# 变更日志保留条数，更早的版本只能通过完整快照追上
+CHANGE_LOG_SIZE = 2000
+# 状态中记忆摘要的最大字符数
+MEMORY_SUMMARY_CHARS = 200
+# 记忆分页每页最多记录数
+MEMORY_PAGE_LIMIT = 200
+
+def summarize_memory(content: str) -> str:
+    """记忆摘要：最近一条记录的开头部分，折叠空白"""
+    summary = " ".join(content.split())
+    if len(summary) > MEMORY_SUMMARY_CHARS:
+        summary = summary[:MEMORY_SUMMARY_CHARS] + "..."
+    return summary
 
 class AgentManager:
     """统一的Agent管理器，包含注册和状态管理功能"""
     
     def __init__(self, state_file: str = None):
         if state_file is None:
-            state_file = os.path.join(os.path.dirname(__file__), '..', 'agent_states.json')
+            state_file = os.path.join(os.path.dirname(__file__), '..', 'agent_states.db')
         self.state_file = state_file
-        self.agents: Dict[str, AgentInfo] = {}
         self._lock = threading.Lock()
-        self._load_from_file()
+        self._snapshot: Optional[Dict[str, AgentInfo]] = None
+        self._snapshot_version = 0
+        self._snapshot_data_version = None
+        os.makedirs(os.path.dirname(os.path.abspath(state_file)), exist_ok=True)
+        # 连接在main.py的线程池与titan.py的工具线程间共享，由_lock串行化
+        self._conn = sqlite3.connect(state_file, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate_columns()
+        self._migrate_json()
+
+    def _migrate_columns(self):
+        """旧版本的状态库没有记忆大小/记录数列"""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(agents)")}
+        for column in ("memory_size", "memory_records"):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE agents ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
     
-    def _load_from_file(self):
-        """从文件加载agent状态"""
-        with self._lock:
-            try:
-                if os.path.exists(self.state_file):
-                    with open(self.state_file, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        agents_data = data.get('agents', [])
-                        self.agents = {
-                            agent_data['agent_id']: AgentInfo(**agent_data)
-                            for agent_data in agents_data
-                        }
-                else:
-                    self.agents = {}
-            except Exception as e:
-                print(f"从文件加载agent状态失败: {e}")
-                self.agents = {}
+    def _migrate_json(self):
+        """旧版本的agent_states.json只导入一次"""
+        legacy_file = os.path.splitext(self.state_file)[0] + '.json'
+        if not os.path.exists(legacy_file) or self._conn.execute("SELECT COUNT(*) FROM agents").fetchone()[0]:
+            return
+        try:
+            with open(legacy_file, 'r', encoding='utf-8') as f:
+                agents_data = json.load(f).get('agents', [])
+            for agent_data in agents_data:
+                agent = AgentInfo(**agent_data)
+                # 旧格式的完整记忆作为一条记录保存
+                full_memory = agent.memory
+                agent.memory, agent.memory_size, agent.memory_records = summarize_memory(full_memory), len(full_memory), int(bool(full_memory))
+                self._write("""
+                    INSERT OR IGNORE INTO agents (agent_id, name, role_name, status, memory, memory_digest, memory_size, memory_records, version, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, lambda version: (agent.agent_id, agent.name, agent.role_name, agent.status, agent.memory, agent.memory_digest,
+                                      agent.memory_size, agent.memory_records, version, time.time()),
+                    agent.agent_id, dict(asdict(agent), op="upsert"),
+                    extra=lambda conn: conn.executemany(
+                        "INSERT OR REPLACE INTO memory_records (agent_id, seq, content) VALUES (?, 0, ?)",
+                        [(agent.agent_id, full_memory)] if full_memory else []))
+        except Exception as e:
+            print(f"从文件加载agent状态失败: {e}")
     
-    def _save_to_file(self):
-        """保存agent状态到文件"""
+    def _write(self, sql: str, params, agent_id: Optional[str], change: Dict[str, Any], extra=None) -> int:
+        """
+        在一个事务中分配新版本号、执行更新并记录变更，返回影响的行数
+        params为接收版本号的函数；change为变化的字段，op: upsert / update / clear
+        extra为在同一事务中执行的附加写入（接收连接），只在更新影响到行时提交
+        """
         with self._lock:
             try:
-                os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
-                agents_data = [asdict(agent) for agent in self.agents.values()]
-                with open(self.state_file, 'w', encoding='utf-8') as f:
-                    json.dump({
-                        'agents': agents_data,
-                        'timestamp': time.time()
-                    }, f, ensure_ascii=False, indent=2)
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+                version = self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+                cursor = self._conn.execute(sql, params(version))
+                if cursor.rowcount:
+                    if extra is not None:
+                        extra(self._conn)
+                    self._conn.execute(
+                        "INSERT INTO changes (version, agent_id, payload) VALUES (?, ?, ?)",
+                        (version, agent_id, json.dumps(change, ensure_ascii=False))
+                    )
+                    if version % 256 == 0:
+                        self._conn.execute("DELETE FROM changes WHERE version <= ?", (version - CHANGE_LOG_SIZE,))
+                    self._conn.execute("COMMIT")
+                else:
+                    self._conn.execute("ROLLBACK")  # 没有变化的行，不消耗版本号
+                self._snapshot_data_version = None  # 本连接的提交不会改变data_version，下次读取时增量合并
+                return cursor.rowcount
             except Exception as e:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
                 print(f"保存Agent状态失败: {e}")
+                return 0
     
     def register_agent(self, agent_id: str, name: str, role_name: str, memory: str = "") -> None:
         """注册一个新的agent"""
-        self.agents[agent_id] = AgentInfo(
-            name=name,
-            role_name=role_name,
-            status="idle",
-            memory=memory,
-            agent_id=agent_id
-        )
-        self._save_to_file()
+        memory_size, memory = len(memory), summarize_memory(memory)
+        self._write("""
+            INSERT INTO agents (agent_id, name, role_name, status, memory, memory_digest, memory_size, memory_records, version, updated_at)
+            VALUES (?, ?, ?, 'idle', ?, '', ?, 0, ?, ?)
+            ON CONFLICT(agent_id) DO UPDATE SET
+                name = excluded.name, role_name = excluded.role_name, status = 'idle',
+                memory = excluded.memory, memory_digest = '', memory_size = excluded.memory_size, memory_records = 0,
+                version = excluded.version, updated_at = excluded.updated_at
+        """, lambda version: (agent_id, name, role_name, memory, memory_size, version, time.time()),
+            agent_id, {"op": "upsert", "agent_id": agent_id, "name": name, "role_name": role_name, "status": "idle",
+                       "memory": memory, "memory_digest": "", "memory_size": memory_size, "memory_records": 0},
+            extra=lambda conn: conn.execute("DELETE FROM memory_records WHERE agent_id = ?", (agent_id,)))
     
     def update_agent_status(self, agent_id: str, status: str, memory: str = None) -> None:
         """更新agent的状态和记忆
@@ -81,47 +188,177 @@ class AgentManager:
         - 3.thinking - 思考状态
         - 4.working - 工作状态
         - 5.speaking - 发言状态
+        memory只以摘要形式保存，完整记忆请使用publish_agent_memory按记录发布
         """
-        if agent_id in self.agents:
-            self.agents[agent_id].status = status
-            if memory is not None:
-                self.agents[agent_id].memory = memory
-            self._save_to_file()
+        change = {"op": "update", "status": status}
+        if memory is not None:
+            memory = summarize_memory(memory)
+            change["memory"] = memory
+        # 状态与记忆都没有变化时不产生新版本
+        self._write("""
+            UPDATE agents SET status = ?, memory = COALESCE(?, memory), version = ?, updated_at = ?
+            WHERE agent_id = ? AND (status != ? OR (? IS NOT NULL AND memory != ?))
+        """, lambda version: (status, memory, version, time.time(), agent_id, status, memory, memory),
+            agent_id, change)
     
+    def publish_agent_memory(self, agent_id: str, status: str, entries: List[Dict[str, str]], digest: str,
+                             size: int, records: int, reset: bool = False) -> None:
+        """
+        更新agent状态并写入新增的记忆记录（ContextTracker.update的结果）
+        entries为新增记录 [{role_name, role, content}]，records为写入后的记录总数，reset为True时先删除已有记录
+        状态与变更日志中只有摘要、大小和摘要哈希
+        """
+        first_seq = records - len(entries)
+
+        def write_records(conn):
+            if reset:
+                conn.execute("DELETE FROM memory_records WHERE agent_id = ?", (agent_id,))
+            conn.executemany(
+                "INSERT OR REPLACE INTO memory_records (agent_id, seq, role_name, role, content) VALUES (?, ?, ?, ?, ?)",
+                [(agent_id, first_seq + i, entry.get("role_name", ""), entry.get("role", ""), entry["content"])
+                 for i, entry in enumerate(entries)]
+            )
+
+        summary = summarize_memory(entries[-1]["content"]) if entries else None
+        change = {"op": "update", "status": status, "memory_digest": digest, "memory_size": size, "memory_records": records}
+        if summary is not None:
+            change["memory"] = summary
+        self._write("""
+            UPDATE agents SET status = ?, memory = COALESCE(?, memory), memory_digest = ?, memory_size = ?,
+                memory_records = ?, version = ?, updated_at = ?
+            WHERE agent_id = ?
+        """, lambda version: (status, summary, digest, size, records, version, time.time(), agent_id),
+            agent_id, change, extra=write_records)
+
+    def get_memory_page(self, agent_id: str, offset: int = 0, limit: int = 20) -> Optional[Dict[str, Any]]:
+        """按记录顺序分页读取agent记忆，agent不存在时返回None"""
+        offset, limit = max(0, offset), min(max(1, limit), MEMORY_PAGE_LIMIT)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT memory_records, memory_size, memory_digest FROM agents WHERE agent_id = ?", (agent_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            rows = self._conn.execute(
+                "SELECT seq, role_name, role, content FROM memory_records WHERE agent_id = ? AND seq >= ? ORDER BY seq LIMIT ?",
+                (agent_id, offset, limit)
+            ).fetchall()
+        return {
+            "agent_id": agent_id,
+            "offset": offset,
+            "limit": limit,
+            "total": row[0],
+            "memory_size": row[1],
+            "memory_digest": row[2],
+            "records": [{"seq": seq, "role_name": role_name, "role": role, "content": content} for seq, role_name, role, content in rows]
+        }
+
+    def _load_agents(self) -> List[AgentInfo]:
+        """
+        读取全部agent：没有新提交时直接返回内存快照，
+        有新提交时只读取版本号大于快照的行并合并，行数不一致（有删除）时整体重新读取
+        """
+        with self._lock:
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if self._snapshot is not None and data_version == self._snapshot_data_version:
+                return list(self._snapshot.values())
+            columns = ', '.join(_AGENT_FIELDS)
+            while True:
+                if self._snapshot is None:
+                    self._snapshot, self._snapshot_version = {}, 0
+                rows = self._conn.execute(f"SELECT {columns}, version FROM agents WHERE version > ? ORDER BY rowid", (self._snapshot_version,)).fetchall()
+                for row in rows:
+                    agent = AgentInfo(*row[:-1])
+                    self._snapshot[agent.agent_id] = agent
+                    self._snapshot_version = max(self._snapshot_version, row[-1])
+                if len(self._snapshot) == self._conn.execute("SELECT COUNT(*) FROM agents").fetchone()[0]:
+                    break
+                self._snapshot = None
+            self._snapshot_data_version = data_version
+            return list(self._snapshot.values())
+
+    def get_version(self) -> int:
+        """当前状态版本号，每次更新递增"""
+        with self._lock:
+            return self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def get_changes(self, since: int) -> Dict[str, Any]:
+        """
+        获取版本since之后的变更：{"version": 当前版本, "changes": [{"version", "agent_id", "op", ...变化的字段}]}
+        since早于保留的变更日志（或晚于当前版本，例如状态库已重建）时返回完整快照 {"version", "reset": True, "agents"}
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                version = self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+                oldest = self._conn.execute("SELECT MIN(version) FROM changes").fetchone()[0]
+                if since == version:
+                    return {"version": version, "changes": []}
+                if since > version or since < 0 or oldest is None or oldest > since + 1:
+                    rows = self._conn.execute(f"SELECT {', '.join(_AGENT_FIELDS)} FROM agents ORDER BY rowid").fetchall()
+                    return {"version": version, "reset": True, "agents": [asdict(AgentInfo(*row)) for row in rows]}
+                rows = self._conn.execute(
+                    "SELECT version, agent_id, payload FROM changes WHERE version > ? ORDER BY version", (since,)
+                ).fetchall()
+            finally:
+                self._conn.execute("COMMIT")
+        return {
+            "version": version,
+            "changes": [dict(json.loads(payload), version=change_version, agent_id=agent_id) for change_version, agent_id, payload in rows]
+        }
+
     def get_active_agents(self) -> List[Dict[str, Any]]:
         """获取所有活跃的agent信息"""
-        self._load_from_file()  # 确保获取最新状态
-        return [asdict(agent) for agent in self.agents.values()]
+        return [asdict(agent) for agent in self._load_agents()]
     
     def get_agent_by_id(self, agent_id: str) -> AgentInfo:
         """根据ID获取agent信息"""
-        self._load_from_file()
-        return self.agents.get(agent_id)
+        for agent in self._load_agents():
+            if agent.agent_id == agent_id:
+                return agent
+        return None
     
     def clear_agents(self) -> None:
         """清空所有agent"""
+        self._write("DELETE FROM agents", lambda version: (), None, {"op": "clear"},
+                    extra=lambda conn: conn.execute("DELETE FROM memory_records"))
+
+    def close(self) -> None:
         with self._lock:
-            self.agents.clear()
-            try:
-                if os.path.exists(self.state_file):
-                    os.remove(self.state_file)
-            except Exception as e:
-                print(f"清除Agent状态失败: {e}")
+            self._conn.close()
     
-    def get_agent_states_for_backend(self) -> List[Dict[str, str]]:
-        """转换为后端AgentState格式"""
-        agents = self.get_active_agents()
+    def get_agent_states_for_backend(self) -> List[Dict[str, Any]]:
+        """转换为后端AgentState格式，memory为摘要，完整记忆通过get_memory_page读取"""
         return [
             {
-                "name": agent["role_name"],  # 使用role_name作为显示名称
-                "status": agent["status"],
-                "memory": agent["memory"]
+                "name": agent.role_name,  # 使用role_name作为显示名称
+                "status": agent.status,
+                "memory": agent.memory,
+                "agent_id": agent.agent_id,
+                "memory_size": agent.memory_size,
+                "memory_records": agent.memory_records,
+                "memory_digest": agent.memory_digest
             }
-            for agent in agents
+            for agent in self._load_agents()
         ]
 
 # 创建全局管理器实例
 _manager = AgentManager()
+_session_managers: Dict[str, AgentManager] = {DEFAULT_SESSION_ID: _manager}
+
+def get_manager(session_id: str = None) -> AgentManager:
+    """获取会话对应的管理器，每个会话使用独立的状态数据库"""
+    session_id = normalize_session_id(session_id)
+    if session_id not in _session_managers:
+        backend_dir = os.path.join(os.path.dirname(__file__), '..')
+        state_file = os.path.join(get_session_dir(backend_dir, session_id), 'agent_states.db')
+        _session_managers[session_id] = AgentManager(state_file)
+    return _session_managers[session_id]
+
+def use_session(session_id: str = None) -> None:
+    """切换全局函数接口使用的会话（titan.py在每个任务开始时调用）"""
+    global _manager
+    _manager = get_manager(session_id)
 
 # 全局函数接口 - 保持向后兼容
 def register_agent(agent_id: str, name: str, role_name: str, memory: str = "") -> None:
@@ -132,6 +369,11 @@ def update_agent_status(agent_id: str, status: str, memory: str = None) -> None:
     """全局函数：更新agent状态"""
     _manager.update_agent_status(agent_id, status, memory)
 
+def publish_agent_memory(agent_id: str, status: str, entries: List[Dict[str, str]], digest: str,
+                         size: int, records: int, reset: bool = False) -> None:
+    """全局函数：更新agent状态并写入新增的记忆记录"""
+    _manager.publish_agent_memory(agent_id, status, entries, digest, size, records, reset)
+
 def get_active_agents() -> List[Dict[str, Any]]:
     """全局函数：获取活跃agent列表"""
     return _manager.get_active_agents()
@@ -140,8 +382,10 @@ def clear_agents() -> None:
     """全局函数：清空agent"""
     _manager.clear_agents()
 
-def get_agent_states_for_backend() -> List[Dict[str, str]]:
+def get_agent_states_for_backend(session_id: str = None) -> List[Dict[str, Any]]:
     """全局函数：获取后端格式的agent状态"""
+    if session_id is not None:
+        return get_manager(session_id).get_agent_states_for_backend()
     return _manager.get_agent_states_for_backend()
 
 # 为了向后兼容agent_state_manager的函数
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+agent状态推送通道
+客户端通过 /ws/agent-states 订阅一次，之后只接收变化的字段（状态变化、记忆摘要与大小），每条变更带单调递增的版本号：
+- {"type": "agent_state_snapshot", "version": N, "agents": [...]}  首次订阅或落后太多时的完整快照
+- {"type": "agent_state_diff", "version": N, "changes": [...]}     增量变更
+客户端应忽略版本号不大于本地版本的变更。
+titan.py在另一个进程中写入状态库，这里每个有订阅者的会话一个后台任务，
+只在状态版本变化时读取变更日志并广播，没有订阅者时任务退出。
+每个订阅者记录已发送到的版本，后台任务从各自的版本补发，订阅时读取快照与加入广播之间发生的变更也不会丢失。
+每个连接使用独立的有界发送队列（溢出时断开），慢速客户端不会阻塞广播，重连时带上since即可追上。
+"""
+import asyncio
+import json
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from utils.ws_fanout import ClientSendQueue
+
+
+class AgentStateChannel:
+    """按会话广播agent状态变更"""
+
+    def __init__(self, get_manager: Callable[[str], Any], poll_interval: float = 0.1, max_queue: int = 64):
+        self.get_manager = get_manager
+        self.poll_interval = poll_interval
+        self.max_queue = max_queue
+        self.subscribers: Dict[str, Set[Any]] = {}
+        self.send_queues: Dict[Any, ClientSendQueue] = {}
+        # 每个订阅者已发送到的版本
+        self.versions: Dict[Any, int] = {}
+        self._watchers: Dict[str, asyncio.Task] = {}
+        # 已断开连接的累计计数
+        self.closed_totals = {"sent": 0, "bytes_sent": 0, "overflow_disconnects": 0}
+
+    def _send(self, websocket: Any, payload: Dict[str, Any]) -> bool:
+        send_queue = self.send_queues.get(websocket)
+        return send_queue is not None and send_queue.put(json.dumps(payload, ensure_ascii=False))
+
+    @staticmethod
+    def _message(payload: Dict[str, Any]) -> Dict[str, Any]:
+        if payload.get("reset"):
+            return {"type": "agent_state_snapshot", "version": payload["version"], "agents": payload["agents"]}
+        return {"type": "agent_state_diff", "version": payload["version"], "changes": payload["changes"]}
+
+    async def subscribe(self, websocket: Any, session_id: str, since: Optional[int] = None) -> None:
+        """订阅会话；提供since时先补发该版本之后的变更，否则发送完整快照"""
+        manager = self.get_manager(session_id)
+        payload = await asyncio.to_thread(manager.get_changes, -1 if since is None else since)
+        self.subscribers.setdefault(session_id, set()).add(websocket)
+        # 变更不能丢弃，队列满时断开，客户端按已有版本重连
+        self.send_queues[websocket] = ClientSendQueue(
+            websocket, max_size=self.max_queue, policy="disconnect",
+            on_close=lambda send_queue: self.unsubscribe(send_queue.websocket)
+        )
+        self._send(websocket, self._message(payload))
+        self.versions[websocket] = payload["version"]
+        watcher = self._watchers.get(session_id)
+        if watcher is None or watcher.done():
+            self._watchers[session_id] = asyncio.create_task(self._watch(session_id))
+
+    def unsubscribe(self, websocket: Any) -> None:
+        send_queue = self.send_queues.pop(websocket, None)
+        self.versions.pop(websocket, None)
+        if send_queue is not None:
+            send_queue.close()
+            self.closed_totals["sent"] += send_queue.sent
+            self.closed_totals["bytes_sent"] += send_queue.bytes_sent
+            self.closed_totals["overflow_disconnects"] += int(send_queue.overflowed)
+        for session_id, sockets in list(self.subscribers.items()):
+            sockets.discard(websocket)
+            if not sockets:
+                self.subscribers.pop(session_id, None)
+
+    async def _watch(self, session_id: str) -> None:
+        manager = self.get_manager(session_id)
+        while self.subscribers.get(session_id):
+            await asyncio.sleep(self.poll_interval)
+            try:
+                current = await asyncio.to_thread(manager.get_version)
+            except Exception as e:
+                print(f"[ERROR] 读取agent状态变更失败: {e}")
+                continue
+            # 落后的订阅者按已发送到的版本分组，通常只有一组，每组读取一次变更
+            lagging: Dict[int, List[Any]] = {}
+            for websocket in list(self.subscribers.get(session_id, ())):
+                version = self.versions.get(websocket)
+                if version is not None and version != current:
+                    lagging.setdefault(version, []).append(websocket)
+            for version, websockets in lagging.items():
+                try:
+                    payload = await asyncio.to_thread(manager.get_changes, version)
+                except Exception as e:
+                    print(f"[ERROR] 读取agent状态变更失败: {e}")
+                    continue
+                message = self._message(payload)
+                for websocket in websockets:
+                    # 读取变更期间已断开或已被其他分组追上的订阅者跳过
+                    if self.versions.get(websocket) == version:
+                        self._send(websocket, message)
+                        self.versions[websocket] = payload["version"]
+        if self._watchers.get(session_id) is asyncio.current_task():
+            self._watchers.pop(session_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        queues = list(self.send_queues.values())
+        return {
+            "subscribers": {session_id: len(sockets) for session_id, sockets in self.subscribers.items()},
+            "queue_depth": sum(send_queue.depth for send_queue in queues),
+            "messages_sent": self.closed_totals["sent"] + sum(send_queue.sent for send_queue in queues),
+            "bytes_sent": self.closed_totals["bytes_sent"] + sum(send_queue.bytes_sent for send_queue in queues),
+            "overflow_disconnects": self.closed_totals["overflow_disconnects"]
+        }
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+agent异步并发发言
+在事件循环上用ChatAgent.astep并发执行多个相互独立的发言，信号量限制同时在途的LLM调用数量。
+同一个agent在一批中出现多次时，除第一次外使用带记忆的克隆并发执行，
+结束后按提交顺序把克隆新增的记忆写回原agent，保证合并结果与执行快慢无关。
+只有工作流模式（WorkflowEngine）会产生相互独立的发言：默认的循环模式中每个agent的输入是上一个agent的回复，
+各轮前后依赖，仍逐个同步发言，不经过这里。
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+from utils.token_stream import token_stream_tags
+
+
+@dataclass
+class AgentStep:
+    """一次待执行的发言"""
+    agent_key: str
+    agent: Any
+    message: Any
+    round_index: int
+
+
+class AsyncAgentStepper:
+    """并发执行agent发言，限制在途LLM调用数"""
+
+    def __init__(self, max_inflight: int = 4):
+        self.max_inflight = max(1, max_inflight)
+        self.peak_inflight = 0
+        self._inflight = 0
+
+    async def _astep(self, step: AgentStep, agent: Any, semaphore: asyncio.Semaphore) -> Any:
+        async with semaphore:
+            self._inflight += 1
+            self.peak_inflight = max(self.peak_inflight, self._inflight)
+            try:
+                with token_stream_tags(step.agent_key, step.round_index):
+                    return await agent.astep(step.message)
+            finally:
+                self._inflight -= 1
+
+    async def fan_out(self, steps: List[AgentStep]) -> List[Any]:
+        """并发执行一批发言，按输入顺序返回响应"""
+        semaphore = asyncio.Semaphore(self.max_inflight)
+        seen: Dict[int, int] = {}
+        runners = []
+        clones = []  # (原agent, 克隆, 克隆前的记录数)
+        for step in steps:
+            occurrence = seen.get(id(step.agent), 0)
+            seen[id(step.agent)] = occurrence + 1
+            agent = step.agent
+            if occurrence > 0:
+                clone = step.agent.clone(with_memory=True)
+                clones.append((step.agent, clone, len(clone.memory.retrieve())))
+                agent = clone
+            runners.append(self._astep(step, agent, semaphore))
+
+        responses = await asyncio.gather(*runners)
+
+        for original, clone, base_count in clones:
+            new_records = clone.memory.retrieve()[base_count:]
+            if new_records:
+                original.memory.write_records([record.memory_record for record in new_records])
+        return list(responses)
+
+    def run(self, steps: List[AgentStep]) -> List[Any]:
+        """同步入口"""
+        return asyncio.run(self.fan_out(steps))
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+运行取消
+worker收到取消指令后触发当前任务的CancelToken：
+- CancellationMiddleware 中止正在进行的模型请求（同步调用关闭HTTP客户端连接，异步调用取消协程）
+- 回调中断正在执行的Jupyter单元（见KernelPool.interrupt）
+之后的模型调用立即抛出TaskCancelled，任务从群聊循环中退出。
+本模块被titan_worker使用，不能导入camel。
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, List, Optional
+
+
+class TaskCancelled(Exception):
+    """任务已被取消"""
+
+
+class CancelToken:
+    """一次任务的取消标记，取消时依次执行已注册的回调"""
+
+    def __init__(self, task_id: Optional[str] = None):
+        self.task_id = task_id
+        self.cancelled_at: Optional[float] = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> bool:
+        """触发取消，重复调用无效果；返回本次是否触发"""
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.cancelled_at = time.monotonic()
+            self._event.set()
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[WARNING] Cancel Callback Failed: {e}", flush=True)
+        return True
+
+    def add_callback(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """注册取消回调，已取消时立即执行；返回注销函数"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._remove(callback)
+        callback()
+        return lambda: None
+
+    def _remove(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise TaskCancelled(f"任务已取消: {self.task_id}")
+
+
+# worker同时只运行一个任务，使用进程级的当前令牌，工具线程与事件循环中都可见
+_current_token: Optional[CancelToken] = None
+
+
+@contextmanager
+def cancel_scope(token: CancelToken):
+    """在此范围内的模型调用受token控制"""
+    global _current_token
+    previous, _current_token = _current_token, token
+    try:
+        yield token
+    finally:
+        _current_token = previous
+
+
+def current_cancel_token() -> Optional[CancelToken]:
+    return _current_token
+
+
+class CancellationMiddleware:
+    """
+    可中止的模型调用，配合install_model_middleware使用，安装在最外层。
+    同步调用在后台线程中进行，取消时立即返回并关闭后端HTTP客户端以断开进行中的请求，
+    客户端关闭后该模型实例不可再用，worker会在下个任务前重建模型（见aborted）。
+    """
+
+    def __init__(self, backend: Any):
+        self.backend = backend
+        self.aborted = False
+
+    def _abort_client(self) -> None:
+        self.aborted = True
+        client = getattr(self.backend, "_client", None)
+        if client is not None:
+            try:
+                client.close()
+            except Exception as e:
+                print(f"[WARNING] Close Model Client Failed: {e}", flush=True)
+
+    def run(self, call_next, messages, response_format=None, tools=None):
+        token = current_cancel_token()
+        if token is None:
+            return call_next(messages, response_format, tools)
+        token.raise_if_cancelled()
+
+        done = threading.Event()
+        outcome = {}
+
+        def call():
+            try:
+                outcome["response"] = call_next(messages, response_format, tools)
+            except BaseException as e:
+                outcome["error"] = e
+            finally:
+                done.set()
+
+        # 复制上下文，token流式输出的agent/轮次标记在后台线程中保持可见
+        context = contextvars.copy_context()
+        threading.Thread(target=context.run, args=(call,), daemon=True).start()
+        remove = token.add_callback(done.set)
+        try:
+            done.wait()
+        finally:
+            remove()
+        if "response" in outcome:
+            return outcome["response"]
+        if "error" in outcome and not token.is_cancelled:
+            raise outcome["error"]
+        self._abort_client()
+        raise TaskCancelled(f"模型请求已中止: {token.task_id}")
+
+    async def arun(self, call_next, messages, response_format=None, tools=None):
+        token = current_cancel_token()
+        if token is None:
+            return await call_next(messages, response_format, tools)
+        token.raise_if_cancelled()
+
+        loop = asyncio.get_running_loop()
+        task = asyncio.ensure_future(call_next(messages, response_format, tools))
+
+        def cancel_task():
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:
+                pass  # 事件循环已关闭
+
+        remove = token.add_callback(cancel_task)
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if token.is_cancelled:
+                raise TaskCancelled(f"模型请求已中止: {token.task_id}")
+            raise
+        finally:
+            remove()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+轮次检查点
+每轮结束后把运行状态写入会话目录下的 checkpoints/latest.json（先写临时文件再替换，崩溃时不会留下半个文件）：
+agent记忆记录、conversation_history、下一个发言的agent（或工作流引擎状态）、内核中的变量名。
+循环模式下一轮中的每次工具调用之前也会写入（in_round=True，此时上一次工具调用及其结果已写入agent记忆），
+轮次中途崩溃时从最近一次工具调用继续。
+titan.py以resume模式启动时从最近的检查点继续，之前的模型调用不会重放。
+本模块被main.py使用，不能导入camel。
+"""
+import functools
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+CHECKPOINT_VERSION = 1
+
+
+class CheckpointStore:
+    """单个会话的检查点，只保留最近一轮"""
+
+    def __init__(self, session_dir: str):
+        self.checkpoint_dir = os.path.join(session_dir, "checkpoints")
+        self.path = os.path.join(self.checkpoint_dir, "latest.json")
+
+    def save(self, state: Dict[str, Any]) -> int:
+        """写入检查点，返回字节数"""
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        payload = json.dumps(dict(state, version=CHECKPOINT_VERSION, saved_at=time.time()), ensure_ascii=False, default=str)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(tmp_path, self.path)
+        return len(payload.encode("utf-8"))
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[WARNING] Load Checkpoint Failed: {e}")
+            return None
+        if state.get("version") != CHECKPOINT_VERSION:
+            print(f"[WARNING] Unsupported Checkpoint Version: {state.get('version')}")
+            return None
+        return state
+
+    def load_resumable(self) -> Optional[Dict[str, Any]]:
+        """未完成的检查点才能恢复"""
+        state = self.load()
+        if state is None or state.get("completed"):
+            return None
+        return state
+
+    def summary(self) -> Optional[Dict[str, Any]]:
+        """不含记忆内容的概要，供API展示"""
+        state = self.load()
+        if state is None:
+            return None
+        return {
+            "mode": state.get("mode"),
+            "round": state.get("round"),
+            "next_agent": state.get("next_agent"),
+            "completed": state.get("completed", False),
+            "in_round": state.get("in_round", False),
+            "saved_at": state.get("saved_at"),
+            "task": state.get("task"),
+            "agents": {agent: len(records) for agent, records in state.get("agents", {}).items()},
+            "kernel_variables": state.get("kernel_variables", [])
+        }
+
+
+def _checkpoint_wrapper(func: Any, before_call: Callable[[str], None]) -> Any:
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        before_call(func.__name__)
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def wrap_tools_with_checkpoint(tools: List[Any], before_call: Callable[[str], None]) -> List[Any]:
+    """每次工具调用前调用before_call(工具名)，用于在工具轮次之间写入检查点"""
+    for tool in tools:
+        tool.func = _checkpoint_wrapper(tool.func, before_call)
+    return tools
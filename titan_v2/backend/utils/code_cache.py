@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+代码单元执行缓存
+以 代码类型 + 规范化代码(AST) + 引用的输入文件内容哈希 + 内核状态版本 为键缓存execute_code的输出：
+- 内核状态版本是一条哈希链，从干净内核的根版本开始，每个真正执行的单元（及其输入文件哈希）都会推进版本，
+  相同的代码序列作用于相同的输入文件时得到相同的版本，跨轮次、跨运行都可以命中
+- 版本链只在每个执行过的单元都可复现时成立：单元调用了随机/时间/IO/训练等函数（如未设种子的train_test_split、
+  df.sample、model.fit、datetime.now()），或调用了无法确认结果确定的函数、执行了bash等非Python单元或其他工具后，
+  内核状态不再由代码序列决定，本次租期内剩余的单元都不再查找或写入缓存
+- 只有经AST判定为纯的Python单元才会跳过执行、直接返回缓存的输出：只包含表达式语句，且只调用白名单中的函数
+  （print/len等内置函数、head/describe/value_counts等只读访问方法、read_csv等结果只取决于参数的函数），
+  其他单元照常执行，可复现时推进状态版本
+缓存内容保存在独立目录的DiskLRUCache中（与LLM响应缓存共用磁盘存储与LRU淘汰的实现）。
+"""
+import ast
+import functools
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.disk_cache import DiskLRUCache
+
+# 纯单元中允许直接调用的内置函数
+_PURE_BUILTINS = {
+    "print", "display", "len", "sorted", "sum", "min", "max", "round", "abs", "any", "all",
+    "repr", "str", "int", "float", "bool", "list", "dict", "set", "tuple", "type", "isinstance",
+    "range", "enumerate", "zip", "format"
+}
+# 结果不确定或有副作用的函数/方法名
+_IMPURE_NAMES = {
+    # 随机与时间
+    "random", "rand", "randn", "randint", "choice", "shuffle", "sample", "seed", "permutation",
+    "now", "today", "time", "perf_counter", "monotonic", "sleep", "uuid1", "uuid4",
+    # 文件系统与外部交互
+    "open", "input", "exec", "eval", "compile", "system", "popen", "listdir", "scandir", "walk", "glob",
+    "remove", "unlink", "rename", "mkdir", "makedirs", "rmtree", "urlopen",
+    # 就地修改
+    "append", "extend", "insert", "pop", "popitem", "clear", "update", "setdefault", "sort", "reverse",
+    "add", "discard", "fit", "fit_transform", "fit_predict", "partial_fit", "train", "write", "writelines", "close",
+    # 序列化、数据库与网络
+    "dump", "execute", "executemany", "commit", "download", "upload", "send", "post",
+    # 输出文件与绘图
+    "to_csv", "to_excel", "to_parquet", "to_json", "to_pickle", "to_feather", "to_sql", "save", "write_image", "write_html",
+    "savefig", "show", "figure", "subplots", "subplot", "plot", "hist", "scatter", "bar", "barh", "pie",
+    "boxplot", "heatmap", "lineplot", "barplot", "histplot", "scatterplot", "pairplot", "countplot"
+}
+_IMPURE_MODULES = {"random", "time", "datetime", "os", "sys", "subprocess", "shutil", "requests", "uuid", "socket"}
+# 可以直接调用、结果只取决于参数的函数（多为from ... import导入的构造函数，训练由fit等方法完成，已在_IMPURE_NAMES中）
+_DETERMINISTIC_FUNCTIONS = {
+    "DataFrame", "Series", "read_csv", "read_excel", "read_parquet", "read_json", "concat", "merge",
+    "LabelEncoder", "OneHotEncoder", "StandardScaler", "MinMaxScaler",
+    "accuracy_score", "precision_score", "recall_score", "f1_score", "roc_auc_score", "mean_squared_error",
+    "mean_absolute_error", "r2_score", "confusion_matrix", "classification_report"
+}
+# 纯单元中允许调用的只读访问方法（返回新对象或摘要，不修改调用者，不读写外部状态）
+_READ_ONLY_METHODS = {
+    "head", "tail", "describe", "info", "value_counts", "nunique", "unique", "isnull", "isna", "notnull", "notna",
+    "sum", "mean", "median", "mode", "std", "var", "min", "max", "count", "quantile", "corr", "cov", "skew", "kurt",
+    "groupby", "agg", "aggregate", "sort_values", "sort_index", "nlargest", "nsmallest", "idxmax", "idxmin",
+    "cumsum", "pct_change", "diff", "round", "abs", "astype", "select_dtypes", "memory_usage", "duplicated",
+    "drop_duplicates", "dropna", "fillna", "drop", "rename", "reset_index", "set_index", "filter", "query",
+    "get", "keys", "values", "items", "to_string", "to_dict", "to_list", "tolist", "to_numpy",
+    "format", "join", "split", "strip", "lower", "upper", "replace", "startswith", "endswith",
+    "crosstab", "pivot_table", "melt", "reshape"
+}
+_ROOT_VERSION = hashlib.sha256(b"titan-clean-kernel").hexdigest()
+
+
+def normalize_code(code: str) -> Optional[str]:
+    """去掉注释和格式差异；无法解析（如包含%魔法命令）时返回None"""
+    try:
+        return ast.dump(ast.parse(code))
+    except SyntaxError:
+        return None
+
+
+def _call_name(node: ast.Call) -> Tuple[Optional[str], Optional[str]]:
+    """返回 (被调用的名称, 调用链最左侧的名称)"""
+    func = node.func
+    if isinstance(func, ast.Name):
+        return func.id, func.id
+    if isinstance(func, ast.Attribute):
+        root = func.value
+        while isinstance(root, (ast.Attribute, ast.Call, ast.Subscript)):
+            root = root.func if isinstance(root, ast.Call) else root.value
+        return func.attr, root.id if isinstance(root, ast.Name) else None
+    return None, None
+
+
+def is_pure_cell(code: str) -> bool:
+    """
+    保守判定：单元只包含表达式语句，且只调用白名单中的函数（内置函数、只读访问方法、结果确定的函数），
+    其他调用（如xgb.train、joblib.dump、fig.write_image、cursor.execute）一律视为有副作用
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return False
+    if not tree.body:
+        return False
+    for statement in tree.body:
+        if not isinstance(statement, (ast.Expr, ast.Pass)):
+            return False
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.NamedExpr, ast.Yield, ast.YieldFrom, ast.Await, ast.Global, ast.Nonlocal)):
+            return False
+        if isinstance(node, ast.Call):
+            name, root = _call_name(node)
+            if name is None or name in _IMPURE_NAMES or root in _IMPURE_MODULES:
+                return False
+            if isinstance(node.func, ast.Name):
+                # 直接调用用户定义的函数可能修改全局状态
+                allowed = name in _PURE_BUILTINS or name in _DETERMINISTIC_FUNCTIONS
+            else:
+                allowed = name in _READ_ONLY_METHODS or name in _DETERMINISTIC_FUNCTIONS
+            if not allowed:
+                return False
+            for keyword in node.keywords:
+                if keyword.arg == "inplace" and not (isinstance(keyword.value, ast.Constant) and keyword.value.value is False):
+                    return False
+    return True
+
+
+def is_reproducible_cell(code: str) -> bool:
+    """
+    保守判定：单元重复执行时是否让内核得到相同的状态（赋值、导入、定义都可以），
+    调用了不确定或有副作用的函数、或直接调用了未知函数时返回False
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return False
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call):
+            name, root = _call_name(node)
+            if name is None or name in _IMPURE_NAMES or root in _IMPURE_MODULES:
+                return False
+            if isinstance(node.func, ast.Name) and name not in _PURE_BUILTINS and name not in _DETERMINISTIC_FUNCTIONS:
+                return False
+    return True
+
+
+class InputFingerprints:
+    """代码中引用的输入文件的内容哈希，按(路径, 大小, 修改时间)缓存，文件不变时不重复读取"""
+
+    def __init__(self, base_dirs: List[str]):
+        self.base_dirs = base_dirs
+        self._hashes: Dict[Tuple[str, int, int], str] = {}
+        self._lock = threading.Lock()
+
+    def _file_hash(self, path: str) -> str:
+        stat = os.stat(path)
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            if key in self._hashes:
+                return self._hashes[key]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        with self._lock:
+            self._hashes[key] = digest.hexdigest()
+        return self._hashes[key]
+
+    def referenced_files(self, code: str) -> List[str]:
+        """代码中以字符串常量出现、且实际存在的文件"""
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            return []
+        files = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Constant) and isinstance(node.value, str) and 0 < len(node.value) < 512 and "\n" not in node.value:
+                candidates = [node.value] if os.path.isabs(node.value) else [os.path.join(base, node.value) for base in self.base_dirs]
+                for candidate in candidates:
+                    if os.path.isfile(candidate):
+                        files.add(os.path.abspath(candidate))
+                        break
+        return sorted(files)
+
+    def fingerprint(self, code: str) -> Dict[str, str]:
+        return {path: self._file_hash(path) for path in self.referenced_files(code)}
+
+
+class CodeExecutionMemo:
+    """一个内核租期内的执行缓存与状态版本链"""
+
+    def __init__(self, cache: DiskLRUCache, fingerprints: InputFingerprints):
+        self.cache = cache
+        self.fingerprints = fingerprints
+        # 为None时内核状态已不可复现，本次租期内不再使用缓存
+        self.state_version: Optional[str] = _ROOT_VERSION
+        self.hits = 0
+        self.misses = 0
+        self.uncacheable = 0
+        self.saved_seconds = 0.0
+
+    def _advance(self, normalized: str, inputs: Dict[str, str]) -> None:
+        if self.state_version is None:
+            return
+        link = f"{self.state_version}|python|{normalized}|{sorted(inputs.items())}"
+        self.state_version = hashlib.sha256(link.encode("utf-8")).hexdigest()
+
+    def _break_chain(self, reason: str) -> None:
+        if self.state_version is not None:
+            self.state_version = None
+            print(f"[SYSTEM] Code Cache Disabled: {reason}, kernel state is no longer reproducible", flush=True)
+
+    def _key(self, code_type: str, normalized: str, inputs: Dict[str, str]) -> str:
+        payload = f"{self.state_version}|{code_type}|{normalized}|{sorted(inputs.items())}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def execute(self, func: Any, code: str, *args, **kwargs) -> Any:
+        if self.state_version is None:
+            self.uncacheable += 1
+            return func(code, *args, **kwargs)
+        code_type = (args[0] if args else kwargs.get("code_type")) or "python"
+        if code_type != "python":
+            # bash等单元的效果无法由AST判定
+            self.uncacheable += 1
+            output = func(code, *args, **kwargs)
+            self._break_chain(f"{code_type} cell")
+            return output
+        normalized = normalize_code(code)
+        inputs = self.fingerprints.fingerprint(code) if normalized is not None else {}
+        if normalized is None or not is_pure_cell(code):
+            # 有副作用的单元照常执行：可复现时推进内核状态版本，否则（含无法解析的单元）之后不再使用缓存
+            self.uncacheable += 1
+            output = func(code, *args, **kwargs)
+            if normalized is not None and is_reproducible_cell(code):
+                self._advance(normalized, inputs)
+            else:
+                self._break_chain("non-deterministic cell")
+            return output
+
+        key = self._key(code_type, normalized, inputs)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.hits += 1
+            self.saved_seconds += cached.get("seconds", 0.0)
+            print(f"[SYSTEM] Code Cache Hit: skipped execution ({cached.get('seconds', 0.0):.2f}s)", flush=True)
+            return cached["output"]
+
+        self.misses += 1
+        started = time.perf_counter()
+        output = func(code, *args, **kwargs)
+        if isinstance(output, str):
+            self.cache.put(key, {"output": output, "seconds": time.perf_counter() - started})
+        return output
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "uncacheable": self.uncacheable,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "saved_seconds": round(self.saved_seconds, 3),
+            "state_version": self.state_version[:16] if self.state_version else None
+        }
+
+
+def _memo_wrapper(func: Any, memo: CodeExecutionMemo) -> Any:
+    @functools.wraps(func)
+    def wrapper(code, *args, **kwargs):
+        return memo.execute(func, code, *args, **kwargs)
+    return wrapper
+
+
+def _state_wrapper(func: Any, memo: CodeExecutionMemo) -> Any:
+    """其他工具（如shell命令）可能以无法判定的方式改变环境，调用后不再使用缓存"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        output = func(*args, **kwargs)
+        memo._break_chain(f"tool {func.__name__} called")
+        return output
+    return wrapper
+
+
+def wrap_tools_with_memo(tools: List[Any], memo: CodeExecutionMemo) -> List[Any]:
+    """execute_code接入执行缓存，其他工具调用后停止使用缓存"""
+    for tool in tools:
+        if tool.func.__name__ == "execute_code":
+            tool.func = _memo_wrapper(tool.func, memo)
+        else:
+            tool.func = _state_wrapper(tool.func, memo)
+    return tools
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+增量上下文跟踪
+每轮只处理agent记忆中新增的记录，维护追加式的增量内容与滚动摘要(sha256)，
+避免每轮重新拼接全部记忆并整体发布。
+"""
+import hashlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+
+@dataclass
+class ContextDelta:
+    """一次更新产生的增量"""
+    delta: str          # 新增记录拼接后的内容
+    digest: str         # 截至本轮全部内容的滚动摘要
+    size: int           # 截至本轮全部内容的字符数
+    records: int        # 截至本轮的记录数
+    reset: bool         # 首次发布或记忆被截断/重写，delta为完整内容
+    entries: List[Dict[str, str]] = field(default_factory=list)  # 新增记录 {role_name, role, content}
+
+
+class ContextTracker:
+    """按agent记录已发布的记忆位置，只输出新增部分"""
+
+    def __init__(self):
+        self._seen: Dict[str, int] = {}
+        self._last_uuid: Dict[str, Any] = {}
+        self._digest: Dict[str, "hashlib._Hash"] = {}
+        self._size: Dict[str, int] = {}
+
+    @staticmethod
+    def _record_entry(record: Any) -> Dict[str, str]:
+        message = record.memory_record.message
+        role = getattr(record.memory_record, "role_at_backend", "")
+        return {
+            "role_name": getattr(message, "role_name", "") or "",
+            "role": getattr(role, "value", role) or "",
+            "content": message.content
+        }
+
+    @staticmethod
+    def _record_uuid(record: Any) -> Any:
+        return getattr(record.memory_record, "uuid", None)
+
+    def _is_continuation(self, agent_id: str, context_records: List[Any]) -> bool:
+        """已发布的最后一条记录仍在原位置，说明记忆只是被追加"""
+        seen = self._seen.get(agent_id, 0)
+        if seen == 0:
+            return True
+        if len(context_records) < seen:
+            return False
+        last_uuid = self._last_uuid.get(agent_id)
+        return last_uuid is not None and self._record_uuid(context_records[seen - 1]) == last_uuid
+
+    def update(self, agent_id: str, context_records: List[Any]) -> ContextDelta:
+        """根据agent.memory.retrieve()的结果计算增量"""
+        # 首次发布，或记忆被CAMEL截断/重写时从头计算
+        reset = agent_id not in self._digest or not self._is_continuation(agent_id, context_records)
+        if reset:
+            self._seen[agent_id] = 0
+            self._digest[agent_id] = hashlib.sha256()
+            self._size[agent_id] = 0
+
+        new_records = context_records[self._seen[agent_id]:]
+        delta = "".join(record.memory_record.message.content for record in new_records)
+        self._digest[agent_id].update(delta.encode("utf-8"))
+        self._size[agent_id] += len(delta)
+        self._seen[agent_id] = len(context_records)
+        if context_records:
+            self._last_uuid[agent_id] = self._record_uuid(context_records[-1])
+
+        return ContextDelta(
+            delta=delta,
+            digest=self._digest[agent_id].hexdigest(),
+            size=self._size[agent_id],
+            records=self._seen[agent_id],
+            reset=reset,
+            entries=[self._record_entry(record) for record in new_records]
+        )
+
+    def clear(self, agent_id: str = None) -> None:
+        for state in (self._seen, self._last_uuid, self._digest, self._size):
+            if agent_id is None:
+                state.clear()
+            else:
+                state.pop(agent_id, None)
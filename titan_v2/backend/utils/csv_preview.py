@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+"""
+工作区CSV的分页预览
+文件查看器原先通过/api/file取回整个CSV在浏览器中解析。这里为每个文件版本（路径、大小、mtime）构建一次缓存，
+之后每次请求只读取一页行：
+- 安装了pyarrow时：流式读取CSV写成Arrow IPC文件（所有列按字符串保存，与原文一致），查询时memory_map打开，
+  只有被访问的记录批次会读入内存，按列选取
+- 未安装pyarrow时：扫描一遍记录每ROW_STRIDE行的起始字节偏移（引号内的换行不算行尾），查询时从最近的偏移处
+  跳过不足一个步长的行再解析一页
+文件大小或mtime变化后旧缓存失效并删除，下一次请求重建。
+列数与表头不一致的行：Arrow跳过并记录行数（页面中返回skipped_rows），索引方式补空或截断；
+Arrow无法解析的文件（如只有空行）改用索引方式，空文件直接返回空页。
+"""
+import csv
+import hashlib
+import io
+import json
+import os
+import threading
+from bisect import bisect_right
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from utils.file_metadata import FileMetadata, get_file_metadata
+
+ROW_STRIDE = 1024
+MAX_PAGE_ROWS = 1000
+_ARROW_BLOCK_BYTES = 8 * 1024 * 1024
+
+
+_pyarrow: Any = None
+
+
+def _import_pyarrow():
+    """pyarrow是可选依赖，用到时才导入（结果只判断一次）"""
+    global _pyarrow
+    if _pyarrow is None:
+        try:
+            import pyarrow
+            import pyarrow.csv
+            import pyarrow.ipc
+            _pyarrow = pyarrow
+        except ImportError:
+            _pyarrow = False
+    return _pyarrow or None
+
+
+def _iter_raw_rows(f) -> Iterator[Tuple[int, bytes]]:
+    """逐条返回 (起始偏移, 原始字节)，引号未闭合时续接下一行；空行跳过"""
+    offset = 0
+    start = 0
+    pending: List[bytes] = []
+    quotes = 0
+    for line in f:
+        if not pending:
+            start = offset
+        offset += len(line)
+        pending.append(line)
+        quotes += line.count(b'"')
+        if quotes % 2:
+            continue
+        row = b"".join(pending) if len(pending) > 1 else line
+        pending, quotes = [], 0
+        if row.strip():
+            yield start, row
+    if pending:
+        yield start, b"".join(pending)
+
+
+def _column_names(first_row: List[str], has_header: Optional[bool]) -> List[str]:
+    """没有表头时按列序号命名，第一行作为数据"""
+    if has_header is False:
+        return [f"column_{i + 1}" for i in range(len(first_row))]
+    return first_row
+
+
+def _parse_rows(raw_rows: List[bytes], encoding: str, delimiter: str) -> List[List[str]]:
+    text = b"".join(raw_rows).decode(encoding, errors="replace")
+    return [row for row in csv.reader(io.StringIO(text, newline=""), delimiter=delimiter) if row]
+
+
+class ArrowPreview:
+    """memory_map打开的Arrow IPC缓存"""
+
+    engine = "arrow"
+
+    def __init__(self, path: str):
+        pa = _import_pyarrow()
+        self.skipped_rows = 0
+        if os.path.exists(f"{path}.json"):
+            with open(f"{path}.json", 'r', encoding='utf-8') as f:
+                self.skipped_rows = json.load(f).get("skipped_rows", 0)
+        self._source = pa.memory_map(path, 'r')
+        self._reader = pa.ipc.open_file(self._source)
+        self.columns: List[str] = self._reader.schema.names
+        # 每个记录批次的起始行号
+        self._starts: List[int] = []
+        total = 0
+        for i in range(self._reader.num_record_batches):
+            self._starts.append(total)
+            total += self._reader.get_batch(i).num_rows
+        self.total_rows = total
+
+    @staticmethod
+    def build(csv_path: str, target: str, metadata: FileMetadata) -> None:
+        pa = _import_pyarrow()
+        utf8 = metadata.encoding.startswith("utf-8")
+        # 表头与Arrow读取保持一致，去掉utf-8的BOM
+        with open(csv_path, 'r', encoding="utf-8-sig" if utf8 else metadata.encoding, errors="replace", newline="") as f:
+            columns = _column_names(next(csv.reader(f, delimiter=metadata.delimiter), []), metadata.has_header)
+        # utf-8由Arrow直接解析（自动跳过BOM），其他编码先转码
+        read_options = pa.csv.ReadOptions(encoding="utf8" if utf8 else metadata.encoding, block_size=_ARROW_BLOCK_BYTES,
+                                          column_names=columns if metadata.has_header is False else None)
+        skipped = []
+
+        def skip_invalid_row(row) -> str:
+            # 列数与表头不一致的行跳过，构建结束后记录行数
+            skipped.append(row.number)
+            return "skip"
+
+        parse_options = pa.csv.ParseOptions(delimiter=metadata.delimiter, newlines_in_values=True,
+                                            invalid_row_handler=skip_invalid_row)
+        # 全部按字符串读取：各批次的类型推断可能不一致，预览也应显示原文
+        convert_options = pa.csv.ConvertOptions(column_types={name: pa.string() for name in columns},
+                                                strings_can_be_null=False)
+        reader = pa.csv.open_csv(csv_path, read_options=read_options, parse_options=parse_options,
+                                 convert_options=convert_options)
+        with pa.OSFile(target, 'wb') as sink, pa.ipc.new_file(sink, reader.schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+        if skipped:
+            with open(f"{target}.json", 'w', encoding='utf-8') as f:
+                json.dump({"skipped_rows": len(skipped)}, f)
+            print(f"[WARNING] CSV预览跳过了{len(skipped)}行列数与表头不一致的数据: {csv_path}")
+
+    def page(self, offset: int, limit: int, columns: List[str]) -> List[List[Any]]:
+        indices = [self.columns.index(name) for name in columns]
+        rows: List[List[Any]] = []
+        batch_index = max(bisect_right(self._starts, offset) - 1, 0)
+        position = offset
+        while len(rows) < limit and batch_index < len(self._starts):
+            batch = self._reader.get_batch(batch_index)
+            local = position - self._starts[batch_index]
+            part = batch.slice(local, limit - len(rows))
+            values = [part.column(i).to_pylist() for i in indices]
+            rows.extend([list(row) for row in zip(*values)] if values else [[] for _ in range(part.num_rows)])
+            position += part.num_rows
+            batch_index += 1
+        return rows
+
+    def close(self) -> None:
+        self._source.close()
+
+    @staticmethod
+    def build_errors() -> Tuple[type, ...]:
+        """Arrow无法解析该文件时抛出的异常，出现时改用索引方式"""
+        return (_import_pyarrow().ArrowInvalid, UnicodeDecodeError)
+
+
+class RowIndexPreview:
+    """没有pyarrow时的稀疏行偏移索引"""
+
+    engine = "index"
+    skipped_rows = 0
+
+    def __init__(self, csv_path: str, index_path: str):
+        self.csv_path = csv_path
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        self.encoding: str = index["encoding"]
+        self.delimiter: str = index["delimiter"]
+        self.columns: List[str] = index["columns"]
+        self.total_rows: int = index["total_rows"]
+        self._offsets: List[int] = index["offsets"]
+
+    @staticmethod
+    def build(csv_path: str, target: str, metadata: FileMetadata) -> None:
+        columns: List[str] = []
+        offsets: List[int] = []
+        total = 0
+        with open(csv_path, 'rb') as f:
+            rows = _iter_raw_rows(f)
+            for start, raw in rows:
+                first_row = _parse_rows([raw], metadata.encoding, metadata.delimiter)[0]
+                first_row[0] = first_row[0].lstrip("\ufeff")
+                columns = _column_names(first_row, metadata.has_header)
+                if metadata.has_header is False:
+                    offsets.append(start)
+                    total = 1
+                break
+            for start, _ in rows:
+                if total % ROW_STRIDE == 0:
+                    offsets.append(start)
+                total += 1
+        with open(target, 'w', encoding='utf-8') as f:
+            json.dump({"encoding": metadata.encoding, "delimiter": metadata.delimiter, "columns": columns,
+                       "total_rows": total, "offsets": offsets}, f)
+
+    def page(self, offset: int, limit: int, columns: List[str]) -> List[List[Any]]:
+        if offset >= self.total_rows:
+            return []
+        indices = [self.columns.index(name) for name in columns]
+        stride = offset // ROW_STRIDE
+        skip = offset - stride * ROW_STRIDE
+        raw_rows: List[bytes] = []
+        with open(self.csv_path, 'rb') as f:
+            base = self._offsets[stride]
+            f.seek(base)
+            for _, raw in _iter_raw_rows(f):
+                if skip:
+                    skip -= 1
+                    continue
+                raw_rows.append(raw)
+                if len(raw_rows) >= limit:
+                    break
+        return [[row[i] if i < len(row) else "" for i in indices] for row in _parse_rows(raw_rows, self.encoding, self.delimiter)]
+
+    def close(self) -> None:
+        pass
+
+
+class CsvPreviewCache:
+    """按文件版本缓存预览数据，同一文件的并发请求只构建一次"""
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self._tables: Dict[str, Tuple[str, Any]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.hits = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path_lock(self, path: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(path, threading.Lock())
+
+    def _open(self, csv_path: str):
+        stat = os.stat(csv_path)
+        prefix = hashlib.sha1(os.path.abspath(csv_path).encode("utf-8")).hexdigest()[:16]
+        version = f"{prefix}-{stat.st_size}-{stat.st_mtime_ns}"
+        with self._path_lock(csv_path):
+            cached = self._tables.get(csv_path)
+            if cached and cached[0] == version:
+                self.hits += 1
+                return cached[1]
+            if cached:
+                cached[1].close()
+            # 删除该文件旧版本的缓存
+            for name in os.listdir(self.cache_dir):
+                if name.startswith(prefix) and not name.startswith(f"{version}."):
+                    try:
+                        os.remove(os.path.join(self.cache_dir, name))
+                    except OSError:
+                        pass
+            table = self._load(csv_path, version)
+            self._tables[csv_path] = (version, table)
+            return table
+
+    def _load(self, csv_path: str, version: str):
+        """打开该版本已有的缓存，没有时构建；Arrow无法解析时改用索引方式"""
+        engines = ["arrow", "index"] if _import_pyarrow() is not None else ["index"]
+        for engine in engines:
+            target = os.path.join(self.cache_dir, f"{version}.{engine}")
+            if os.path.exists(target):
+                return ArrowPreview(target) if engine == "arrow" else RowIndexPreview(csv_path, target)
+        metadata = self._metadata(csv_path)
+        for engine in engines:
+            target = os.path.join(self.cache_dir, f"{version}.{engine}")
+            table_class = ArrowPreview if engine == "arrow" else RowIndexPreview
+            tmp = f"{target}.{os.getpid()}.tmp"
+            try:
+                table_class.build(csv_path, tmp, metadata)
+                if os.path.exists(f"{tmp}.json"):
+                    os.replace(f"{tmp}.json", f"{target}.json")
+                os.replace(tmp, target)
+            except Exception as e:
+                if engine != "arrow" or not isinstance(e, ArrowPreview.build_errors()):
+                    raise
+                print(f"[WARNING] Arrow无法解析CSV，改用行索引预览: {csv_path} ({e})")
+                continue
+            finally:
+                for leftover in (tmp, f"{tmp}.json"):
+                    if os.path.exists(leftover):
+                        os.remove(leftover)
+            self.builds += 1
+            print(f"[INFO] 已构建CSV预览缓存({engine}): {csv_path}")
+            return ArrowPreview(target) if engine == "arrow" else RowIndexPreview(csv_path, target)
+
+    @staticmethod
+    def _metadata(csv_path: str) -> FileMetadata:
+        """编码（构建缓存要读取整个文件，先确认编码）与分隔符取自文件元数据缓存，判断不出分隔符时按逗号处理"""
+        metadata = get_file_metadata(csv_path, confirm=True)
+        if not metadata.is_text:
+            raise ValueError("不是文本文件，无法预览")
+        if not metadata.delimiter:
+            metadata = FileMetadata(**dict(metadata.to_dict(), delimiter=","))
+        return metadata
+
+    def page(self, csv_path: str, offset: int = 0, limit: int = 100,
+             columns: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        返回 [offset, offset + limit) 行中所选列的值
+        columns为空时返回全部列，包含未知列名时抛出ValueError
+        """
+        offset = max(offset, 0)
+        limit = min(max(limit, 0), MAX_PAGE_ROWS)
+        if os.path.getsize(csv_path) == 0:
+            if columns:
+                raise ValueError(f"未知的列: {', '.join(columns)}")
+            return {"columns": [], "selected": [], "rows": [], "offset": offset, "limit": limit,
+                    "total_rows": 0, "skipped_rows": 0, "engine": "empty"}
+        table = self._open(csv_path)
+        selected = list(columns) if columns else list(table.columns)
+        unknown = [name for name in selected if name not in table.columns]
+        if unknown:
+            raise ValueError(f"未知的列: {', '.join(unknown)}")
+        rows = table.page(offset, limit, selected) if limit else []
+        return {
+            "columns": table.columns,
+            "selected": selected,
+            "rows": rows,
+            "offset": offset,
+            "limit": limit,
+            "total_rows": table.total_rows,
+            "skipped_rows": table.skipped_rows,
+            "engine": table.engine
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"files": len(self._tables), "builds": self.builds, "hits": self.hits}
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+磁盘LRU缓存
+以内容哈希为键把JSON对象保存在磁盘上（<键前两位>/<键>.json），按总大小做LRU淘汰：
+超出容量时按最近访问时间从旧到新淘汰到容量的90%。访问时间写回文件mtime，重启后LRU顺序不丢失。
+LLM响应缓存（llm_cache）与代码单元执行缓存（code_cache）各用一个目录。
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+class DiskLRUCache:
+    """内容寻址的磁盘缓存，按最近访问时间淘汰"""
+
+    def __init__(self, cache_dir: str, max_bytes: int = 512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index: Dict[str, List[float]] = {}  # key -> [size, last_access]
+        self.total_bytes = 0
+        self.evictions = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _load_index(self) -> None:
+        """启动时扫描一次缓存目录，之后在内存中维护索引"""
+        for root, _, files in os.walk(self.cache_dir):
+            for file_name in files:
+                if file_name.endswith(".json"):
+                    stat = os.stat(os.path.join(root, file_name))
+                    self._index[file_name[:-5]] = [stat.st_size, stat.st_mtime]
+                    self.total_bytes += stat.st_size
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if key not in self._index:
+                return None
+            path = self._path(key)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                self._remove(key)
+                return None
+            now = time.time()
+            self._index[key][1] = now
+            os.utime(path, (now, now))  # 持久化访问时间，重启后LRU顺序不丢失
+            return data
+
+    def put(self, key: str, data: Dict[str, Any]) -> None:
+        payload = json.dumps(data, ensure_ascii=False)
+        with self._lock:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+            if key in self._index:
+                self.total_bytes -= self._index[key][0]
+            size = os.path.getsize(path)
+            self._index[key] = [size, time.time()]
+            self.total_bytes += size
+            self._evict()
+
+    def _remove(self, key: str) -> None:
+        size, _ = self._index.pop(key)
+        self.total_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict(self) -> None:
+        """超出容量时按最近访问时间从旧到新淘汰，直到降到容量的90%"""
+        if self.total_bytes <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        for key, _ in sorted(self._index.items(), key=lambda item: item[1][1]):
+            if self.total_bytes <= target:
+                break
+            self._remove(key)
+            self.evictions += 1
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+文件元数据服务
+从文件开头的一段有界样本（SNIFF_BYTES）一次性判断编码、换行符、分隔符与是否有表头，
+按 (路径, 大小, mtime) 缓存：同一版本的文件再次打开时不再试探解码。
+样本全是ASCII而文件更长时无法确定编码（之后可能出现GBK等多字节文本），先按utf-8记录并标记为未确认，
+第一次需要完整读取时（状态栏、CSV预览、/api/file遇到解码错误）扫描样本之后的内容确认编码。
+缓存在进程内保存，同时写入一个JSON文件，main.py（/api/file、/api/preview）与titan.py（状态栏中
+提供给内核读取数据的编码与分隔符）共用同一份结果。
+"""
+import codecs
+import csv
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional
+
+SNIFF_BYTES = 64 * 1024
+DELIMITERS = ",\t;|"
+TABULAR_EXTENSIONS = {".csv": ",", ".tsv": "\t", ".txt": None}
+_SNIFF_LINES = 50
+_MAX_ENTRIES = 1024
+
+
+@dataclass
+class FileMetadata:
+    """文件元数据"""
+    path: str
+    size: int
+    mtime_ns: int
+    is_text: bool
+    encoding: Optional[str] = None
+    line_ending: Optional[str] = None
+    delimiter: Optional[str] = None
+    has_header: Optional[bool] = None
+    # 为False时encoding只由全ASCII的样本推断，需要confirm_encoding()确认
+    encoding_confirmed: bool = True
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def sniff_encoding(sample: bytes) -> str:
+    """utf-8（带BOM时为utf-8-sig）、gbk、latin-1依次尝试，只解码样本一次"""
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    for encoding in ("utf-8", "gbk"):
+        try:
+            # 样本末尾可能截断多字节字符，不作为最终块解码
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return "latin-1"
+
+
+def confirm_encoding(path: str, offset: int = 0) -> str:
+    """从offset开始扫描文件其余内容（前面部分已知是ASCII），依次尝试utf-8、gbk，都失败时返回latin-1"""
+    for encoding in ("utf-8", "gbk"):
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    decoder.decode(chunk)
+            decoder.decode(b"", final=True)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return "latin-1"
+
+
+def sniff_line_ending(sample: bytes) -> Optional[str]:
+    crlf = sample.count(b"\r\n")
+    lf = sample.count(b"\n") - crlf
+    cr = sample.count(b"\r") - crlf
+    counts = {"\r\n": crlf, "\n": lf, "\r": cr}
+    line_ending = max(counts, key=counts.get)
+    return line_ending if counts[line_ending] else None
+
+
+def _is_number(value: str) -> bool:
+    try:
+        float(value)
+        return True
+    except ValueError:
+        return False
+
+
+def sniff_table(text: str, default_delimiter: Optional[str]) -> Dict[str, Any]:
+    """根据样本开头的完整行判断分隔符与表头"""
+    lines = text.splitlines(keepends=True)
+    # 最后一行可能被样本截断
+    if len(lines) > 1:
+        lines = lines[:-1]
+    lines = lines[:_SNIFF_LINES]
+    sample = "".join(lines)
+    try:
+        delimiter = csv.Sniffer().sniff(sample, delimiters=DELIMITERS).delimiter
+    except csv.Error:
+        delimiter = default_delimiter
+    if delimiter is None:
+        return {"delimiter": None, "has_header": None}
+    rows: List[List[str]] = [row for row in csv.reader(lines, delimiter=delimiter) if row]
+    if not rows:
+        return {"delimiter": delimiter, "has_header": None}
+    first = [value.strip().lstrip("\ufeff") for value in rows[0]]
+    # 表头：各列名非空、不重复且不是数字
+    has_header = (all(first) and len(set(first)) == len(first)
+                  and not any(_is_number(value) for value in first))
+    return {"delimiter": delimiter, "has_header": has_header}
+
+
+def sniff_file(path: str, sample_bytes: int = SNIFF_BYTES) -> FileMetadata:
+    stat = os.stat(path)
+    with open(path, 'rb') as f:
+        sample = f.read(sample_bytes)
+    metadata = FileMetadata(path=path, size=stat.st_size, mtime_ns=stat.st_mtime_ns, is_text=b"\x00" not in sample)
+    if not metadata.is_text:
+        return metadata
+    metadata.encoding = sniff_encoding(sample)
+    if sample.isascii() and stat.st_size > len(sample):
+        metadata.encoding_confirmed = False
+    metadata.line_ending = sniff_line_ending(sample)
+    extension = os.path.splitext(path)[1].lower()
+    if extension in TABULAR_EXTENSIONS:
+        text = codecs.getincrementaldecoder(metadata.encoding)(errors="replace").decode(sample, final=False)
+        table = sniff_table(text, TABULAR_EXTENSIONS[extension])
+        metadata.delimiter = table["delimiter"]
+        metadata.has_header = table["has_header"]
+    return metadata
+
+
+class FileMetadataCache:
+    """按 (路径, 大小, mtime) 缓存的文件元数据，persist_path不为空时跨进程共享"""
+
+    def __init__(self, persist_path: Optional[str] = None, max_entries: int = _MAX_ENTRIES):
+        self.persist_path = persist_path
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, FileMetadata]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.hits = 0
+        self.misses = 0
+        self.confirmations = 0
+
+    def _load(self) -> None:
+        self._loaded = True
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, 'r', encoding='utf-8') as f:
+                for entry in json.load(f):
+                    # 旧版本的记录没有确认标记，重新试探
+                    if "encoding_confirmed" not in entry:
+                        continue
+                    self._entries[entry["path"]] = FileMetadata(**entry)
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            print(f"[WARNING] 读取文件元数据缓存失败: {e}")
+
+    def _save(self) -> None:
+        if not self.persist_path:
+            return
+        tmp = f"{self.persist_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump([entry.to_dict() for entry in self._entries.values()], f, ensure_ascii=False)
+            os.replace(tmp, self.persist_path)
+        except OSError as e:
+            print(f"[WARNING] 保存文件元数据缓存失败: {e}")
+
+    def _put(self, path: str, metadata: FileMetadata) -> None:
+        with self._lock:
+            self._entries[path] = metadata
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._save()
+
+    def get(self, path: str, confirm: bool = False) -> FileMetadata:
+        """confirm为True时确认未确认的编码（扫描整个文件，每个文件版本只进行一次）"""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        metadata = None
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            cached = self._entries.get(path)
+            if cached and cached.size == stat.st_size and cached.mtime_ns == stat.st_mtime_ns:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                metadata = cached
+        if metadata is None:
+            metadata = sniff_file(path)
+            with self._lock:
+                self.misses += 1
+            self._put(path, metadata)
+        if confirm and not metadata.encoding_confirmed:
+            encoding = confirm_encoding(path, min(SNIFF_BYTES, metadata.size))
+            if encoding != metadata.encoding:
+                print(f"[INFO] 文件编码确认为 {encoding}（开头 {SNIFF_BYTES} 字节为ASCII）: {path}")
+            metadata = FileMetadata(**dict(metadata.to_dict(), encoding=encoding, encoding_confirmed=True))
+            with self._lock:
+                self.confirmations += 1
+            self._put(path, metadata)
+        return metadata
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                "confirmations": self.confirmations}
+
+
+_default_cache: Optional[FileMetadataCache] = None
+
+
+def get_metadata_cache() -> FileMetadataCache:
+    """进程内共享的元数据缓存，持久化到backend/.file_metadata.json"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = FileMetadataCache(
+            persist_path=os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.file_metadata.json'))
+        )
+    return _default_cache
+
+
+def get_file_metadata(path: str, confirm: bool = False) -> FileMetadata:
+    return get_metadata_cache().get(path, confirm)
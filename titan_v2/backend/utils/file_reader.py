@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+"""
+工作区文件的分段读取
+/api/file 原先把整个文件读成字符串（编码不对时最多读三遍）再放进JSON返回，几百MB的文件会造成同等规模的内存峰值。
+这里的读取都只触及需要的部分：
+- read_bytes: 按字节范围读取，起止位置对齐到字符边界
+- read_lines: 按行范围读取，借助稀疏行索引（每个块记录一次此前的换行数）定位，不必从头扫描
+- read_tail: 从文件末尾向前按块读取最后N行，用于日志
+- iter_range: 分块迭代字节范围，供StreamingResponse使用
+编码由调用方从utils.file_metadata取得（按文件版本缓存），这里不再试探解码。
+"""
+import codecs
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+STREAM_CHUNK_BYTES = 64 * 1024
+_INDEX_BLOCK_BYTES = 1024 * 1024
+_TAIL_BLOCK_BYTES = 64 * 1024
+_MAX_INDEXES = 16
+
+
+def _decode(data: bytes, encoding: str, final: bool) -> Tuple[str, int]:
+    """解码，返回 (文本, 实际消耗的字节数)；final为False时末尾不完整的字符留待下一段"""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    text = decoder.decode(data, final=final)
+    pending = decoder.getstate()[0]
+    return text, len(data) - len(pending)
+
+
+def _align_start(f, offset: int, encoding: str) -> int:
+    """utf-8时跳过起始处的续字节，避免从字符中间开始"""
+    if offset <= 0 or not encoding.startswith("utf-8"):
+        return max(offset, 0)
+    f.seek(offset)
+    head = f.read(4)
+    skip = 0
+    while skip < len(head) and 0x80 <= head[skip] <= 0xBF:
+        skip += 1
+    return offset + skip
+
+
+def read_bytes(path: str, offset: int, length: int, encoding: str, align_lines: bool = False) -> Dict[str, Any]:
+    """
+    读取 [offset, offset + length) 的内容
+    align_lines为True且未读到文件末尾时在最后一个换行处截断（用于分段预览CSV等按行解析的内容）
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        start = _align_start(f, min(offset, size), encoding)
+        f.seek(start)
+        data = f.read(max(length, 0))
+    eof = start + len(data) >= size
+    if align_lines and not eof:
+        newline = data.rfind(b"\n")
+        if newline >= 0:
+            data = data[:newline + 1]
+    text, consumed = _decode(data, encoding, final=eof)
+    end = start + consumed
+    return {"content": text, "offset": start, "end": end, "eof": end >= size}
+
+
+class LineIndex:
+    """稀疏行索引：blocks[i] = (该位置之前的换行数, 字节偏移)，按需向后扩展"""
+
+    def __init__(self, path: str, size: int, mtime: float):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.blocks: List[Tuple[int, int]] = [(0, 0)]
+        self.complete = size == 0
+        self.total_lines: Optional[int] = 0 if size == 0 else None  # 索引完整后的总行数
+        self._lock = threading.Lock()
+
+    def _extend_to(self, line: int) -> None:
+        newlines, offset = self.blocks[-1]
+        if self.complete or newlines > line:
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            while newlines <= line:
+                block = f.read(_INDEX_BLOCK_BYTES)
+                if not block:
+                    break
+                newlines += block.count(b"\n")
+                offset += len(block)
+                self.blocks.append((newlines, offset))
+        if offset >= self.size:
+            self.complete = True
+            # 最后一行没有换行结尾时也算一行
+            with open(self.path, 'rb') as f:
+                f.seek(self.size - 1)
+                self.total_lines = newlines + (0 if f.read(1) == b"\n" else 1)
+
+    def locate(self, line: int) -> Optional[int]:
+        """返回第line行（从0开始）的起始字节偏移，超出文件时返回None"""
+        if line <= 0:
+            return 0 if self.size else None
+        with self._lock:
+            self._extend_to(line)
+            blocks = list(self.blocks)
+        # 第line行从第line个换行之后开始：找到之前换行数小于line的最后一个块，从那里向后跳过剩余的换行
+        lo, hi = 0, len(blocks) - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if blocks[mid][0] < line:
+                lo = mid
+            else:
+                hi = mid - 1
+        newlines, offset = blocks[lo]
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            while newlines < line:
+                chunk = f.read(_INDEX_BLOCK_BYTES)
+                if not chunk:
+                    return None
+                position = 0
+                while newlines < line:
+                    found = chunk.find(b"\n", position)
+                    if found < 0:
+                        break
+                    newlines += 1
+                    position = found + 1
+                if newlines == line:
+                    offset += position
+                    break
+                offset += len(chunk)
+        return offset if offset < self.size else None
+
+
+_indexes: "OrderedDict[str, LineIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_line_index(path: str) -> LineIndex:
+    """按路径缓存行索引，文件大小或修改时间变化后重建"""
+    stat = os.stat(path)
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None or index.size != stat.st_size or index.mtime != stat.st_mtime:
+            index = LineIndex(path, stat.st_size, stat.st_mtime)
+            _indexes[path] = index
+        _indexes.move_to_end(path)
+        while len(_indexes) > _MAX_INDEXES:
+            _indexes.popitem(last=False)
+        return index
+
+
+def read_lines(path: str, start_line: int, count: int, encoding: str, max_bytes: int) -> Dict[str, Any]:
+    """读取从start_line（从0开始）起的count行，总字节数不超过max_bytes（至少返回一行的开头部分）"""
+    index = get_line_index(path)
+    start = index.locate(max(start_line, 0))
+    if start is None:
+        return {"content": "", "start_line": start_line, "lines": 0, "next_line": None,
+                "offset": index.size, "end": index.size, "eof": True, "total_lines": index.total_lines}
+    lines = 0
+    end = start
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while lines < count and end - start < max_bytes:
+            line = f.readline(max_bytes - (end - start))
+            if not line:
+                break
+            end += len(line)
+            if line.endswith(b"\n") or end >= index.size:
+                lines += 1
+        f.seek(start)
+        data = f.read(end - start)
+    eof = end >= index.size
+    text, consumed = _decode(data, encoding, final=eof)
+    end = start + consumed
+    truncated_line = not eof and not data[:consumed].endswith(b"\n")
+    return {
+        "content": text,
+        "start_line": start_line,
+        "lines": lines,
+        # 单行超过max_bytes时只返回了行首，下一页仍从该行之后开始
+        "next_line": None if eof else start_line + lines + (1 if truncated_line and lines == 0 else 0),
+        "offset": start,
+        "end": end,
+        "eof": eof,
+        "total_lines": index.total_lines
+    }
+
+
+def read_tail(path: str, count: int, encoding: str, max_bytes: int) -> Dict[str, Any]:
+    """读取最后count行（不超过max_bytes），从文件末尾向前按块读取"""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        position = size
+        # 末尾的换行不算作一行的分隔
+        if size:
+            f.seek(size - 1)
+            trailing = 1 if f.read(1) == b"\n" else 0
+        else:
+            trailing = 0
+        blocks: List[bytes] = []
+        newlines = read = 0
+        while position > 0 and newlines - trailing < count and read < max_bytes:
+            step = min(_TAIL_BLOCK_BYTES, position)
+            position -= step
+            f.seek(position)
+            block = f.read(step)
+            blocks.append(block)
+            newlines += block.count(b"\n")
+            read += len(block)
+        data = b"".join(reversed(blocks))
+    start = position
+    # 丢弃多读的行
+    body = data[:len(data) - trailing] if trailing else data
+    cut = len(body)
+    for _ in range(count):
+        cut = body.rfind(b"\n", 0, cut)
+        if cut < 0:
+            break
+    if cut >= 0:
+        data = data[cut + 1:]
+        start += cut + 1
+    if len(data) > max_bytes:
+        start += len(data) - max_bytes
+        data = data[len(data) - max_bytes:]
+    # 截断到max_bytes时起点可能落在字符中间
+    if encoding.startswith("utf-8"):
+        skip = 0
+        while skip < min(len(data), 3) and 0x80 <= data[skip] <= 0xBF:
+            skip += 1
+        data, start = data[skip:], start + skip
+    text, _ = _decode(data, encoding, final=True)
+    lines = text.count("\n") + (0 if text.endswith("\n") or not text else 1)
+    return {"content": text, "lines": lines, "offset": start, "end": size, "eof": True}
+
+
+def parse_range_header(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析HTTP Range头（单个范围），返回闭区间 (start, end)
+    没有Range头返回None，范围无效时抛出ValueError
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        raise ValueError(f"unsupported range: {header}")
+    first, _, last = spec.strip().partition("-")
+    if first:
+        start = int(first)
+        end = int(last) if last else size - 1
+    else:
+        # bytes=-N 表示最后N个字节
+        start = max(size - int(last), 0)
+        end = size - 1
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        raise ValueError(f"unsatisfiable range: {header}")
+    return start, end
+
+
+def iter_range(path: str, start: int = 0, end: Optional[int] = None,
+               chunk_size: int = STREAM_CHUNK_BYTES) -> Iterator[bytes]:
+    """分块读取闭区间 [start, end]，end为None时读到文件末尾"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = None if end is None else end - start + 1
+        while remaining is None or remaining > 0:
+            chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
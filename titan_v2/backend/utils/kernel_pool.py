@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+Jupyter内核池
+预先创建N个CodeExecutionToolkit沙箱并导入常用包，按环境指纹只检查/安装一次依赖。
+依赖检查与安装都在内核中进行（内核可能使用与titan.py不同的Python环境），
+第一个内核启动后先执行一次环境探测，取得内核解释器、site-packages修改时间与缺失的包。
+每次任务租借一个干净的内核，归还时清空命名空间；清理失败或达到复用上限时重建内核。
+任务取消时先中断正在执行的单元，宽限期内仍未结束则结束内核进程，归还时重建。
+"""
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from camel.toolkits import CodeExecutionToolkit
+
+# 列出内核变量、探测内核环境时的输出标记
+_VARIABLES_MARKER = "__TITAN_KERNEL_VARIABLES__"
+_ENVIRONMENT_MARKER = "__TITAN_KERNEL_ENVIRONMENT__"
+# 在内核中执行的环境探测，函数执行后立即删除，不留在命名空间中
+_ENVIRONMENT_PROBE = """
+def _titan_probe(packages):
+    import importlib, importlib.metadata, importlib.util, json, os, sys
+    importlib.invalidate_caches()
+    site_dirs = sorted({p for p in sys.path if p.endswith("site-packages") and os.path.isdir(p)})
+    versions = {}
+    for package in packages:
+        try:
+            versions[package] = importlib.metadata.version(package)
+        except importlib.metadata.PackageNotFoundError:
+            versions[package] = None
+    print(%r + json.dumps({
+        "executable": sys.executable,
+        "version": sys.version,
+        "site_dirs": {site_dir: os.stat(site_dir).st_mtime_ns for site_dir in site_dirs},
+        "missing": [package for package, import_name in packages.items() if importlib.util.find_spec(import_name) is None],
+        "versions": versions
+    }))
+_titan_probe(%r)
+del _titan_probe
+"""
+
+# pip包名与import名不一致的映射
+IMPORT_NAMES = {"scikit-learn": "sklearn"}
+
+
+def get_import_name(package: str) -> str:
+    return IMPORT_NAMES.get(package, package.replace("-", "_"))
+
+
+def compute_env_fingerprint(environment: Dict[str, Any], packages: List[str]) -> str:
+    """环境指纹：内核解释器 + 目标包列表 + site-packages目录修改时间，任何安装/卸载都会改变指纹"""
+    parts = [environment["executable"], environment["version"], ",".join(sorted(packages))]
+    for site_dir, mtime_ns in sorted(environment["site_dirs"].items()):
+        parts.append(f"{site_dir}:{mtime_ns}")
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def probe_environment(code_toolkit: CodeExecutionToolkit, packages: List[str]) -> Optional[Dict[str, Any]]:
+    """在内核中检查依赖，返回内核环境信息（含缺失的包与版本）；探测失败时返回None"""
+    code = _ENVIRONMENT_PROBE % (_ENVIRONMENT_MARKER, {package: get_import_name(package) for package in packages})
+    try:
+        output = code_toolkit.execute_code(code)
+    except Exception as e:
+        print(f"[WARNING] Probe Kernel Environment Failed: {e}")
+        return None
+    for line in str(output).splitlines():
+        if line.startswith(_ENVIRONMENT_MARKER):
+            try:
+                return json.loads(line[len(_ENVIRONMENT_MARKER):])
+            except ValueError:
+                break
+    print(f"[WARNING] Probe Kernel Environment Failed: {output}")
+    return None
+
+
+class KernelPool:
+    """预热的Jupyter沙箱池"""
+
+    def __init__(self, size: int, packages: List[str], fingerprint_file: str, max_uses: int = 20):
+        self.size = max(1, size)
+        self.packages = packages
+        self.fingerprint_file = fingerprint_file
+        self.max_uses = max_uses
+        self._idle: "queue.Queue[CodeExecutionToolkit]" = queue.Queue()
+        self._uses: Dict[int, int] = {}
+        self.leases = 0
+        self.recycled = 0
+        self.interrupts = 0
+        self.kills = 0
+        self._killed = set()
+
+    def ensure_environment(self, code_toolkit: CodeExecutionToolkit) -> None:
+        """在内核中按环境指纹检查依赖，指纹未变化时跳过安装"""
+        environment = probe_environment(code_toolkit, self.packages)
+        if environment is None:
+            return
+        fingerprint = compute_env_fingerprint(environment, self.packages)
+        if os.path.exists(self.fingerprint_file):
+            try:
+                with open(self.fingerprint_file, 'r', encoding='utf-8') as f:
+                    if json.load(f).get("fingerprint") == fingerprint:
+                        print("[SYSTEM] Python Environment Unchanged, Skip Dependency Check")
+                        return
+            except (OSError, ValueError) as e:
+                print(f"[WARNING] Read Environment Fingerprint Failed: {e}")
+
+        missing = environment["missing"]
+        if missing:
+            print(f"[SYSTEM] Installing Missing Packages: {missing}")
+            try:
+                # %pip安装到内核自身的解释器
+                code_toolkit.execute_code(f"%pip install {' '.join(missing)}")
+            except Exception as e:
+                print(f"[ERROR] Failed to install {missing}: {e}")
+            environment = probe_environment(code_toolkit, self.packages)
+            if environment is None or environment["missing"]:
+                # 安装失败不记录指纹，下次启动重试
+                print(f"[ERROR] Packages Still Missing: {environment['missing'] if environment else missing}")
+                return
+
+        with open(self.fingerprint_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                "fingerprint": compute_env_fingerprint(environment, self.packages),
+                "executable": environment["executable"],
+                "packages": environment["versions"],
+                "timestamp": time.time()
+            }, f, ensure_ascii=False, indent=2)
+
+    def _warm_up_code(self) -> str:
+        return "import " + ", ".join(get_import_name(package) for package in self.packages)
+
+    def _create_kernel(self, code_toolkit: Optional[CodeExecutionToolkit] = None) -> CodeExecutionToolkit:
+        code_toolkit = code_toolkit or CodeExecutionToolkit(sandbox="jupyter", verbose=False, require_confirm=True)
+        # 首次执行会启动内核，并把常用包加载进内存
+        code_toolkit.execute_code(self._warm_up_code())
+        self._uses[id(code_toolkit)] = 0
+        return code_toolkit
+
+    @staticmethod
+    def _kernel_manager(code_toolkit: CodeExecutionToolkit):
+        return getattr(getattr(code_toolkit, "interpreter", None), "kernel_manager", None)
+
+    def _shutdown_kernel(self, code_toolkit: CodeExecutionToolkit) -> None:
+        self._uses.pop(id(code_toolkit), None)
+        self._killed.discard(id(code_toolkit))
+        kernel_manager = self._kernel_manager(code_toolkit)
+        if kernel_manager is not None:
+            try:
+                kernel_manager.shutdown_kernel(now=True)
+            except Exception as e:
+                print(f"[WARNING] Kernel Shutdown Failed: {e}")
+
+    def provision(self) -> None:
+        """检查环境并创建全部内核"""
+        print("--------------------------------------------------")
+        print("[SYSTEM] Loading Python Environment: ", self.packages)
+        # 第一个内核先用于检查/安装依赖，之后再预热
+        first = CodeExecutionToolkit(sandbox="jupyter", verbose=False, require_confirm=True)
+        self.ensure_environment(first)
+        for i in range(self.size):
+            self._idle.put(self._create_kernel(first if i == 0 else None))
+            print(f"[SYSTEM] Kernel {i + 1}/{self.size} Ready")
+        print("[SYSTEM] Python Environment Loading Complete")
+        print("--------------------------------------------------")
+
+    def interrupt(self, code_toolkit: CodeExecutionToolkit, finished: threading.Event = None, kill_after: float = 3.0) -> bool:
+        """
+        中断内核中正在执行的单元（相当于KeyboardInterrupt）。
+        提供finished时，若kill_after秒后任务仍未结束（单元忽略中断），结束内核进程，归还时重建。
+        """
+        kernel_manager = self._kernel_manager(code_toolkit)
+        if kernel_manager is None:
+            return False
+        try:
+            kernel_manager.interrupt_kernel()
+            self.interrupts += 1
+        except Exception as e:
+            print(f"[WARNING] Kernel Interrupt Failed: {e}", flush=True)
+            finished = finished or threading.Event()  # 中断失败直接结束内核
+            kill_after = 0
+
+        if finished is not None:
+            def kill_if_busy():
+                if not finished.wait(kill_after):
+                    self.kill(code_toolkit)
+
+            threading.Thread(target=kill_if_busy, daemon=True).start()
+        return True
+
+    def kill(self, code_toolkit: CodeExecutionToolkit) -> None:
+        """立即结束内核进程，正在执行的单元随之失败"""
+        kernel_manager = self._kernel_manager(code_toolkit)
+        if kernel_manager is None:
+            return
+        print("[WARNING] Kernel Not Responding To Interrupt, Killing", flush=True)
+        self._killed.add(id(code_toolkit))
+        self.kills += 1
+        try:
+            kernel_manager.shutdown_kernel(now=True)
+        except Exception as e:
+            print(f"[WARNING] Kernel Kill Failed: {e}", flush=True)
+
+    @staticmethod
+    def list_variables(code_toolkit: CodeExecutionToolkit) -> List[str]:
+        """列出内核命名空间中用户定义的变量名（不含模块与IPython内置名称）"""
+        code = (
+            "print('" + _VARIABLES_MARKER + "' + __import__('json').dumps(sorted("
+            "k for k, v in globals().items() if not k.startswith('_') "
+            "and k not in ('In', 'Out', 'exit', 'quit', 'get_ipython') "
+            "and not isinstance(v, __import__('types').ModuleType))))"
+        )
+        try:
+            output = code_toolkit.execute_code(code)
+        except Exception as e:
+            print(f"[WARNING] List Kernel Variables Failed: {e}")
+            return []
+        for line in str(output).splitlines():
+            # 输出中也包含被执行的代码，只解析以标记开头的打印结果
+            if line.startswith(_VARIABLES_MARKER):
+                try:
+                    return json.loads(line[len(_VARIABLES_MARKER):])
+                except ValueError:
+                    break
+        return []
+
+    def _reset_kernel(self, code_toolkit: CodeExecutionToolkit) -> CodeExecutionToolkit:
+        """清空内核命名空间；失败、已被结束或超过复用次数时重建"""
+        self._uses[id(code_toolkit)] = self._uses.get(id(code_toolkit), 0) + 1
+        if self._uses[id(code_toolkit)] < self.max_uses and id(code_toolkit) not in self._killed:
+            try:
+                code_toolkit.execute_code("%reset -f\n" + self._warm_up_code())
+                return code_toolkit
+            except Exception as e:
+                print(f"[WARNING] Kernel Reset Failed, Recycling: {e}")
+        self.recycled += 1
+        self._shutdown_kernel(code_toolkit)
+        return self._create_kernel()
+
+    @contextmanager
+    def lease(self):
+        """租借一个干净的内核，使用完毕后自动清理并归还"""
+        code_toolkit = self._idle.get()
+        self.leases += 1
+        try:
+            yield code_toolkit
+        finally:
+            self._idle.put(self._reset_kernel(code_toolkit))
+
+    def shutdown(self) -> None:
+        while not self._idle.empty():
+            self._shutdown_kernel(self._idle.get_nowait())
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize(),
+            "leases": self.leases,
+            "recycled": self.recycled,
+            "interrupts": self.interrupts,
+            "kills": self.kills
+        }
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+LLM响应持久化缓存
+以 模型类型 + 模型配置 + 完整消息历史(含system message) + 工具定义 的内容哈希为键，
+把ChatCompletion保存在磁盘上（DiskLRUCache，按总大小做LRU淘汰）。支持三种模式：
+- record: 命中直接返回，未命中调用模型并写入缓存
+- replay: 只从缓存读取，未命中抛出LLMCacheMiss，可完全离线、确定性地重放整个流程
+- passthrough: 不使用缓存
+"""
+import hashlib
+import json
+import re
+from typing import Any, Dict, List
+
+from utils.disk_cache import DiskLRUCache
+
+CACHE_MODES = ("record", "replay", "passthrough")
+
+# 计算键时忽略的易变内容，例如状态栏中的当前时间
+DEFAULT_VOLATILE_PATTERNS = [r"状态栏丨时间信息丨[^\n]*"]
+
+
+class LLMCacheMiss(RuntimeError):
+    """replay模式下缓存未命中"""
+
+
+class LLMResponseCache(DiskLRUCache):
+    """ChatCompletion的磁盘缓存"""
+
+
+class LLMCacheMiddleware:
+    """模型调用缓存中间件，配合install_model_middleware使用"""
+
+    def __init__(self, cache: LLMResponseCache, backend: Any, mode: str = "record", volatile_patterns: List[str] = None):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"未知的LLM缓存模式: {mode}，可选: {CACHE_MODES}")
+        self.cache = cache
+        self.backend = backend
+        self.mode = mode
+        self.volatile_patterns = [re.compile(p) for p in (volatile_patterns if volatile_patterns is not None else DEFAULT_VOLATILE_PATTERNS)]
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self._evictions_base = cache.evictions
+
+    def reset_stats(self) -> None:
+        """worker跨任务复用同一个模型，每个任务开始时清零计数，get_stats只反映本次任务"""
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self._evictions_base = self.cache.evictions
+
+    def _normalize(self, value: Any) -> Any:
+        if isinstance(value, str):
+            for pattern in self.volatile_patterns:
+                value = pattern.sub("", value)
+            return value
+        if isinstance(value, dict):
+            return {k: self._normalize(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self._normalize(v) for v in value]
+        return value
+
+    def make_key(self, messages: List[Dict[str, Any]], response_format: Any = None, tools: List[Dict[str, Any]] = None) -> str:
+        config = dict(getattr(self.backend, "model_config_dict", {}) or {})
+        config.pop("stream", None)  # 流式与非流式请求共享同一份结果
+        key_data = {
+            "model_type": str(getattr(self.backend, "model_type", "")),
+            "config": config,
+            "messages": self._normalize(messages),
+            "tools": tools or [],
+            "response_format": getattr(response_format, "__name__", None) if response_format is not None else None
+        }
+        payload = json.dumps(key_data, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _lookup(self, key: str) -> Any:
+        if self.mode == "passthrough":
+            return None
+        data = self.cache.get(key)
+        if data is None:
+            self.misses += 1
+            if self.mode == "replay":
+                raise LLMCacheMiss(f"LLM缓存未命中(replay模式): {key}")
+            return None
+        self.hits += 1
+        from openai.types.chat import ChatCompletion
+        return ChatCompletion.model_validate(data)
+
+    def _store(self, key: str, response: Any) -> None:
+        # 流式响应无法整体保存，只缓存完整的ChatCompletion
+        if self.mode == "record" and hasattr(response, "model_dump") and hasattr(response, "choices"):
+            self.cache.put(key, response.model_dump(mode="json"))
+            self.writes += 1
+
+    def run(self, call_next, messages, response_format=None, tools=None):
+        key = self.make_key(messages, response_format, tools)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        response = call_next(messages, response_format, tools)
+        self._store(key, response)
+        return response
+
+    async def arun(self, call_next, messages, response_format=None, tools=None):
+        key = self.make_key(messages, response_format, tools)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        response = await call_next(messages, response_format, tools)
+        self._store(key, response)
+        return response
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "evictions": self.cache.evictions - self._evictions_base,
+            "entries": len(self.cache._index),
+            "total_bytes": self.cache.total_bytes
+        }
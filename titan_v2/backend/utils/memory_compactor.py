@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+记忆压缩
+agent记忆的token数超过阈值时，把较早的轮次折叠为一条摘要记录（复用utils.change_memory的记录重写方式），
+只保留system message和最近的若干条记录原文，控制每轮发送的prompt大小。
+"""
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional
+
+from utils.utils import compact_memory
+
+# 工具调用的请求与结果必须成对保留
+_TOOL_ROLES = {"function", "tool"}
+
+
+@dataclass
+class CompactionReport:
+    """一次检查的结果，tokens_before/tokens_after为估算的prompt token数"""
+    agent_key: str
+    tokens_before: int
+    tokens_after: int
+    folded_records: int
+
+
+def extractive_summary(records: List[Any], max_chars_per_record: int = 200) -> str:
+    """默认摘要：每条记录保留开头部分，不额外调用模型"""
+    lines = [f"【历史对话摘要】以下是较早的 {len(records)} 条记录的节选："]
+    for record in records:
+        message = record.memory_record.message
+        content = (message.content or "").strip().replace("\n", " ")
+        if len(content) > max_chars_per_record:
+            content = content[:max_chars_per_record] + "..."
+        lines.append(f"- {message.role_name}: {content}")
+    return "\n".join(lines)
+
+
+class MemoryCompactor:
+    """按token阈值折叠agent的早期记忆"""
+
+    def __init__(
+        self,
+        threshold_tokens: int,
+        keep_recent: int = 6,
+        summarizer: Callable[[List[Any]], str] = extractive_summary
+    ):
+        """
+        Args:
+            threshold_tokens: 记忆token数超过该值时触发压缩，<=0表示关闭
+            keep_recent: 保留原文的最近记录条数
+            summarizer: 把被折叠的记录生成摘要文本
+        """
+        self.threshold_tokens = threshold_tokens
+        self.keep_recent = max(1, keep_recent)
+        self.summarizer = summarizer
+        self.compactions = 0
+
+    @staticmethod
+    def count_tokens(agent: Any, records: List[Any]) -> int:
+        """优先使用模型的token计数器，失败时按字符数估算"""
+        messages = [record.memory_record.to_openai_message() for record in records]
+        try:
+            return agent.model_backend.token_counter.count_tokens_from_messages(messages)
+        except Exception:
+            return sum(len(str(message.get("content") or "")) for message in messages) // 2
+
+    @staticmethod
+    def _role(record: Any) -> str:
+        role = record.memory_record.role_at_backend
+        return getattr(role, "value", str(role))
+
+    def _fold_range(self, records: List[Any]) -> Optional[range]:
+        """计算可折叠的区间：跳过开头的system记录，保留最近keep_recent条，且不拆开工具调用"""
+        start = 0
+        while start < len(records) and self._role(records[start]) == "system":
+            start += 1
+        end = len(records) - self.keep_recent
+        # 保留部分不能以工具结果开头，否则会和对应的工具调用请求分离
+        while start < end < len(records) and self._role(records[end]) in _TOOL_ROLES:
+            end -= 1
+        if end - start < 2:
+            return None
+        return range(start, end)
+
+    def compact(self, agent_key: str, agent: Any) -> CompactionReport:
+        records = agent.memory.retrieve()
+        tokens_before = self.count_tokens(agent, records)
+        if self.threshold_tokens <= 0 or tokens_before <= self.threshold_tokens:
+            return CompactionReport(agent_key, tokens_before, tokens_before, 0)
+
+        fold = self._fold_range(records)
+        if fold is None:
+            return CompactionReport(agent_key, tokens_before, tokens_before, 0)
+
+        summary = self.summarizer(records[fold.start:fold.stop])
+        records = compact_memory(agent, summary, fold.start, fold.stop)
+        self.compactions += 1
+        return CompactionReport(agent_key, tokens_before, self.count_tokens(agent, records), len(fold))
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+模型调用中间件
+在camel模型后端实例的run/arun外层挂载中间件（缓存、流式转发、用量统计等），
+ChatAgent与ModelManager拿到的仍是原始后端对象，不受类型检查影响。
+中间件实现 run(call_next, messages, response_format, tools)，可选实现 arun(...) 异步版本。
+"""
+from typing import Any
+
+
+def install_model_middleware(backend: Any, middleware: Any) -> Any:
+    """把中间件包在backend当前的run/arun外层，后安装的中间件位于最外层"""
+    next_run = backend.run
+
+    def run(messages, response_format=None, tools=None):
+        return middleware.run(next_run, messages, response_format, tools)
+
+    backend.run = run
+
+    next_arun = getattr(backend, "arun", None)
+    if next_arun is not None:
+        async def arun(messages, response_format=None, tools=None):
+            if hasattr(middleware, "arun"):
+                return await middleware.arun(next_arun, messages, response_format, tools)
+            return await next_arun(messages, response_format, tools)
+
+        backend.arun = arun
+
+    middlewares = getattr(backend, "titan_middlewares", [])
+    backend.titan_middlewares = middlewares + [middleware]
+    return backend
+
+
+def get_model_middleware(backend: Any, middleware_type: type) -> Any:
+    """获取backend上已安装的指定类型中间件，没有则返回None"""
+    for middleware in getattr(backend, "titan_middlewares", []):
+        if isinstance(middleware, middleware_type):
+            return middleware
+    return None
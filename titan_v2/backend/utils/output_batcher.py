@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+titan输出帧合并
+titan.py的每一行输出原本各自成为一次send_text和一次API日志打印，长工具输出会产生数千个很小的帧。
+OutputBatcher把一个时间窗口（max_delay）或大小窗口（max_bytes）内的事件合并成一批，整批只打印一次、
+每个客户端只入队一帧；先到达的窗口触发发送，事件顺序不变。max_delay为0时逐条发送（原行为）。
+文本格式的帧：连续的非token行以换行连接；同一agent与轮次的连续token增量合并为一行[TOKEN]，旧版前端无需修改。
+"""
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from utils.titan_events import event_to_text
+from utils.token_stream import TOKEN_PREFIX
+
+
+def event_size(event: Dict[str, Any]) -> int:
+    payload = event.get("payload") or {}
+    return len(payload.get("text") or payload.get("delta") or "")
+
+
+def text_frames(events: List[Dict[str, Any]]) -> List[str]:
+    """把一批事件编码为旧版文本帧"""
+    frames: List[str] = []
+    lines: List[str] = []
+    token: Optional[Dict[str, Any]] = None
+
+    def flush_lines():
+        if lines:
+            frames.append("\n".join(lines))
+            lines.clear()
+
+    def flush_token():
+        nonlocal token
+        if token is not None:
+            frames.append(f"{TOKEN_PREFIX} {json.dumps(token, ensure_ascii=False)}")
+            token = None
+
+    for event in events:
+        if event.get("kind") == "token":
+            flush_lines()
+            delta = (event.get("payload") or {}).get("delta", "")
+            if token is not None and (token["agent"], token["round"]) == (event.get("agent"), event.get("round")):
+                token["delta"] += delta
+            else:
+                flush_token()
+                token = {"agent": event.get("agent"), "round": event.get("round"), "delta": delta}
+        else:
+            flush_token()
+            lines.append(event_to_text(event))
+    flush_lines()
+    flush_token()
+    return frames
+
+
+def event_frames(events: List[Dict[str, Any]]) -> List[str]:
+    """JSON事件格式：一批事件为一帧，事件之间以换行分隔"""
+    return ["\n".join(json.dumps(event, ensure_ascii=False) for event in events)]
+
+
+class OutputBatcher:
+    """按时间/大小窗口合并输出事件，交给flush_fn整批发布"""
+
+    def __init__(self, flush_fn: Callable[[List[Dict[str, Any]]], Awaitable[None]],
+                 max_delay: float = 0.02, max_bytes: int = 64 * 1024):
+        self.flush_fn = flush_fn
+        self.max_delay = max_delay
+        self.max_bytes = max_bytes
+        self._events: List[Dict[str, Any]] = []
+        self._bytes = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.events_total = 0
+        self.batches_total = 0
+
+    async def add(self, event: Dict[str, Any]) -> None:
+        self._events.append(event)
+        self._bytes += event_size(event)
+        self.events_total += 1
+        if self.max_delay <= 0 or self._bytes >= self.max_bytes:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self._on_timer)
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        asyncio.ensure_future(self.flush())
+
+    async def flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._events:
+            return
+        events, self._events, self._bytes = self._events, [], 0
+        self.batches_total += 1
+        await self.flush_fn(events)
+
+    async def close(self) -> None:
+        """发送剩余事件，运行结束时调用"""
+        await self.flush()
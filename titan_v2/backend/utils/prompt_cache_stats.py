@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+提供方前缀缓存命中统计
+从每次模型响应的usage中读取提供方返回的缓存token数，按agent与轮次汇总命中率：
+- DeepSeek: prompt_cache_hit_tokens / prompt_cache_miss_tokens
+- OpenAI兼容: prompt_tokens_details.cached_tokens
+需安装在LLM响应缓存内层，本地缓存命中的调用不计入。
+同时记录各agent稳定前缀（system message）的哈希，前缀变化即意味着提供方缓存失效。
+StatusSuffixMiddleware在每次请求时把易变的状态栏追加为最后一条消息（位于稳定前缀与历史之后），
+状态栏不写入agent记忆，历史部分在各轮之间保持不变。
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.token_stream import current_stream_tags
+
+
+def extract_cached_tokens(usage: Any) -> Optional[Tuple[int, int]]:
+    """返回 (缓存命中token数, prompt token总数)；提供方未返回缓存字段时返回None"""
+    if usage is None:
+        return None
+    if hasattr(usage, "model_dump"):
+        usage = usage.model_dump()
+    if not isinstance(usage, dict):
+        return None
+    prompt_tokens = usage.get("prompt_tokens") or 0
+    if usage.get("prompt_cache_hit_tokens") is not None:
+        hit = usage.get("prompt_cache_hit_tokens") or 0
+        miss = usage.get("prompt_cache_miss_tokens")
+        return hit, prompt_tokens or hit + (miss or 0)
+    details = usage.get("prompt_tokens_details") or {}
+    if isinstance(details, dict) and details.get("cached_tokens") is not None:
+        return details.get("cached_tokens") or 0, prompt_tokens
+    return None
+
+
+class PromptCacheStatsMiddleware:
+    """统计提供方前缀缓存命中率，配合install_model_middleware使用"""
+
+    def __init__(self):
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        """worker跨任务复用同一个模型，每个任务开始时清零，命中率只反映本次任务"""
+        self.calls = 0
+        self.reported_calls = 0
+        self.cached_tokens = 0
+        self.prompt_tokens = 0
+        self.per_agent: Dict[str, Dict[str, int]] = {}
+        self.prefix_hashes: Dict[str, str] = {}
+        self._last: Dict[str, Tuple[int, int]] = {}
+
+    def record_prefix(self, agent: str, prefix_hash: str) -> None:
+        """记录agent稳定前缀的哈希（创建agent时调用）"""
+        self.prefix_hashes[agent] = prefix_hash
+
+    def _record(self, response: Any) -> None:
+        self.calls += 1
+        result = extract_cached_tokens(getattr(response, "usage", None))
+        if result is None:
+            return
+        cached, prompt = result
+        self.reported_calls += 1
+        self.cached_tokens += cached
+        self.prompt_tokens += prompt
+        agent = current_stream_tags().get("agent") or "unknown"
+        stats = self.per_agent.setdefault(agent, {"cached_tokens": 0, "prompt_tokens": 0})
+        stats["cached_tokens"] += cached
+        stats["prompt_tokens"] += prompt
+        # 一次发言可能包含多次模型调用（工具调用），累加到该agent本轮
+        last_cached, last_prompt = self._last.get(agent, (0, 0))
+        self._last[agent] = (last_cached + cached, last_prompt + prompt)
+
+    def pop_round(self, agent: str) -> Optional[Tuple[int, int]]:
+        """取出该agent上一次发言的 (缓存命中token数, prompt token数)"""
+        return self._last.pop(agent, None)
+
+    def run(self, call_next, messages, response_format=None, tools=None):
+        response = call_next(messages, response_format, tools)
+        self._record(response)
+        return response
+
+    async def arun(self, call_next, messages, response_format=None, tools=None):
+        response = await call_next(messages, response_format, tools)
+        self._record(response)
+        return response
+
+    @staticmethod
+    def ratio(cached: int, prompt: int) -> float:
+        return round(cached / prompt, 4) if prompt else 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "reported_calls": self.reported_calls,
+            "cached_tokens": self.cached_tokens,
+            "prompt_tokens": self.prompt_tokens,
+            "hit_ratio": self.ratio(self.cached_tokens, self.prompt_tokens),
+            "prefix_hashes": {agent: prefix_hash[:16] for agent, prefix_hash in self.prefix_hashes.items()},
+            "per_agent": {
+                agent: dict(stats, hit_ratio=self.ratio(stats["cached_tokens"], stats["prompt_tokens"]))
+                for agent, stats in self.per_agent.items()
+            }
+        }
+
+
+class StatusSuffixMiddleware:
+    """把agent的状态栏追加到请求消息末尾，配合install_model_middleware使用（需位于LLM响应缓存外层，状态栏参与缓存键）"""
+
+    def __init__(self):
+        self.suffixes: Dict[str, str] = {}
+
+    def set_status(self, agent: str, status: str) -> None:
+        if status:
+            self.suffixes[agent] = status
+        else:
+            self.suffixes.pop(agent, None)
+
+    def _append(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        status = self.suffixes.get(current_stream_tags().get("agent"))
+        if not status:
+            return messages
+        return list(messages) + [{"role": "system", "content": status}]
+
+    def run(self, call_next, messages, response_format=None, tools=None):
+        return call_next(self._append(messages), response_format, tools)
+
+    async def arun(self, call_next, messages, response_format=None, tools=None):
+        return await call_next(self._append(messages), response_format, tools)
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+titan输出回放缓冲
+每个会话的输出事件按顺序分配序号(seq，跨运行单调递增)，当前运行的事件保存在有界的内存环形缓冲中，
+超出max_memory_events的较早事件溢出到会话目录下的 replay/output.jsonl（按稀疏索引定位）。
+客户端连接 /ws/titan-output 时带上 resume_from=N，服务端用一帧批量补发 seq > N 的事件；
+不带resume_from（页面刷新、新客户端）时补发当前运行的全部输出。新的运行开始时清空缓冲，序号继续递增。
+补发分两步：catchup()在事件循环中取得内存中的事件与溢出部分的位置，ReplayCatchup.load()读取溢出文件（阻塞IO，
+由main.py放到线程中执行），读取期间追加的事件不会被包含进来。
+溢出同样分三步：take_spill()取出超出部分（事件仍留在内存中，补发照常可见），SpillBatch.write()在线程中写文件，
+finish_spill()回到事件循环后再从内存移除并更新索引；同一时刻只有一批在写，新的运行从第一批溢出开始覆盖旧文件。
+"""
+import json
+import os
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# 每隔多少条溢出事件记录一次文件偏移
+_INDEX_STRIDE = 256
+
+
+@dataclass
+class ReplayCatchup:
+    """某一时刻需要补发的事件"""
+    reset: bool
+    memory_events: List[Dict[str, Any]]
+    spill_path: Optional[str] = None  # 为None时不需要读取溢出文件
+    spill_offset: int = 0
+    spill_end: int = 0  # 取得补发时溢出文件的长度，之后追加的内容不读取
+    after_seq: int = 0
+    before_seq: int = 0  # 只读取 after_seq < seq < before_seq 的溢出事件（文件被新的运行替换时也不会越界）
+
+    def load(self) -> List[Dict[str, Any]]:
+        """读取溢出部分并与内存中的事件合并；新的运行已删除溢出文件时只返回内存中的事件"""
+        events: List[Dict[str, Any]] = []
+        if self.spill_path is not None:
+            try:
+                with open(self.spill_path, 'rb') as f:
+                    f.seek(self.spill_offset)
+                    position = self.spill_offset
+                    for line in f:
+                        position += len(line)
+                        if position > self.spill_end:
+                            break
+                        event = json.loads(line)
+                        if event["seq"] >= self.before_seq:
+                            break
+                        if event["seq"] > self.after_seq:
+                            events.append(event)
+            except FileNotFoundError:
+                pass
+        events.extend(self.memory_events)
+        return events
+
+
+@dataclass
+class SpillBatch:
+    """一批待写入溢出文件的事件，write()为阻塞IO，在线程中执行"""
+    path: str
+    events: List[Dict[str, Any]]
+    run: int
+    offset: int  # 写入位置（当前运行已溢出的字节数）
+    spilled: int  # 写入前当前运行已溢出的事件数
+    truncate: bool  # 新运行的第一批：覆盖上一次运行留下的文件
+    index: Optional[List[Tuple[int, int]]] = None
+    end: int = 0
+
+    def write(self) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.index = []
+        offset = self.offset
+        with open(self.path, 'wb' if self.truncate else 'ab') as f:
+            for spilled, event in enumerate(self.events, self.spilled):
+                if spilled % _INDEX_STRIDE == 0:
+                    self.index.append((event["seq"], offset))
+                line = (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+                f.write(line)
+                offset += len(line)
+        self.end = offset
+
+
+class ReplayBuffer:
+    """单个会话当前运行的输出事件"""
+
+    def __init__(self, spill_path: str, max_memory_events: int = 2000):
+        self.spill_path = spill_path
+        self.max_memory_events = max(1, max_memory_events)
+        self.last_seq = 0
+        self.first_seq = 1  # 当前运行的第一个序号
+        self._memory: Deque[Dict[str, Any]] = deque()
+        self._spill_index: List[Tuple[int, int]] = []  # (seq, 文件偏移)
+        self._spilled = 0
+        self._spill_bytes = 0
+        self._run = 0
+        self._truncate = True
+        self._spilling = False  # 有一批正在写入
+        self.catchups = 0
+        self.catchup_events = 0
+
+    def begin_run(self) -> None:
+        """新的运行：清空缓冲，序号继续递增；旧的溢出文件不再被索引，由新运行的第一批溢出覆盖"""
+        self._memory.clear()
+        self._spill_index = []
+        self._spilled = 0
+        self._spill_bytes = 0
+        self._run += 1
+        self._truncate = True
+        self.first_seq = self.last_seq + 1
+
+    def extend(self, events: List[Dict[str, Any]]) -> None:
+        """为事件分配序号（写入event["seq"]）并保存，超出内存上限的部分由take_spill()取出"""
+        for event in events:
+            self.last_seq += 1
+            event["seq"] = self.last_seq
+            self._memory.append(event)
+
+    def take_spill(self) -> Optional[SpillBatch]:
+        """取出超出内存上限的最早事件，没有超出或上一批仍在写入时返回None"""
+        overflow = len(self._memory) - self.max_memory_events
+        if overflow <= 0 or self._spilling:
+            return None
+        self._spilling = True
+        return SpillBatch(self.spill_path, [self._memory[i] for i in range(overflow)], self._run,
+                          self._spill_bytes, self._spilled, self._truncate)
+
+    def finish_spill(self, batch: SpillBatch, written: bool = True) -> None:
+        """写入完成后从内存移除这批事件并更新索引；写入失败时事件留在内存中，下次重试"""
+        self._spilling = False
+        if not written or batch.run != self._run:
+            return  # 期间开始了新的运行，这批事件已随缓冲清空
+        for _ in batch.events:
+            self._memory.popleft()
+        self._spill_index.extend(batch.index)
+        self._spilled += len(batch.events)
+        self._spill_bytes = batch.end
+        self._truncate = False
+
+    def _spill_offset(self, after_seq: int) -> int:
+        offset = 0
+        for seq, index_offset in self._spill_index:
+            if seq > after_seq + 1:
+                break
+            offset = index_offset
+        return offset
+
+    def catchup(self, after_seq: Optional[int]) -> ReplayCatchup:
+        """
+        seq > after_seq 的事件（load()读取）及是否为完整重放，不读取文件
+        after_seq为None、早于当前运行或晚于最新序号（如服务重启）时重放当前运行的全部事件
+        """
+        reset = after_seq is None or after_seq < self.first_seq - 1 or after_seq > self.last_seq
+        if reset:
+            after_seq = self.first_seq - 1
+        if after_seq >= self.last_seq:
+            return ReplayCatchup(reset=reset, memory_events=[])
+        memory_first = self._memory[0]["seq"] if self._memory else self.last_seq + 1
+        catchup = ReplayCatchup(reset=reset, memory_events=[event for event in self._memory if event["seq"] > after_seq])
+        if after_seq + 1 < memory_first and self._spill_index:
+            catchup.spill_path = self.spill_path
+            catchup.spill_offset = self._spill_offset(after_seq)
+            catchup.spill_end = self._spill_bytes
+            catchup.after_seq = after_seq
+            catchup.before_seq = memory_first
+        self.catchups += 1
+        # 同一次运行的序号连续
+        self.catchup_events += self.last_seq - after_seq
+        return catchup
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "first_seq": self.first_seq,
+            "last_seq": self.last_seq,
+            "memory_events": len(self._memory),
+            "spilling": self._spilling,
+            "spilled_events": self._spilled,
+            "spilled_bytes": self._spill_bytes,
+            "catchups": self.catchups,
+            "catchup_events": self.catchup_events
+        }
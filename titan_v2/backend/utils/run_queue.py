@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+分析任务运行队列
+限制同时运行的分析数量，超出部分按提交顺序排队，并统计排队深度与等待时间。
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List
+
+
+class RunQueue:
+    """有界并发的运行队列"""
+
+    def __init__(self, max_concurrency: int = 1):
+        self.max_concurrency = max(1, max_concurrency)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.waiting: Dict[str, float] = {}   # session_id -> 入队时间
+        self.running: Dict[str, float] = {}   # session_id -> 开始运行时间
+        self.wait_times: List[float] = []
+        self.max_samples = 200
+
+    def is_active(self, session_id: str) -> bool:
+        return session_id in self.waiting or session_id in self.running
+
+    def position(self, session_id: str) -> int:
+        """会话在等待队列中的位置(从1开始)，未排队返回0"""
+        for index, waiting_id in enumerate(self.waiting, start=1):
+            if waiting_id == session_id:
+                return index
+        return 0
+
+    @asynccontextmanager
+    async def slot(self, session_id: str):
+        """排队获取一个运行槽位，退出时释放"""
+        self.waiting[session_id] = time.monotonic()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            queued_at = self.waiting.pop(session_id)
+        wait_time = time.monotonic() - queued_at
+        self.wait_times.append(wait_time)
+        del self.wait_times[:-self.max_samples]
+        self.running[session_id] = time.monotonic()
+        try:
+            yield wait_time
+        finally:
+            self.running.pop(session_id, None)
+            self._semaphore.release()
+
+    def get_stats(self) -> Dict[str, object]:
+        now = time.monotonic()
+        return {
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": len(self.waiting),
+            "running": len(self.running),
+            "waiting_sessions": [
+                {"session_id": session_id, "waiting_seconds": now - queued_at}
+                for session_id, queued_at in self.waiting.items()
+            ],
+            "running_sessions": [
+                {"session_id": session_id, "running_seconds": now - started_at}
+                for session_id, started_at in self.running.items()
+            ],
+            "wait_time": {
+                "count": len(self.wait_times),
+                "last": self.wait_times[-1] if self.wait_times else None,
+                "avg": sum(self.wait_times) / len(self.wait_times) if self.wait_times else None,
+                "max": max(self.wait_times) if self.wait_times else None
+            }
+        }
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""
+会话隔离工具
+每个会话拥有独立的agent状态文件和终止信号文件；默认会话沿用backend目录下的原有文件，保持向后兼容。
+"""
+import os
+import re
+
+DEFAULT_SESSION_ID = "default"
+_SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def normalize_session_id(session_id: str = None) -> str:
+    """校验会话ID，空值返回默认会话；会话ID会用作目录名，只允许字母、数字、下划线和短横线"""
+    if not session_id:
+        return DEFAULT_SESSION_ID
+    if not _SESSION_ID_PATTERN.match(session_id):
+        raise ValueError(f"非法的会话ID: {session_id}")
+    return session_id
+
+
+def get_session_dir(work_dir: str, session_id: str = None) -> str:
+    """获取会话目录：默认会话为work_dir本身，其他会话为work_dir/sessions/<session_id>"""
+    session_id = normalize_session_id(session_id)
+    if session_id == DEFAULT_SESSION_ID:
+        return work_dir
+    session_dir = os.path.join(work_dir, "sessions", session_id)
+    os.makedirs(session_dir, exist_ok=True)
+    return session_dir
@@ -4,6 +4,7 @@ import json
 from pathlib import Path
 from datetime import datetime
 import locale
+from utils.file_metadata import TABULAR_EXTENSIONS, get_file_metadata
 
 def get_installed_packages():
     """获取当前Python环境已安装的包列表"""
@@ -46,10 +47,21 @@ def get_dataset_info(path):
                 # 如果无法计算相对路径，使用文件名
                 relative_path = file_path.name
             
-            files_info.append({
+            file_info = {
                 "大小": size_str,
                 "相对路径": str(relative_path)
-            })
+            }
+            # 表格文件附带编码、分隔符与表头（按文件版本缓存，编码已确认），内核读取数据时无需试探编码
+            if file_path.suffix.lower() in TABULAR_EXTENSIONS:
+                try:
+                    metadata = get_file_metadata(str(file_path), confirm=True)
+                    if metadata.is_text:
+                        file_info["编码"] = metadata.encoding
+                        file_info["分隔符"] = metadata.delimiter
+                        file_info["表头"] = metadata.has_header
+                except OSError:
+                    pass
+            files_info.append(file_info)
     
     return files_info
 
@@ -147,7 +159,12 @@ def create_status_bar(packages=None):
             for file_info in dataset_info:
                 size = file_info['大小']
                 relative_path = file_info['相对路径']
-                status_bar += f"  📄 {size:<10} | {relative_path}\n"
+                line = f"  📄 {size:<10} | {relative_path}"
+                if file_info.get("编码"):
+                    line += f" | encoding={file_info['编码']!r}"
+                    if file_info.get("分隔符"):
+                        line += f", sep={file_info['分隔符']!r}, header={'0' if file_info.get('表头') else 'None'}"
+                status_bar += line + "\n"
     else:
         status_bar += f"  {dataset_info}\n"
     
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+titan输出事件协议
+main.py启动titan.py时设置TITAN_EVENTS=1，titan.py的stdout每行是一个事件：
+    [EVENT] {"kind": ..., "agent": ..., "round": ..., "payload": {...}, "ts": ...}
+- kind: task_start / message / system / warning / error / token / log / stderr / task_end
+- payload.text为该事件对应的原文本行（token事件为payload.delta），日志文件与旧版文本客户端仍使用原文本
+titan.py中的关键输出通过emit()产生带类型和结构化字段的事件；其他print（camel、工具输出等）
+由EventStdout逐行包装为log事件，agent与轮次取自当前调用的标签。main.py按kind路由，不再解析文本前缀。
+未设置TITAN_EVENTS时emit()等同于print，单独运行titan.py的输出不变。
+本模块被main.py使用，不能导入camel。
+"""
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Sequence
+
+EVENT_PREFIX = "[EVENT]"
+EVENT_ENV = "TITAN_EVENTS"
+EVENT_KINDS = ("task_start", "message", "system", "warning", "error", "token", "log", "stderr", "task_end")
+
+_local = threading.local()
+_event_stdout: Optional["EventStdout"] = None
+
+
+def events_enabled() -> bool:
+    return os.getenv(EVENT_ENV) == "1"
+
+
+def make_event(kind: str, text: Optional[str] = None, agent: Optional[str] = None,
+               round_index: Optional[int] = None, **data: Any) -> Dict[str, Any]:
+    payload = dict(data)
+    if text is not None:
+        payload["text"] = text
+    return {"kind": kind, "agent": agent, "round": round_index, "payload": payload, "ts": time.time()}
+
+
+def format_event(event: Dict[str, Any]) -> str:
+    return f"{EVENT_PREFIX} {json.dumps(event, ensure_ascii=False, default=str)}"
+
+
+def parse_event(line: str) -> Optional[Dict[str, Any]]:
+    """解析事件行，不是事件时返回None"""
+    if not line.startswith(EVENT_PREFIX):
+        return None
+    try:
+        event = json.loads(line[len(EVENT_PREFIX):])
+    except ValueError:
+        return None
+    return event if isinstance(event, dict) and "kind" in event else None
+
+
+def event_to_text(event: Dict[str, Any]) -> str:
+    """转换为旧版文本行"""
+    payload = event.get("payload") or {}
+    if event.get("kind") == "token":
+        from utils.token_stream import TOKEN_PREFIX
+        token = {"agent": event.get("agent"), "round": event.get("round"), "delta": payload.get("delta", "")}
+        return f"{TOKEN_PREFIX} {json.dumps(token, ensure_ascii=False)}"
+    return payload.get("text", "")
+
+
+class EventStdout:
+    """
+    titan.py的控制台输出：未经emit()的每一行包装为log事件，emit()期间的输出合并为一个事件
+    passthrough中的前缀（worker协议标记）原样输出
+    """
+
+    def __init__(self, stream: Any, tags: Callable[[], Dict[str, Any]] = dict, passthrough: Sequence[str] = ()):
+        self.stream = stream
+        self.tags = tags
+        self.passthrough = tuple(passthrough) + (EVENT_PREFIX,)
+        self._lock = threading.Lock()
+
+    def _write_line(self, line: str) -> None:
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+    def write_event(self, event: Dict[str, Any]) -> None:
+        self._write_line(format_event(event))
+
+    def write(self, text: str) -> int:
+        captured = getattr(_local, "captured", None)
+        if captured is not None:
+            captured.append(text)
+            return len(text)
+        buffer = getattr(_local, "buffer", "") + text
+        *lines, _local.buffer = buffer.split("\n")
+        for line in lines:
+            if line.startswith(self.passthrough):
+                self._write_line(line)
+            else:
+                tags = self.tags()
+                self.write_event(make_event("log", line, tags.get("agent"), tags.get("round")))
+        return len(text)
+
+    def flush(self) -> None:
+        with self._lock:
+            self.stream.flush()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.stream, name)
+
+
+def install_event_stdout(tags: Callable[[], Dict[str, Any]] = dict, passthrough: Sequence[str] = ()) -> bool:
+    """设置了TITAN_EVENTS=1时把sys.stdout替换为事件输出，返回是否启用"""
+    global _event_stdout
+    if not events_enabled() or _event_stdout is not None:
+        return _event_stdout is not None
+    _event_stdout = EventStdout(sys.stdout, tags, passthrough)
+    sys.stdout = _event_stdout
+    return True
+
+
+def emit(kind: str, text: str, agent: Optional[str] = None, round_index: Optional[int] = None, **data: Any) -> None:
+    """
+    输出一个类型化事件；文本照常经print写入（日志文件记录原文本），控制台收到的是事件行
+    未启用事件协议时等同于print(text)
+    """
+    if _event_stdout is None:
+        print(text, flush=True)
+        return
+    _local.captured = []
+    try:
+        print(text, flush=True)
+    finally:
+        captured, _local.captured = "".join(_local.captured), None
+    if agent is None and round_index is None:
+        tags = _event_stdout.tags()
+        agent, round_index = tags.get("agent"), tags.get("round")
+    _event_stdout.write_event(make_event(kind, captured.rstrip("\n"), agent, round_index, **data))
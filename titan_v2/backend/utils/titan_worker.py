@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""
+Titan常驻Worker管理模块
+titan.py以 --worker 模式启动后会预先完成camel导入、模型创建和代码沙箱初始化，
+之后通过stdin逐行接收JSON任务，通过stdout输出运行日志，并以完成标记结束每个任务。
+运行中可通过stdin发送控制指令 {"control": "cancel", "task_id": ...} 立即取消当前任务。
+本模块同时被titan.py(协议常量、stdin读取)和main.py(进程池)使用，因此不能导入camel。
+"""
+import asyncio
+import json
+import queue
+import sys
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from utils.cancellation import CancelToken
+from utils.titan_events import event_to_text, parse_event
+
+# IPC协议标记
+WORKER_FLAG = "--worker"
+WORKER_READY_MARKER = "[WORKER] ready"
+WORKER_DONE_MARKER = "[WORKER] task_done"
+# titan.py在完成所有初始化、开始群聊时输出的第一行，用于统计首个输出时间
+TASK_START_PREFIX = "用户:"
+# 控制指令
+WORKER_CONTROL_CANCEL = "cancel"
+# 子进程管道的单行上限：事件协议下一条agent回复是一行
+PIPE_LINE_LIMIT = 16 * 1024 * 1024
+
+
+async def pump_lines(stream: asyncio.StreamReader, on_line: Callable[[str], Awaitable[None]]) -> None:
+    """逐行读取子进程管道直到EOF；stdout与stderr应各用一个任务同时读取，避免一方写满管道阻塞子进程"""
+    while True:
+        line = await stream.readline()
+        if not line:
+            break
+        await on_line(line.decode('utf-8', errors='replace').rstrip())
+
+
+class WorkerStdinReader:
+    """
+    worker端的stdin读取线程：任务请求进入队列由主线程依次执行，
+    取消指令在读取线程中立即触发当前任务的CancelToken，不需要等待当前任务结束
+    """
+
+    def __init__(self, stream: Any = None):
+        self.stream = stream or sys.stdin
+        self._tasks: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._current: Optional[CancelToken] = None
+        self._thread = threading.Thread(target=self._read_loop, name="titan-worker-stdin", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def _read_loop(self) -> None:
+        for line in iter(self.stream.readline, ""):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"[ERROR] Invalid worker request: {e}", flush=True)
+                continue
+            if request.get("control") == WORKER_CONTROL_CANCEL:
+                self._cancel(request.get("task_id"))
+            else:
+                self._tasks.put(request)
+        self._tasks.put(None)  # stdin关闭，worker退出
+
+    def _cancel(self, task_id: Optional[str]) -> None:
+        with self._lock:
+            token = self._current
+        if token is not None and (task_id is None or task_id == token.task_id):
+            print(f"[SYSTEM] Cancel Requested: {token.task_id}", flush=True)
+            token.cancel()
+
+    def next_task(self) -> Optional[Dict[str, Any]]:
+        """阻塞等待下一个任务，stdin关闭时返回None"""
+        return self._tasks.get()
+
+    def begin(self, task_id: Optional[str]) -> CancelToken:
+        token = CancelToken(task_id)
+        with self._lock:
+            self._current = token
+        return token
+
+    def end(self) -> None:
+        with self._lock:
+            self._current = None
+
+
+class TitanWorker:
+    """单个常驻titan.py进程"""
+
+    def __init__(self, worker_id: int, python_executable: str, script_path: str, cwd: str, env: Dict[str, str]):
+        self.worker_id = worker_id
+        self.python_executable = python_executable
+        self.script_path = script_path
+        self.cwd = cwd
+        self.env = env
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.stderr_task: Optional[asyncio.Task] = None
+        self.on_stderr: Optional[Callable[[str], Awaitable[None]]] = None
+        self.started_at: Optional[float] = None
+        self.startup_seconds: Optional[float] = None
+        self.tasks_completed = 0
+        self.current_task_id: Optional[str] = None
+        self._task_finished = asyncio.Event()
+        self.cancels = 0
+        self.kills = 0
+
+    @property
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def start(self) -> None:
+        """启动worker进程，并等待其完成预初始化"""
+        self.started_at = time.monotonic()
+        self.process = await asyncio.create_subprocess_exec(
+            self.python_executable,
+            self.script_path,
+            WORKER_FLAG,
+            env=self.env,
+            cwd=self.cwd,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=PIPE_LINE_LIMIT
+        )
+        # stderr必须持续读取，否则管道写满会阻塞子进程
+        self.stderr_task = asyncio.create_task(self._drain_stderr())
+
+        while True:
+            line = await self.process.stdout.readline()
+            if not line:
+                raise RuntimeError(f"Titan worker {self.worker_id} 启动失败，返回码: {self.process.returncode}")
+            output_line = line.decode('utf-8', errors='replace').rstrip()
+            if output_line == WORKER_READY_MARKER:
+                break
+            event = parse_event(output_line)
+            print(f"[WORKER {self.worker_id}] {event_to_text(event) if event else output_line}")
+
+        self.startup_seconds = time.monotonic() - self.started_at
+        print(f"[INFO] Titan worker {self.worker_id} 已就绪，初始化耗时 {self.startup_seconds:.2f}s")
+
+    async def _drain_stderr(self) -> None:
+        async def forward(error_line: str) -> None:
+            print(f"[TITAN ERROR] {error_line}")
+            if self.on_stderr is not None:
+                await self.on_stderr(error_line)
+
+        await pump_lines(self.process.stderr, forward)
+
+    async def run_task(
+        self,
+        task: Dict[str, str],
+        on_output: Callable[[str], Awaitable[None]],
+        on_stderr: Optional[Callable[[str], Awaitable[None]]] = None
+    ) -> Dict[str, str]:
+        """发送一个任务并逐行转发输出，直到收到完成标记"""
+        if not self.is_alive:
+            raise RuntimeError(f"Titan worker {self.worker_id} 未运行")
+
+        self.on_stderr = on_stderr
+        self.current_task_id = task.get("task_id")
+        self._task_finished = asyncio.Event()
+        try:
+            self.process.stdin.write((json.dumps(task, ensure_ascii=False) + "\n").encode('utf-8'))
+            await self.process.stdin.drain()
+
+            while True:
+                line = await self.process.stdout.readline()
+                if not line:
+                    raise RuntimeError(f"Titan worker {self.worker_id} 意外退出，返回码: {self.process.returncode}")
+                output_line = line.decode('utf-8', errors='replace').rstrip()
+                if output_line.startswith(WORKER_DONE_MARKER):
+                    self.tasks_completed += 1
+                    payload = output_line[len(WORKER_DONE_MARKER):].strip()
+                    return json.loads(payload) if payload else {}
+                await on_output(output_line)
+        finally:
+            self.on_stderr = None
+            self.current_task_id = None
+            self._task_finished.set()
+
+    async def cancel(self, timeout: float = 10.0) -> Optional[float]:
+        """
+        取消正在运行的任务并等待worker回到空闲，返回取消到空闲的耗时；没有运行中的任务时返回None。
+        超时未完成时结束worker进程，由进程池重新拉起。
+        """
+        if self.current_task_id is None or not self.is_alive:
+            return None
+        started = time.monotonic()
+        finished = self._task_finished
+        self.cancels += 1
+        try:
+            control = {"control": WORKER_CONTROL_CANCEL, "task_id": self.current_task_id}
+            self.process.stdin.write((json.dumps(control) + "\n").encode('utf-8'))
+            await self.process.stdin.drain()
+            await asyncio.wait_for(finished.wait(), timeout=timeout)
+        except (asyncio.TimeoutError, ConnectionResetError, BrokenPipeError):
+            print(f"[WARNING] Titan worker {self.worker_id} 取消超时，强制结束进程")
+            self.kills += 1
+            if self.is_alive:
+                self.process.kill()
+            await finished.wait()
+        return time.monotonic() - started
+
+    async def stop(self) -> None:
+        """关闭worker：先关闭stdin让其自然退出，超时则强制结束"""
+        if self.process is None:
+            return
+        if self.is_alive:
+            try:
+                self.process.stdin.close()
+                await asyncio.wait_for(self.process.wait(), timeout=5)
+            except (asyncio.TimeoutError, ConnectionResetError, BrokenPipeError):
+                self.process.kill()
+                await self.process.wait()
+        if self.stderr_task is not None:
+            self.stderr_task.cancel()
+            await asyncio.gather(self.stderr_task, return_exceptions=True)
+            self.stderr_task = None
+        self.process = None
+
+
+class TitanWorkerPool:
+    """预初始化的titan worker池，空闲worker通过队列租借"""
+
+    def __init__(self, size: int, python_executable: str, script_path: str, cwd: str, env: Dict[str, str]):
+        self.size = max(1, size)
+        self.workers: List[TitanWorker] = [
+            TitanWorker(i, python_executable, script_path, cwd, env) for i in range(self.size)
+        ]
+        self._idle: "asyncio.Queue[TitanWorker]" = asyncio.Queue()
+        self._started = False
+        self._start_lock = asyncio.Lock()
+        # 后台重启被强制结束的worker的任务，shutdown时取消并等待
+        self._respawn_tasks: Set[asyncio.Task] = set()
+
+    async def start(self) -> None:
+        async with self._start_lock:
+            if self._started:
+                return
+            results = await asyncio.gather(*(worker.start() for worker in self.workers), return_exceptions=True)
+            for worker, result in zip(self.workers, results):
+                if isinstance(result, Exception):
+                    print(f"[ERROR] Titan worker {worker.worker_id} 启动失败: {result}")
+                self._idle.put_nowait(worker)
+            self._started = True
+
+    async def acquire(self) -> TitanWorker:
+        """租借一个空闲worker，已退出的worker会被重新拉起"""
+        await self.start()
+        worker = await self._idle.get()
+        if not worker.is_alive:
+            print(f"[WARNING] Titan worker {worker.worker_id} 未运行，正在重启...")
+            try:
+                await worker.stop()
+                await worker.start()
+            except Exception:
+                self._idle.put_nowait(worker)
+                raise
+        return worker
+
+    def release(self, worker: TitanWorker) -> None:
+        if worker.process is not None and not worker.is_alive:
+            # 被强制结束的worker在后台重新拉起，之后再放回空闲队列
+            task = asyncio.create_task(self._respawn(worker))
+            self._respawn_tasks.add(task)
+            task.add_done_callback(self._respawn_tasks.discard)
+            return
+        self._idle.put_nowait(worker)
+
+    async def _respawn(self, worker: TitanWorker) -> None:
+        try:
+            await worker.stop()
+            await worker.start()
+        except Exception as e:
+            print(f"[ERROR] Titan worker {worker.worker_id} 重启失败: {e}")
+        finally:
+            self._idle.put_nowait(worker)
+
+    async def shutdown(self) -> None:
+        """先取消进行中的重启，再关闭所有worker（包括重启任务已拉起的进程）"""
+        respawns = list(self._respawn_tasks)
+        for task in respawns:
+            task.cancel()
+        await asyncio.gather(*respawns, return_exceptions=True)
+        await asyncio.gather(*(worker.stop() for worker in self.workers), return_exceptions=True)
+        self._started = False
+        self._idle = asyncio.Queue()
+
+    def get_stats(self) -> Dict[str, object]:
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize(),
+            "workers": [
+                {
+                    "worker_id": worker.worker_id,
+                    "alive": worker.is_alive,
+                    "startup_seconds": worker.startup_seconds,
+                    "tasks_completed": worker.tasks_completed,
+                    "cancels": worker.cancels,
+                    "kills": worker.kills
+                }
+                for worker in self.workers
+            ]
+        }
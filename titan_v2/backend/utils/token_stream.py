@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+模型token级流式输出
+中间件以stream模式调用模型，每收到一个增量就立即输出一行 [TOKEN] {json}（带agent与轮次），
+同时把所有分片重新组装成完整的ChatCompletion返回，ChatAgent的处理流程保持不变。
+"""
+import json
+import sys
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.titan_events import events_enabled, format_event, make_event
+
+TOKEN_PREFIX = "[TOKEN]"
+
+# 当前调用所属的agent与轮次；使用ContextVar，并发的异步调用互不干扰
+_stream_tags: ContextVar[Dict[str, Any]] = ContextVar("titan_stream_tags", default={})
+
+
+@contextmanager
+def token_stream_tags(agent: str, round_index: int):
+    """标记接下来的模型调用属于哪个agent和轮次"""
+    token = _stream_tags.set({"agent": agent, "round": round_index})
+    try:
+        yield
+    finally:
+        _stream_tags.reset(token)
+
+
+def current_stream_tags() -> Dict[str, Any]:
+    """当前模型调用所属的agent与轮次"""
+    return _stream_tags.get()
+
+
+def print_token(agent: Optional[str], round_index: Optional[int], delta: str) -> None:
+    """直接写入原始stdout，不进入日志文件（完整回复仍会按原方式打印并记录）；启用事件协议时输出token事件"""
+    if events_enabled():
+        sys.__stdout__.write(format_event(make_event("token", agent=agent, round_index=round_index, delta=delta)) + "\n")
+    else:
+        line = json.dumps({"agent": agent, "round": round_index, "delta": delta}, ensure_ascii=False)
+        sys.__stdout__.write(f"{TOKEN_PREFIX} {line}\n")
+    sys.__stdout__.flush()
+
+
+class ChatCompletionAssembler:
+    """把ChatCompletionChunk序列组装为ChatCompletion"""
+
+    def __init__(self):
+        self.meta: Dict[str, Any] = {}
+        self.choices: Dict[int, Dict[str, Any]] = {}
+        self.usage = None
+
+    def add(self, chunk: Any) -> List[str]:
+        """累积一个分片，返回其中的文本增量"""
+        deltas = []
+        if not self.meta:
+            self.meta = {"id": chunk.id, "created": chunk.created, "model": chunk.model}
+        if getattr(chunk, "usage", None) is not None:
+            self.usage = chunk.usage.model_dump()
+        for choice in chunk.choices:
+            state = self.choices.setdefault(choice.index, {"role": "assistant", "content": "", "tool_calls": {}, "finish_reason": None})
+            delta = choice.delta
+            if delta.role:
+                state["role"] = delta.role
+            if delta.content:
+                state["content"] += delta.content
+                deltas.append(delta.content)
+            for tool_call in delta.tool_calls or []:
+                call = state["tool_calls"].setdefault(tool_call.index, {"id": "", "type": "function", "function": {"name": "", "arguments": ""}})
+                if tool_call.id:
+                    call["id"] = tool_call.id
+                if tool_call.function is not None:
+                    if tool_call.function.name:
+                        call["function"]["name"] += tool_call.function.name
+                    if tool_call.function.arguments:
+                        call["function"]["arguments"] += tool_call.function.arguments
+            if choice.finish_reason:
+                state["finish_reason"] = choice.finish_reason
+        return deltas
+
+    def build(self) -> Any:
+        from openai.types.chat import ChatCompletion
+
+        choices = []
+        for index in sorted(self.choices):
+            state = self.choices[index]
+            message = {"role": state["role"], "content": state["content"] or None}
+            if state["tool_calls"]:
+                message["tool_calls"] = [state["tool_calls"][i] for i in sorted(state["tool_calls"])]
+            choices.append({
+                "index": index,
+                "message": message,
+                "finish_reason": state["finish_reason"] or ("tool_calls" if state["tool_calls"] else "stop"),
+                "logprobs": None
+            })
+        return ChatCompletion.model_validate({
+            "id": self.meta.get("id", ""),
+            "created": self.meta.get("created", 0),
+            "model": self.meta.get("model", ""),
+            "object": "chat.completion",
+            "choices": choices,
+            "usage": self.usage
+        })
+
+
+class TokenStreamMiddleware:
+    """
+    流式调用模型并实时输出token增量，配合install_model_middleware使用。
+    请求仍经过后端自身的run/arun（消息预处理、请求日志、model_config_dict中默认的tools），
+    只在最终发送请求的_request_chat_completion/_arequest_chat_completion处加上stream参数，
+    并把分片组装成完整的ChatCompletion返回；stream不写入model_config_dict，ChatAgent仍按非流式流程处理。
+    需最先安装（位于缓存等中间件内层），缓存命中的调用不会到达这里。
+    """
+
+    def __init__(self, backend: Any, on_token: Callable[[Optional[str], Optional[int], str], None] = print_token):
+        self.backend = backend
+        self.on_token = on_token
+        # 只有经过本中间件的调用才以流式发送
+        self._streaming: ContextVar[bool] = ContextVar("titan_token_streaming", default=False)
+        self.enabled = hasattr(backend, "_request_chat_completion")
+        if not self.enabled:
+            print(f"[WARNING] 模型后端 {type(backend).__name__} 不支持token流式输出，按非流式请求")
+            return
+        request = backend._request_chat_completion
+        arequest = getattr(backend, "_arequest_chat_completion", None)
+
+        def request_chat_completion(messages, tools=None):
+            if not self._streaming.get():
+                return request(messages, tools)
+            stream = backend._client.chat.completions.create(
+                messages=messages, model=backend.model_type, **self._request_config(tools)
+            )
+            assembler = ChatCompletionAssembler()
+            for chunk in stream:
+                self._emit(assembler.add(chunk))
+            return assembler.build()
+
+        backend._request_chat_completion = request_chat_completion
+
+        if arequest is not None:
+            async def arequest_chat_completion(messages, tools=None):
+                if not self._streaming.get():
+                    return await arequest(messages, tools)
+                stream = await backend._async_client.chat.completions.create(
+                    messages=messages, model=backend.model_type, **self._request_config(tools)
+                )
+                assembler = ChatCompletionAssembler()
+                async for chunk in stream:
+                    self._emit(assembler.add(chunk))
+                return assembler.build()
+
+            backend._arequest_chat_completion = arequest_chat_completion
+
+    def _request_config(self, tools: Optional[List[Dict[str, Any]]]) -> Dict[str, Any]:
+        config = dict(self.backend.model_config_dict)
+        # include_usage让最后一个分片带上用量
+        config.update(stream=True, stream_options={"include_usage": True})
+        if tools:
+            config["tools"] = tools
+        return config
+
+    def _emit(self, deltas: List[str]) -> None:
+        tags = _stream_tags.get()
+        for delta in deltas:
+            self.on_token(tags.get("agent"), tags.get("round"), delta)
+
+    def run(self, call_next, messages, response_format=None, tools=None):
+        if response_format is not None or not self.enabled:
+            return call_next(messages, response_format, tools)
+        token = self._streaming.set(True)
+        try:
+            return call_next(messages, response_format, tools)
+        finally:
+            self._streaming.reset(token)
+
+    async def arun(self, call_next, messages, response_format=None, tools=None):
+        if response_format is not None or not self.enabled:
+            return await call_next(messages, response_format, tools)
+        token = self._streaming.set(True)
+        try:
+            return await call_next(messages, response_format, tools)
+        finally:
+            self._streaming.reset(token)
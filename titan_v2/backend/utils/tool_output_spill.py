@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+大工具输出转存
+代码执行等工具的输出超过阈值时写入本次运行的artifact目录，对话中只保留开头/结尾节选和引用ID，
+agent需要时可通过read_artifact工具分段读取原文。统计每轮的输出字节数与节省的token数。
+"""
+import functools
+import hashlib
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List
+
+from utils.token_stream import current_stream_tags
+
+_ARTIFACT_ID_PATTERN = re.compile(r"^[A-Za-z0-9_]{1,64}$")
+
+
+def estimate_tokens(text: str) -> int:
+    """与记忆压缩的兜底估算一致，按字符数估算token"""
+    return len(text) // 2
+
+
+class ArtifactStore:
+    """按运行隔离的工具输出存储"""
+
+    def __init__(self, artifact_dir: str, threshold_bytes: int = 8000, head_chars: int = 1500, tail_chars: int = 1500):
+        """
+        Args:
+            artifact_dir: 本次运行的artifact目录
+            threshold_bytes: 输出超过该字节数时转存，<=0表示关闭
+            head_chars: 对话中保留的开头字符数
+            tail_chars: 对话中保留的结尾字符数
+        """
+        self.artifact_dir = artifact_dir
+        self.threshold_bytes = threshold_bytes
+        self.head_chars = head_chars
+        self.tail_chars = tail_chars
+        self._lock = threading.Lock()
+        self._count = 0
+        self.spilled = 0
+        self.bytes_total = 0
+        self.bytes_inlined = 0
+        self.tokens_saved = 0
+        self.rounds: Dict[Any, Dict[str, int]] = {}
+
+    def _record(self, output_bytes: int, inlined_bytes: int, tokens_saved: int) -> None:
+        round_index = current_stream_tags().get("round")
+        with self._lock:
+            self.bytes_total += output_bytes
+            self.bytes_inlined += inlined_bytes
+            self.tokens_saved += tokens_saved
+            stats = self.rounds.setdefault(round_index, {"bytes": 0, "inlined_bytes": 0, "tokens_saved": 0, "spilled": 0})
+            stats["bytes"] += output_bytes
+            stats["inlined_bytes"] += inlined_bytes
+            stats["tokens_saved"] += tokens_saved
+            stats["spilled"] += int(tokens_saved > 0)
+
+    def spill(self, output: Any, source: str = "tool") -> Any:
+        """输出超过阈值时写入artifact并返回节选，否则原样返回"""
+        if not isinstance(output, str):
+            return output
+        size = len(output.encode("utf-8"))
+        if self.threshold_bytes <= 0 or size <= self.threshold_bytes or len(output) <= self.head_chars + self.tail_chars:
+            self._record(size, size, 0)
+            return output
+
+        with self._lock:
+            self._count += 1
+            digest = hashlib.sha256(output.encode("utf-8")).hexdigest()[:8]
+            artifact_id = f"{source}_{self._count:03d}_{digest}"
+        os.makedirs(self.artifact_dir, exist_ok=True)
+        with open(os.path.join(self.artifact_dir, f"{artifact_id}.txt"), 'w', encoding='utf-8') as f:
+            f.write(output)
+
+        omitted = len(output) - self.head_chars - self.tail_chars
+        excerpt = (
+            f"[ARTIFACT] 输出过长({size}字节, {len(output)}字符)，完整内容已保存为 {artifact_id}，"
+            f"可调用 read_artifact(artifact_id=\"{artifact_id}\", offset, length) 分段查看\n"
+            f"{output[:self.head_chars]}\n"
+            f"...(省略 {omitted} 字符)...\n"
+            f"{output[-self.tail_chars:]}"
+        )
+        self.spilled += 1
+        self._record(size, len(excerpt.encode("utf-8")), max(0, estimate_tokens(output) - estimate_tokens(excerpt)))
+        print(f"[SYSTEM] Tool Output Spilled: {artifact_id} ({size} bytes)", flush=True)
+        return excerpt
+
+    def read(self, artifact_id: str, offset: int = 0, length: int = 4000) -> str:
+        if not _ARTIFACT_ID_PATTERN.match(artifact_id or ""):
+            return f"[ERROR] 无效的artifact_id: {artifact_id}"
+        path = os.path.join(self.artifact_dir, f"{artifact_id}.txt")
+        if not os.path.exists(path):
+            return f"[ERROR] artifact不存在: {artifact_id}"
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        offset = max(0, int(offset))
+        length = max(1, min(int(length), max(self.threshold_bytes, 4000)))
+        chunk = content[offset:offset + length]
+        end = offset + len(chunk)
+        return f"[ARTIFACT] {artifact_id} 字符 {offset}-{end} / {len(content)}\n{chunk}"
+
+    def pop_round(self, round_index: Any) -> Dict[str, int]:
+        with self._lock:
+            return self.rounds.pop(round_index, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "artifact_dir": self.artifact_dir,
+            "spilled": self.spilled,
+            "bytes_total": self.bytes_total,
+            "bytes_inlined": self.bytes_inlined,
+            "tokens_saved": self.tokens_saved
+        }
+
+
+def create_run_artifact_store(session_dir: str, threshold_bytes: int) -> ArtifactStore:
+    """每次运行使用独立的 artifacts/<时间戳> 目录"""
+    run_id = time.strftime("%Y%m%d_%H%M%S") + f"_{os.getpid()}"
+    return ArtifactStore(os.path.join(session_dir, "artifacts", run_id), threshold_bytes=threshold_bytes)
+
+
+def _spill_wrapper(func: Any, store: ArtifactStore) -> Any:
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return store.spill(func(*args, **kwargs), source=func.__name__)
+    return wrapper
+
+
+def wrap_tools_with_spill(tools: List[Any], store: ArtifactStore) -> List[Any]:
+    """把工具函数的返回值接入转存，并追加read_artifact工具"""
+    from camel.toolkits import FunctionTool
+
+    for tool in tools:
+        tool.func = _spill_wrapper(tool.func, store)
+
+    def read_artifact(artifact_id: str, offset: int = 0, length: int = 4000) -> str:
+        r"""Read part of a large tool output that was saved as an artifact.
+
+        Args:
+            artifact_id (str): The artifact id shown in the truncated tool output.
+            offset (int): Character offset to start reading from. (default: :obj:`0`)
+            length (int): Number of characters to read. (default: :obj:`4000`)
+
+        Returns:
+            str: The requested part of the artifact.
+        """
+        return store.read(artifact_id, offset, length)
+
+    return tools + [FunctionTool(read_artifact)]
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""
+分块、可续传、按内容寻址的文件上传
+- 客户端先init（文件名、大小，可选的sha256），再按offset顺序PUT分块，最后complete
+- 服务端边接收边计算sha256；连接中断后GET状态取得已接收的offset，从那里继续上传
+- 内容存放在 WORKSPACE_DIR/.cas/objects/<sha256前两位>/<sha256>，工作区中的文件是它的独立副本（文件系统支持时用reflink），
+  原地修改工作区文件不会影响存储中的对象或其他同内容的文件；
+  init时给出的sha256已存在时直接从存储复制，不传输数据；complete时内容已存在则丢弃临时文件
+- upload_id在每次init时随机生成，续传状态由客户端保存：init时带上之前的upload_id，
+  且文件名、大小、sha256与该上传一致时返回其已接收的offset
+- 工作区中已有同名但内容不同的文件时不覆盖，改用 "名称 (1).ext"，除非init时指定overwrite
+  （旧版单次上传 /api/upload 总是指定overwrite，保持覆盖同名文件的行为）
+上传状态保存在 .cas/uploads/<upload_id>/ 下，服务重启后从临时文件恢复offset与哈希。
+本模块的方法都是同步的文件操作，由main.py通过asyncio.to_thread调用。
+"""
+import hashlib
+import json
+import os
+import sys
+import shutil
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024
+_HASH_BLOCK_BYTES = 1024 * 1024
+_STALE_UPLOAD_SECONDS = 7 * 24 * 3600
+# Linux ioctl FICLONE：在btrfs、xfs等文件系统上共享数据块，写入时才复制
+_FICLONE = 0x40049409
+
+
+def _hash_file(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK_BYTES), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def _clone_file(source: str, target: str) -> None:
+    """创建source的独立副本：优先reflink，不支持时完整复制"""
+    if sys.platform.startswith("linux"):
+        import fcntl
+        with open(source, 'rb') as src, open(target, 'wb') as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+                return
+            except OSError:
+                pass
+    shutil.copyfile(source, target)
+
+
+class UploadSession:
+    """一个进行中的上传"""
+
+    def __init__(self, upload_id: str, directory: str, filename: str, size: Optional[int],
+                 sha256: Optional[str] = None, overwrite: bool = False):
+        self.upload_id = upload_id
+        self.directory = directory
+        self.filename = filename
+        self.size = size
+        self.expected_sha256 = sha256
+        self.overwrite = overwrite
+        self.offset = 0
+        self.lock = None  # main.py中串行化同一上传的请求（asyncio.Lock）
+        self._hasher = hashlib.sha256()
+
+    @property
+    def part_path(self) -> str:
+        return os.path.join(self.directory, "data.part")
+
+    def save_state(self) -> None:
+        with open(os.path.join(self.directory, "state.json"), 'w', encoding='utf-8') as f:
+            json.dump({"upload_id": self.upload_id, "filename": self.filename, "size": self.size,
+                       "sha256": self.expected_sha256, "overwrite": self.overwrite}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory: str) -> "UploadSession":
+        """从磁盘恢复：offset取临时文件大小，哈希重新计算一次"""
+        with open(os.path.join(directory, "state.json"), 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        session = cls(state["upload_id"], directory, state["filename"], state["size"],
+                      state.get("sha256"), state.get("overwrite", False))
+        if os.path.exists(session.part_path):
+            with open(session.part_path, 'rb') as f:
+                for block in iter(lambda: f.read(_HASH_BLOCK_BYTES), b""):
+                    session._hasher.update(block)
+                    session.offset += len(block)
+        return session
+
+    def append(self, data: bytes) -> None:
+        if self.size is not None and self.offset + len(data) > self.size:
+            raise ValueError(f"超出声明的文件大小 {self.size}")
+        with open(self.part_path, 'ab') as f:
+            f.write(data)
+        self._hasher.update(data)
+        self.offset += len(data)
+
+    def digest(self) -> str:
+        return self._hasher.hexdigest()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "upload_id": self.upload_id,
+            "filename": self.filename,
+            "size": self.size,
+            "offset": self.offset,
+            "status": "pending"
+        }
+
+
+class UploadStore:
+    """内容寻址存储与上传会话"""
+
+    def __init__(self, workspace_dir: str, chunk_size: int = UPLOAD_CHUNK_BYTES):
+        self.workspace_dir = workspace_dir
+        self.chunk_size = chunk_size
+        self.root = os.path.join(workspace_dir, ".cas")
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.uploads_dir = os.path.join(self.root, "uploads")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.uploads_dir, exist_ok=True)
+        self._sessions: Dict[str, UploadSession] = {}
+        self._lock = threading.Lock()
+        self.uploaded_bytes = 0
+        self.deduplicated = 0
+        self.stored = 0
+        self.renamed = 0
+
+    # ---------- 内容寻址存储 ----------
+
+    def object_path(self, sha256: str) -> str:
+        return os.path.join(self.objects_dir, sha256[:2], sha256)
+
+    def _find_object(self, sha256: str) -> Optional[str]:
+        """返回已存储的对象路径，不存在时返回None"""
+        path = self.object_path(sha256)
+        return path if os.path.exists(path) else None
+
+    def _store_object(self, part_path: str, sha256: str) -> str:
+        """把临时文件移入存储（同一文件系统内重命名，不复制数据）"""
+        path = self.object_path(sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(part_path, path)
+        self.stored += 1
+        return path
+
+    def _same_content(self, target: str, object_path: str, sha256: str) -> bool:
+        try:
+            return os.path.getsize(target) == os.path.getsize(object_path) and _hash_file(target) == sha256
+        except OSError:
+            return False
+
+    def _materialize(self, object_path: str, sha256: str, filename: str, overwrite: bool) -> str:
+        """在工作区中创建对象的副本，返回最终文件名；overwrite为False时不覆盖内容不同的同名文件"""
+        target = os.path.join(self.workspace_dir, filename)
+        if os.path.exists(target):
+            if self._same_content(target, object_path, sha256):
+                return filename
+            if not overwrite:
+                stem, extension = os.path.splitext(filename)
+                index = 1
+                while os.path.exists(os.path.join(self.workspace_dir, f"{stem} ({index}){extension}")):
+                    index += 1
+                filename = f"{stem} ({index}){extension}"
+                target = os.path.join(self.workspace_dir, filename)
+                self.renamed += 1
+        tmp = os.path.join(self.root, f"copy-{uuid.uuid4().hex}")
+        try:
+            _clone_file(object_path, tmp)
+            os.replace(tmp, target)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return filename
+
+    # ---------- 上传会话 ----------
+
+    @staticmethod
+    def _clean_filename(filename: str) -> str:
+        name = os.path.basename(filename.replace("\\", "/")).strip()
+        if not name or name.startswith("."):
+            raise ValueError(f"无效的文件名: {filename}")
+        return name
+
+    def _complete_result(self, filename: str, sha256: str, size: int, deduplicated: bool) -> Dict[str, Any]:
+        return {"filename": filename, "path": filename, "size": size, "sha256": sha256,
+                "deduplicated": deduplicated, "status": "complete"}
+
+    def _cleanup_stale(self) -> None:
+        now = time.time()
+        for upload_id in os.listdir(self.uploads_dir):
+            directory = os.path.join(self.uploads_dir, upload_id)
+            try:
+                if now - os.path.getmtime(directory) > _STALE_UPLOAD_SECONDS and upload_id not in self._sessions:
+                    shutil.rmtree(directory, ignore_errors=True)
+            except OSError:
+                pass
+
+    def init(self, filename: str, size: Optional[int], sha256: Optional[str] = None,
+             overwrite: bool = False, upload_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        开始或恢复一个上传：upload_id是之前init返回的、且文件名、大小、sha256、overwrite一致时返回其已接收的offset，
+        否则开始新的上传（随机的upload_id）；给出的sha256已在存储中时直接完成，不需要传输数据
+        """
+        filename = self._clean_filename(filename)
+        sha256 = sha256.lower() if sha256 else None
+        if size is not None and size < 0:
+            raise ValueError("无效的文件大小")
+        if sha256:
+            object_path = self._find_object(sha256)
+            if object_path is not None and (size is None or os.path.getsize(object_path) == size):
+                self.deduplicated += 1
+                final_name = self._materialize(object_path, sha256, filename, overwrite)
+                print(f"[SUCCESS] 内容已存在，跳过上传: {final_name} ({sha256[:12]})")
+                return self._complete_result(final_name, sha256, os.path.getsize(object_path), True)
+        with self._lock:
+            self._cleanup_stale()
+            session = self._get(upload_id) if upload_id else None
+            if session is not None and (session.filename, session.size, session.expected_sha256, session.overwrite) \
+                    != (filename, size, sha256, overwrite):
+                session = None
+            if session is None:
+                # 未给出大小时（旧版单次上传）同样使用新的上传
+                upload_id = uuid.uuid4().hex
+                directory = os.path.join(self.uploads_dir, upload_id)
+                os.makedirs(directory, exist_ok=True)
+                session = UploadSession(upload_id, directory, filename, size, sha256, overwrite)
+                session.save_state()
+                self._sessions[upload_id] = session
+        return dict(session.to_dict(), chunk_size=self.chunk_size)
+
+    def _get(self, upload_id: str) -> Optional[UploadSession]:
+        session = self._sessions.get(upload_id)
+        if session is None:
+            directory = os.path.join(self.uploads_dir, upload_id)
+            if not upload_id.isalnum() or not os.path.exists(os.path.join(directory, "state.json")):
+                return None
+            session = UploadSession.load(directory)
+            self._sessions[upload_id] = session
+        return session
+
+    def get(self, upload_id: str) -> Optional[UploadSession]:
+        with self._lock:
+            return self._get(upload_id)
+
+    def append(self, session: UploadSession, data: bytes) -> None:
+        session.append(data)
+        self.uploaded_bytes += len(data)
+
+    def complete(self, session: UploadSession) -> Dict[str, Any]:
+        """校验大小与哈希，入库（内容已存在时丢弃临时文件）并在工作区创建文件"""
+        if session.size is not None and session.offset != session.size:
+            raise ValueError(f"上传未完成: {session.offset}/{session.size}")
+        sha256 = session.digest()
+        if session.expected_sha256 and session.expected_sha256 != sha256:
+            self.discard(session)
+            raise ValueError("sha256校验失败，已丢弃上传的数据")
+        if not os.path.exists(session.part_path):
+            open(session.part_path, 'wb').close()
+        object_path = self._find_object(sha256)
+        deduplicated = object_path is not None
+        if deduplicated:
+            self.deduplicated += 1
+        else:
+            object_path = self._store_object(session.part_path, sha256)
+        final_name = self._materialize(object_path, sha256, session.filename, session.overwrite)
+        self.discard(session)
+        print(f"[SUCCESS] 文件已上传: {final_name} ({sha256[:12]}{', 内容已存在' if deduplicated else ''})")
+        return self._complete_result(final_name, sha256, session.offset, deduplicated)
+
+    def discard(self, session: UploadSession) -> None:
+        with self._lock:
+            self._sessions.pop(session.upload_id, None)
+        shutil.rmtree(session.directory, ignore_errors=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "pending_uploads": len(self._sessions),
+            "uploaded_bytes": self.uploaded_bytes,
+            "stored_objects": self.stored,
+            "deduplicated": self.deduplicated,
+            "renamed": self.renamed
+        }
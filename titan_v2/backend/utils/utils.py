@@ -97,3 +97,65 @@ def change_memory(agent_planner, new_content, n=0):
     
 
 
+
+
+def compact_memory(agent_planner, summary_content, start, end):
+    """
+    Info: 把agent在[start, end)区间的记忆折叠为一条内容为summary_content的摘要记录
+    Returns:修改后的记忆记录列表
+    """
+    # get memory
+    context_records = agent_planner.memory.retrieve()
+
+    # check index
+    if not 0 <= start < end <= len(context_records):
+        raise ValueError(f"区间 [{start}, {end}) 超出范围，当前记忆记录数量为 {len(context_records)}")
+
+    # create summary record
+    summary_record = MemoryRecord(
+        message=BaseMessage.make_assistant_message(
+            role_name="memory_summary",
+            content=summary_content),
+        role_at_backend=OpenAIBackendRole.SYSTEM,
+        timestamp=context_records[start].memory_record.timestamp,
+        agent_id=context_records[start].memory_record.agent_id
+    )
+
+    # rewrite memory
+    agent_planner.memory.clear()
+    for i, record in enumerate(context_records):
+        if i == start:
+            agent_planner.memory.write_record(summary_record) #写入摘要记录
+        elif start < i < end:
+            continue #被折叠的旧记录
+        else:
+            agent_planner.memory.write_record(record.memory_record) #写入旧记录
+
+    return agent_planner.memory.retrieve()
+
+
+
+
+
+def dump_memory(agent_planner):
+    """
+    Info: 导出agent的全部记忆记录，用于检查点
+    Returns:可JSON序列化的记录列表
+    """
+    return [record.memory_record.to_dict() for record in agent_planner.memory.retrieve()]
+
+
+
+
+
+def restore_memory(agent_planner, record_dicts):
+    """
+    Info: 用检查点中的记录替换agent的全部记忆
+    Returns:恢复后的记忆记录列表
+    """
+    # rewrite memory
+    agent_planner.memory.clear()
+    for record_dict in record_dicts:
+        agent_planner.memory.write_record(MemoryRecord.from_dict(record_dict)) #写入检查点记录
+
+    return agent_planner.memory.retrieve()
@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+"""
+Mermaid工作流引擎
+把fresh_workflow/*.mmd中的flowchart编译为状态机（按路径+大小+修改时间缓存，只解析一次），
+按图驱动agent发言：
+- 矩形节点: 标签（或ID）与agent名称匹配时调用该agent，否则直接透传
+- 菱形节点: 决策，根据上一个agent的回复选择出边
+- 一个节点有多条出边时各分支互相独立，同一轮中通过asyncio并发发言（见async_steps）
+- 回边（闭合环的边）按环计数，超过max_cycle_iterations后不再沿该边回环
+"""
+import asyncio
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.async_steps import AgentStep, AsyncAgentStepper
+
+# 决策节点的肯定/否定标签
+YES_LABELS = {"是", "yes", "y", "true", "通过", "满意", "需要", "完成"}
+NO_LABELS = {"否", "no", "n", "false", "失败", "不满意", "不需要", "未完成"}
+
+_SHAPES = [
+    ("([", "])", "terminal"),
+    ("[[", "]]", "task"),
+    ("((", "))", "terminal"),
+    ("[", "]", "task"),
+    ("{", "}", "decision"),
+    ("(", ")", "task"),
+]
+_NODE_PATTERN = re.compile(r"^([A-Za-z0-9_一-鿿]+)\s*(.*)$")
+_EDGE_PATTERN = re.compile(r"\s*(?:-->|==>|-\.->|---)\s*(?:\|([^|]*)\|)?\s*")
+
+
+@dataclass
+class WorkflowNode:
+    node_id: str
+    label: str
+    kind: str  # task / decision / terminal
+
+
+@dataclass
+class WorkflowEdge:
+    source: str
+    target: str
+    label: str = ""
+    is_back_edge: bool = False
+
+
+@dataclass
+class CompiledWorkflow:
+    nodes: Dict[str, WorkflowNode]
+    edges: Dict[str, List[WorkflowEdge]] = field(default_factory=dict)
+    start_nodes: List[str] = field(default_factory=list)
+
+    def outgoing(self, node_id: str) -> List[WorkflowEdge]:
+        return self.edges.get(node_id, [])
+
+
+def _strip_label(text: str) -> str:
+    text = text.strip()
+    if len(text) >= 2 and text[0] == text[-1] == '"':
+        text = text[1:-1]
+    return text.strip()
+
+
+def _parse_node(text: str) -> Optional[WorkflowNode]:
+    """解析 ID、ID["标签"]、ID{"标签"}、ID(["标签"]) 等节点写法"""
+    match = _NODE_PATTERN.match(text.strip())
+    if not match:
+        return None
+    node_id, rest = match.group(1), match.group(2).strip()
+    if not rest:
+        return WorkflowNode(node_id, node_id, "task")
+    for opener, closer, kind in _SHAPES:
+        if rest.startswith(opener) and rest.endswith(closer):
+            return WorkflowNode(node_id, _strip_label(rest[len(opener):-len(closer)]), kind)
+    return None
+
+
+def parse_mermaid(text: str) -> CompiledWorkflow:
+    """解析flowchart文本并编译：识别起点、标记回边"""
+    nodes: Dict[str, WorkflowNode] = {}
+    edges: Dict[str, List[WorkflowEdge]] = {}
+    declared_order: List[str] = []
+
+    def add_node(node: WorkflowNode) -> None:
+        if node.node_id not in nodes:
+            declared_order.append(node.node_id)
+            nodes[node.node_id] = node
+        elif node.label != node.node_id or node.kind != "task":
+            # 仅在边中引用的节点，之后出现完整定义时更新
+            nodes[node.node_id] = node
+
+    for raw_line in text.splitlines():
+        line = raw_line.split("%%", 1)[0].strip().rstrip(";")
+        if not line or line == "end" or line.startswith(("flowchart", "graph", "classDef", "class ", "style ", "linkStyle", "subgraph ")):
+            continue
+        parts = _EDGE_PATTERN.split(line)
+        if len(parts) == 1:
+            node = _parse_node(line)
+            if node is not None:
+                add_node(node)
+            continue
+        # parts: [节点, 标签, 节点, 标签, 节点, ...]，支持 A --> B --> C 链式写法
+        endpoints = [_parse_node(parts[i]) for i in range(0, len(parts), 2)]
+        labels = [_strip_label(parts[i] or "") for i in range(1, len(parts), 2)]
+        if any(endpoint is None for endpoint in endpoints):
+            continue
+        for endpoint in endpoints:
+            add_node(endpoint)
+        for source, target, label in zip(endpoints, endpoints[1:], labels):
+            edges.setdefault(source.node_id, []).append(WorkflowEdge(source.node_id, target.node_id, label))
+
+    workflow = CompiledWorkflow(nodes=nodes, edges=edges)
+
+    # 起点：终端形状且没有入边的节点；没有则取所有无入边节点；纯环图取第一个声明的节点
+    has_incoming = {edge.target for node_edges in edges.values() for edge in node_edges}
+    roots = [node_id for node_id in declared_order if node_id not in has_incoming]
+    terminal_roots = [node_id for node_id in roots if nodes[node_id].kind == "terminal"]
+    workflow.start_nodes = terminal_roots or roots or declared_order[:1]
+
+    _mark_back_edges(workflow, declared_order)
+    return workflow
+
+
+def _mark_back_edges(workflow: CompiledWorkflow, declared_order: List[str]) -> None:
+    """深度优先遍历，指向当前递归栈中节点的边即为闭合环的回边"""
+    visited = set()
+    on_stack = set()
+
+    def visit(node_id: str) -> None:
+        visited.add(node_id)
+        on_stack.add(node_id)
+        for edge in workflow.outgoing(node_id):
+            if edge.target in on_stack:
+                edge.is_back_edge = True
+            elif edge.target not in visited:
+                visit(edge.target)
+        on_stack.discard(node_id)
+
+    for node_id in workflow.start_nodes + declared_order:
+        if node_id not in visited:
+            visit(node_id)
+
+
+_compiled_cache: Dict[Tuple[str, int, int], CompiledWorkflow] = {}
+_cache_lock = threading.Lock()
+
+
+def load_workflow(path: str) -> CompiledWorkflow:
+    """读取并编译.mmd文件，按(路径, 大小, 修改时间)缓存编译结果"""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _cache_lock:
+        if key not in _compiled_cache:
+            with open(path, 'r', encoding='utf-8') as f:
+                _compiled_cache[key] = parse_mermaid(f.read())
+        return _compiled_cache[key]
+
+
+@dataclass
+class _Activation:
+    node_id: str
+    inputs: List[str]
+
+
+class WorkflowEngine:
+    """按编译后的工作流驱动agent，同一轮的独立分支在事件循环上并发发言"""
+
+    def __init__(
+        self,
+        workflow: CompiledWorkflow,
+        agent_keys: List[str],
+        prepare_fn: Callable[[str, int, Optional[str]], AgentStep],
+        finish_fn: Callable[[AgentStep, Any], str],
+        stepper: AsyncAgentStepper = None,
+        max_steps: int = 10,
+        max_cycle_iterations: int = 3,
+        should_stop: Callable[[], bool] = None,
+        on_checkpoint: Callable[[Dict[str, Any]], None] = None
+    ):
+        """
+        Args:
+            workflow: 编译后的工作流
+            agent_keys: 可用的agent名称
+            prepare_fn: 准备一次发言 prepare_fn(agent_key, step_index, previous_content) -> AgentStep
+            finish_fn: 处理发言结果 finish_fn(step, response) -> 回复内容
+            stepper: 异步并发执行器，限制在途LLM调用数
+            max_steps: agent发言总次数上限
+            max_cycle_iterations: 每个环最多回环次数
+            should_stop: 每轮开始前检查是否需要终止
+            on_checkpoint: 每轮结束后接收可序列化的引擎状态，用于检查点（见restore_state）
+        """
+        self.workflow = workflow
+        self.agent_keys = {key.lower(): key for key in agent_keys}
+        self.prepare_fn = prepare_fn
+        self.finish_fn = finish_fn
+        self.stepper = stepper or AsyncAgentStepper()
+        self.max_steps = max_steps
+        self.max_cycle_iterations = max_cycle_iterations
+        self.should_stop = should_stop or (lambda: False)
+        self.on_checkpoint = on_checkpoint
+        self.cycle_counts: Dict[Tuple[str, str], int] = {}
+        self.steps = 0
+        self.completed = False
+        self._restored_frontier: Optional[List[_Activation]] = None
+
+    def get_state(self, frontier: List[_Activation]) -> Dict[str, Any]:
+        """引擎状态：已发言次数、环计数、待执行的前沿"""
+        return {
+            "steps": self.steps,
+            "cycle_counts": [[source, target, count] for (source, target), count in self.cycle_counts.items()],
+            "frontier": [{"node_id": activation.node_id, "inputs": list(activation.inputs)} for activation in frontier]
+        }
+
+    def restore_state(self, state: Dict[str, Any]) -> None:
+        """从检查点恢复，arun从保存的前沿继续"""
+        self.steps = state.get("steps", 0)
+        self.cycle_counts = {(source, target): count for source, target, count in state.get("cycle_counts", [])}
+        self._restored_frontier = [
+            _Activation(item["node_id"], list(item.get("inputs", [])))
+            for item in state.get("frontier", []) if item["node_id"] in self.workflow.nodes
+        ]
+
+    def agent_for(self, node: WorkflowNode) -> Optional[str]:
+        if node.kind != "task":
+            return None
+        return self.agent_keys.get(node.label.strip().lower()) or self.agent_keys.get(node.node_id.lower())
+
+    def _edge_allowed(self, edge: WorkflowEdge) -> bool:
+        if not edge.is_back_edge:
+            return True
+        return self.cycle_counts.get((edge.source, edge.target), 0) < self.max_cycle_iterations
+
+    def _follow(self, edge: WorkflowEdge) -> None:
+        if edge.is_back_edge:
+            key = (edge.source, edge.target)
+            self.cycle_counts[key] = self.cycle_counts.get(key, 0) + 1
+
+    def choose_decision_edge(self, node: WorkflowNode, content: str) -> Optional[WorkflowEdge]:
+        """
+        决策规则：
+        1. 回复中出现 {出边标签} 时走该边
+        2. 回复中出现 {决策问题}（去掉问号）时走肯定标签的边
+        3. 否则走否定标签的边，没有否定标签时走第一条边
+        受环次数限制的边会被跳过
+        """
+        edges = [edge for edge in self.workflow.outgoing(node.node_id) if self._edge_allowed(edge)]
+        if not edges:
+            return None
+        for edge in edges:
+            if edge.label and f"{{{edge.label}}}" in content:
+                return edge
+        question = node.label.rstrip("?？").strip()
+        if question and f"{{{question}}}" in content:
+            for edge in edges:
+                if edge.label.lower() in YES_LABELS:
+                    return edge
+        for edge in edges:
+            if edge.label.lower() in NO_LABELS:
+                return edge
+        return edges[0]
+
+    def _successors(self, node_id: str, content: str) -> List[_Activation]:
+        node = self.workflow.nodes[node_id]
+        if node.kind == "decision":
+            edge = self.choose_decision_edge(node, content)
+            chosen = [edge] if edge is not None else []
+        else:
+            chosen = [edge for edge in self.workflow.outgoing(node_id) if self._edge_allowed(edge)]
+        for edge in chosen:
+            self._follow(edge)
+        return [_Activation(edge.target, [content] if content else []) for edge in chosen]
+
+    @staticmethod
+    def _merge(activations: List[_Activation]) -> List[_Activation]:
+        """同一轮到达同一节点的分支合并输入，保持首次出现的顺序"""
+        merged: Dict[str, _Activation] = {}
+        for activation in activations:
+            if activation.node_id in merged:
+                merged[activation.node_id].inputs.extend(activation.inputs)
+            else:
+                merged[activation.node_id] = _Activation(activation.node_id, list(activation.inputs))
+        return list(merged.values())
+
+    def _resolve(self, frontier: List[_Activation]) -> List[_Activation]:
+        """展开非agent节点（起止、决策、透传），直到前沿只剩agent节点"""
+        pending = list(frontier)
+        ready: List[_Activation] = []
+        expansions = 0
+        while pending:
+            activation = pending.pop(0)
+            node = self.workflow.nodes[activation.node_id]
+            if self.agent_for(node) is not None:
+                ready.append(activation)
+                continue
+            expansions += 1
+            if expansions > len(self.workflow.nodes) * (self.max_cycle_iterations + 1):
+                break  # 只由非agent节点构成的环
+            pending.extend(self._successors(node.node_id, "\n".join(activation.inputs)))
+        return self._merge(ready)
+
+    async def _run_batch(self, batch: List[_Activation]) -> List[str]:
+        """同一轮的分支并发发言，结果按前沿顺序处理，与完成先后无关"""
+        steps = [
+            self.prepare_fn(
+                self.agent_for(self.workflow.nodes[activation.node_id]),
+                self.steps + index,
+                "\n".join(activation.inputs) or None
+            )
+            for index, activation in enumerate(batch)
+        ]
+        responses = await self.stepper.fan_out(steps)
+        self.steps += len(batch)
+        return [self.finish_fn(step, response) for step, response in zip(steps, responses)]
+
+    async def arun(self) -> bool:
+        """执行工作流，全部分支到达终点时返回True"""
+        if self._restored_frontier is not None:
+            frontier, self._restored_frontier = self._restored_frontier, None
+        else:
+            frontier = self._resolve([_Activation(node_id, []) for node_id in self.workflow.start_nodes])
+        while frontier:
+            if self.should_stop():
+                return False
+            remaining = self.max_steps - self.steps
+            if remaining <= 0:
+                return False
+            batch, deferred = frontier[:remaining], frontier[remaining:]
+            results = await self._run_batch(batch)
+            successors: List[_Activation] = []
+            for activation, content in zip(batch, results):
+                successors.extend(self._successors(activation.node_id, content))
+            frontier = self._resolve(deferred + successors)
+            if self.on_checkpoint is not None:
+                self.on_checkpoint(self.get_state(frontier))
+        self.completed = True
+        return True
+
+    def run(self) -> bool:
+        """同步入口"""
+        return asyncio.run(self.arun())
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+WebSocket非阻塞广播
+每个连接一个有界发送队列，由该连接自己的后台任务发送；广播只把消息放入各队列，不等待任何客户端，
+一个慢速浏览器不会拖慢其他客户端，也不会阻塞titan输出的读取循环。
+队列满时按溢出策略处理：
+- drop_oldest: 丢弃最早的未发送消息
+- coalesce: 把新消息合并进最后一帧（以换行连接，不丢失内容），无法合并或帧过大时退化为drop_oldest
+- disconnect: 关闭该连接（code 1013），由客户端重连后追赶
+"""
+import asyncio
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+OVERFLOW_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+
+
+def join_lines(previous: str, message: str) -> Optional[str]:
+    """默认的合并方式：文本行以换行连接"""
+    return f"{previous}\n{message}"
+
+
+class ClientSendQueue:
+    """单个WebSocket连接的有界发送队列"""
+
+    def __init__(self, websocket: Any, max_size: int = 256, policy: str = "coalesce",
+                 max_frame_bytes: int = 256 * 1024, merge: Callable[[str, str], Optional[str]] = join_lines,
+                 on_close: Optional[Callable[["ClientSendQueue"], None]] = None):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"未知的溢出策略: {policy}，可选 {', '.join(OVERFLOW_POLICIES)}")
+        self.websocket = websocket
+        self.max_size = max(1, max_size)
+        self.policy = policy
+        self.max_frame_bytes = max_frame_bytes
+        self.merge = merge
+        self.on_close = on_close
+        self.closed = False
+        self.overflowed = False  # 因队列溢出被断开
+        self.sent = 0
+        self.bytes_sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+        self._queue: Deque[str] = deque()
+        self._ready = asyncio.Event()
+        self._task = asyncio.create_task(self._drain())
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def put(self, message: str) -> bool:
+        """放入消息（不等待发送），连接已关闭或因溢出被断开时返回False"""
+        if self.closed:
+            return False
+        if len(self._queue) >= self.max_size:
+            if self.policy == "disconnect":
+                print(f"[WebSocket] 客户端发送队列已满({self.max_size})，断开连接")
+                self.overflowed = True
+                self.close(code=1013)
+                return False
+            if self.policy == "coalesce":
+                merged = self.merge(self._queue[-1], message)
+                if merged is not None and len(merged) <= self.max_frame_bytes:
+                    self._queue[-1] = merged
+                    self.coalesced += 1
+                    return True
+            self._queue.popleft()
+            self.dropped += 1
+        self._queue.append(message)
+        self.max_depth = max(self.max_depth, len(self._queue))
+        self._ready.set()
+        return True
+
+    async def _drain(self) -> None:
+        try:
+            while True:
+                if not self._queue:
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+                message = self._queue.popleft()
+                await self.websocket.send_text(message)
+                self.sent += 1
+                self.bytes_sent += len(message)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"[WebSocket] 发送消息失败: {e}")
+            self.close()
+
+    def close(self, code: Optional[int] = None) -> None:
+        """停止发送并丢弃未发送的消息；提供code时同时关闭WebSocket连接"""
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.clear()
+        if self._task is not asyncio.current_task():
+            self._task.cancel()
+        if code is not None:
+            asyncio.create_task(self._close_websocket(code))
+        if self.on_close is not None:
+            self.on_close(self)
+
+    async def _close_websocket(self, code: int) -> None:
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code), timeout=5)
+        except Exception:
+            pass  # 连接可能已经断开
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "sent": self.sent,
+            "bytes_sent": self.bytes_sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "closed": self.closed,
+            "overflowed": self.overflowed
+        }
@@ -9,7 +9,7 @@ import StartupAnimation from './components/StartupAnimation';
 import ThemeToggle from './components/ThemeToggle';
 
 
-import { sendAgentMessage, getAgentStates, AgentMessage, AgentState } from './utils/api';
+import { sendAgentMessage, getAgentStates, subscribeAgentStates, AgentMessage, AgentState } from './utils/api';
 import { getFilePaths, watchWorkspaceChanges, FileInfo, scanWorkspaceFiles, deleteFile } from './utils/fileSystem';
 import BackendControl from './components/BackendControl';
 
@@ -72,27 +72,16 @@ function App() {
 
 
 
-  // 轮询agent状态
+  // 订阅agent状态变更，替代轮询
     useEffect(() => {
-        let intervalId: NodeJS.Timeout;
-        
-        const pollAgentStates = async () => {
-            try {
-                const states = await getAgentStates();
-                setAgentStates(states);
-            } catch (error) {
-                console.error('获取agent状态失败:', error);
-            }
-        };
-        
-        // 提高轮询频率到1秒，确保状态更新更及时
-        pollAgentStates(); // 立即获取一次
-        intervalId = setInterval(pollAgentStates, 2000);
+        // 先获取一次完整状态，订阅建立后只接收变化
+        getAgentStates().then(setAgentStates).catch(error => {
+            console.error('获取agent状态失败:', error);
+        });
+        const unsubscribe = subscribeAgentStates(setAgentStates);
         
         return () => {
-            if (intervalId) {
-                clearInterval(intervalId);
-            }
+            unsubscribe();
         };
     }, []);
 
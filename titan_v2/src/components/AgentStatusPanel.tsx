@@ -1,5 +1,7 @@
 import React, { useState, useEffect } from 'react';
-import { AgentState } from '../utils/api';
+import { AgentState, AgentMemoryRecord, getAgentMemoryPage } from '../utils/api';
+
+const MEMORY_PAGE_SIZE = 20;
 
 interface AgentStatusPanelProps {
   agentStates: AgentState[];
@@ -8,12 +10,38 @@ interface AgentStatusPanelProps {
 const AgentStatusPanel: React.FC<AgentStatusPanelProps> = ({ agentStates }) => {
   const [selectedAgent, setSelectedAgent] = useState<AgentState | null>(null);
   const [showScrollIndicator, setShowScrollIndicator] = useState(false);
+  const [memoryRecords, setMemoryRecords] = useState<AgentMemoryRecord[]>([]);
+  const [memoryTotal, setMemoryTotal] = useState(0);
+  const [memoryLoading, setMemoryLoading] = useState(false);
 
   // 检查是否需要滚动指示器
   useEffect(() => {
     setShowScrollIndicator(agentStates.length > 6);
   }, [agentStates.length]);
 
+  // 状态中只有记忆摘要，打开详情时按页加载完整记忆
+  const loadMemoryPage = async (agentId: string, offset: number) => {
+    setMemoryLoading(true);
+    try {
+      const page = await getAgentMemoryPage(agentId, offset, MEMORY_PAGE_SIZE);
+      setMemoryRecords(prev => offset === 0 ? page.records : [...prev, ...page.records]);
+      setMemoryTotal(page.total);
+    } catch (error) {
+      console.error('加载agent记忆失败:', error);
+    } finally {
+      setMemoryLoading(false);
+    }
+  };
+
+  const openAgent = (agent: AgentState) => {
+    setSelectedAgent(agent);
+    setMemoryRecords([]);
+    setMemoryTotal(0);
+    if (agent.agentId) {
+      loadMemoryPage(agent.agentId, 0);
+    }
+  };
+
   const getStatusColor = (status: string) => {
     switch (status) {
       case 'idle':
@@ -50,7 +78,7 @@ const AgentStatusPanel: React.FC<AgentStatusPanelProps> = ({ agentStates }) => {
     <div
       key={index}
       className="bg-white dark:bg-zinc-800 rounded-lg p-1 cursor-pointer hover:bg-gray-300 dark:hover:bg-zinc-700 transition-all duration-200 border border-transparent hover:border-gray-400 dark:hover:border-zinc-600 group h-full overflow-hidden"
-      onClick={() => setSelectedAgent(agent)}>
+      onClick={() => openAgent(agent)}>
       <div className="flex items-center justify-between mb-0.5">
         <div className="flex items-center space-x-1.5">
           <div className={`w-1.5 h-1.5 rounded-full ${getStatusColor(agent.status)} animate-pulse-slow`}></div>
@@ -156,9 +184,29 @@ const AgentStatusPanel: React.FC<AgentStatusPanelProps> = ({ agentStates }) => {
             </div>
             
             <div className="p-4 overflow-y-auto flex-1" style={{maxHeight: 'calc(80vh - 200px)', minHeight: '200px'}}>
-              <div className="bg-gray-100 dark:bg-zinc-900 rounded-lg p-4 text-gray-700 dark:text-gray-200 whitespace-pre-wrap text-sm leading-relaxed">
-                {selectedAgent.memory || 'No content available'}
-              </div>
+              {memoryRecords.length > 0 ? (
+                <div className="space-y-2">
+                  {memoryRecords.map(record => (
+                    <div key={record.seq} className="bg-gray-100 dark:bg-zinc-900 rounded-lg p-4 text-gray-700 dark:text-gray-200 whitespace-pre-wrap text-sm leading-relaxed">
+                      <div className="text-xs text-gray-500 dark:text-gray-400 mb-1">#{record.seq + 1} {record.role_name || record.role}</div>
+                      {record.content}
+                    </div>
+                  ))}
+                  {memoryRecords.length < memoryTotal && selectedAgent.agentId && (
+                    <button
+                      onClick={() => loadMemoryPage(selectedAgent.agentId as string, memoryRecords.length)}
+                      disabled={memoryLoading}
+                      className="w-full py-1.5 text-sm text-blue-600 dark:text-blue-400 hover:underline disabled:opacity-50"
+                    >
+                      {memoryLoading ? 'Loading...' : `Load more (${memoryRecords.length}/${memoryTotal})`}
+                    </button>
+                  )}
+                </div>
+              ) : (
+                <div className="bg-gray-100 dark:bg-zinc-900 rounded-lg p-4 text-gray-700 dark:text-gray-200 whitespace-pre-wrap text-sm leading-relaxed">
+                  {memoryLoading ? 'Loading...' : (selectedAgent.memory || 'No content available')}
+                </div>
+              )}
             </div>
             
             <div className="p-4 border-t border-gray-300 dark:border-zinc-600">
@@ -1,7 +1,10 @@
 import React, { useState, useEffect } from 'react';
-import { getFileContent, FileContent } from '../utils/fileSystem';
+import { getFileContent, getCsvPreview, FileContent, CsvPreviewPage } from '../utils/fileSystem';
 import Papa from 'papaparse';
 
+// CSV预览每页行数
+const CSV_PAGE_ROWS = 200;
+
 interface FileViewerProps {
   filePath?: string;
   onClose: () => void;
@@ -14,6 +17,85 @@ const FileViewer: React.FC<FileViewerProps> = ({ filePath, onClose, isDarkMode }
   const [error, setError] = useState<string | null>(null);
   const [csvData, setCsvData] = useState<any[]>([]);
   const [csvHeaders, setCsvHeaders] = useState<string[]>([]);
+  const [loadingMore, setLoadingMore] = useState(false);
+  // 服务端分页预览的当前页；为null时CSV按文本内容在浏览器中解析
+  const [csvPage, setCsvPage] = useState<CsvPreviewPage | null>(null);
+
+  const showCsvPage = (page: CsvPreviewPage) => {
+    setCsvPage(page);
+    setCsvHeaders(page.selected);
+    setCsvData(page.rows.map(row => {
+      const record: Record<string, string> = {};
+      page.selected.forEach((column, index) => {
+        record[column] = row[index];
+      });
+      return record;
+    }));
+  };
+
+  // 翻页或切换显示的列，每次只向后端请求一页
+  const loadCsvPage = async (offset: number, columns?: string[]) => {
+    if (!filePath) {
+      return;
+    }
+    setLoadingMore(true);
+    try {
+      showCsvPage(await getCsvPreview(filePath, Math.max(offset, 0), CSV_PAGE_ROWS, columns));
+    } catch (err) {
+      setError(err instanceof Error ? err.message : 'Failed to load file');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  const toggleCsvColumn = (column: string) => {
+    if (!csvPage) {
+      return;
+    }
+    const selected = csvPage.selected.includes(column)
+      ? csvPage.selected.filter(name => name !== column)
+      : csvPage.columns.filter(name => name === column || csvPage.selected.includes(name));
+    if (selected.length > 0) {
+      loadCsvPage(csvPage.offset, selected);
+    }
+  };
+
+  // 解析CSV数据（分页加载时每次传入已加载的全部内容）
+  const parseCsv = (text: string) => {
+    Papa.parse(text, {
+      header: true,
+      skipEmptyLines: true,
+      complete: (results) => {
+        if (results.data && results.data.length > 0) {
+          setCsvData(results.data as any[]);
+          setCsvHeaders(results.meta.fields || []);
+        }
+      },
+      error: (error: Error) => {
+        setError(`CSV解析错误: ${error.message}`);
+      }
+    });
+  };
+
+  // 大文件只加载了开头一页，按需继续加载下一页
+  const loadMore = async () => {
+    if (!filePath || !fileContent || fileContent.nextOffset === null || fileContent.nextOffset === undefined) {
+      return;
+    }
+    setLoadingMore(true);
+    try {
+      const next = await getFileContent(filePath, { offset: fileContent.nextOffset });
+      const merged = { ...next, content: fileContent.content + next.content };
+      setFileContent(merged);
+      if (merged.extension === 'csv') {
+        parseCsv(merged.content);
+      }
+    } catch (err) {
+      setError(err instanceof Error ? err.message : 'Failed to load file');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
 
   useEffect(() => {
     if (!filePath) {
@@ -21,6 +103,7 @@ const FileViewer: React.FC<FileViewerProps> = ({ filePath, onClose, isDarkMode }
       setError(null);
       setCsvData([]);
       setCsvHeaders([]);
+      setCsvPage(null);
       return;
     }
 
@@ -29,25 +112,31 @@ const FileViewer: React.FC<FileViewerProps> = ({ filePath, onClose, isDarkMode }
       setError(null);
       setCsvData([]);
       setCsvHeaders([]);
+      setCsvPage(null);
       try {
+        // 工作目录中的CSV使用服务端分页预览，不下载整个文件
+        if (filePath.toLowerCase().endsWith('.csv')) {
+          try {
+            const page = await getCsvPreview(filePath, 0, CSV_PAGE_ROWS);
+            setFileContent({
+              content: '',
+              size: page.size,
+              lastModified: page.lastModified,
+              extension: 'csv',
+              metadata: page.metadata
+            });
+            showCsvPage(page);
+            return;
+          } catch (previewError) {
+            console.warn('CSV预览不可用，改为读取文件内容:', previewError);
+          }
+        }
         const content = await getFileContent(filePath);
         setFileContent(content);
         
         // 如果是CSV文件，解析CSV数据
         if (content.extension === 'csv') {
-          Papa.parse(content.content, {
-            header: true,
-            skipEmptyLines: true,
-            complete: (results) => {
-              if (results.data && results.data.length > 0) {
-                setCsvData(results.data as any[]);
-                setCsvHeaders(results.meta.fields || []);
-              }
-            },
-            error: (error: Error) => {
-              setError(`CSV解析错误: ${error.message}`);
-            }
-          });
+          parseCsv(content.content);
         }
       } catch (err) {
         setError(err instanceof Error ? err.message : 'Failed to load file');
@@ -162,6 +251,9 @@ const FileViewer: React.FC<FileViewerProps> = ({ filePath, onClose, isDarkMode }
             {fileContent && (
               <span className="text-xs text-gray-500 dark:text-zinc-500">
                 {fileContent.size} bytes • {fileContent.lastModified.toLocaleString()}
+                {fileContent.metadata?.encoding && ` • ${fileContent.metadata.encoding}`}
+                {fileContent.metadata?.delimiter && ` • 分隔符 ${JSON.stringify(fileContent.metadata.delimiter)}`}
+                {fileContent.metadata?.lineEnding && ` • ${fileContent.metadata.lineEnding === '\r\n' ? 'CRLF' : fileContent.metadata.lineEnding === '\r' ? 'CR' : 'LF'}`}
               </span>
             )}
             <button
@@ -198,6 +290,43 @@ const FileViewer: React.FC<FileViewerProps> = ({ filePath, onClose, isDarkMode }
 
           {fileContent && !loading && !error && (
             <div className="h-full overflow-auto">
+              {csvPage && (
+                <div className="p-3 border-b border-gray-200 dark:border-zinc-700 space-y-2 text-xs text-gray-600 dark:text-zinc-400">
+                  <div className="flex flex-wrap gap-1">
+                    {csvPage.columns.map(column => (
+                      <button
+                        key={column}
+                        onClick={() => toggleCsvColumn(column)}
+                        className={`px-2 py-0.5 rounded ${csvPage.selected.includes(column)
+                          ? 'bg-blue-100 text-blue-700 dark:bg-blue-900 dark:text-blue-200'
+                          : 'bg-gray-100 text-gray-500 dark:bg-zinc-800 dark:text-zinc-500'}`}
+                      >
+                        {column}
+                      </button>
+                    ))}
+                  </div>
+                  <div className="flex items-center space-x-3">
+                    <span>
+                      第 {csvPage.totalRows === 0 ? 0 : csvPage.offset + 1}-{csvPage.offset + csvPage.rows.length} 行 / 共 {csvPage.totalRows} 行
+                      {csvPage.skippedRows > 0 && `（跳过 ${csvPage.skippedRows} 行列数不一致的数据）`}
+                    </span>
+                    <button
+                      onClick={() => loadCsvPage(csvPage.offset - CSV_PAGE_ROWS, csvPage.selected)}
+                      disabled={loadingMore || csvPage.offset === 0}
+                      className="px-2 py-0.5 rounded bg-gray-100 dark:bg-zinc-800 disabled:opacity-50"
+                    >
+                      上一页
+                    </button>
+                    <button
+                      onClick={() => loadCsvPage(csvPage.offset + CSV_PAGE_ROWS, csvPage.selected)}
+                      disabled={loadingMore || csvPage.offset + csvPage.rows.length >= csvPage.totalRows}
+                      className="px-2 py-0.5 rounded bg-gray-100 dark:bg-zinc-800 disabled:opacity-50"
+                    >
+                      下一页
+                    </button>
+                  </div>
+                </div>
+              )}
               {fileContent.extension === 'csv' && csvData.length > 0 ? (
                 <CSVTable data={csvData} headers={csvHeaders} />
               ) : (
@@ -205,6 +334,18 @@ const FileViewer: React.FC<FileViewerProps> = ({ filePath, onClose, isDarkMode }
                   {fileContent.content}
                 </pre>
               )}
+              {fileContent.nextOffset !== null && fileContent.nextOffset !== undefined && (
+                <div className="p-3 flex items-center justify-center space-x-3 text-xs text-gray-500 dark:text-zinc-400">
+                  <span>已加载 {fileContent.nextOffset} / {fileContent.size} bytes</span>
+                  <button
+                    onClick={loadMore}
+                    disabled={loadingMore}
+                    className="px-3 py-1 rounded bg-gray-100 dark:bg-zinc-800 hover:bg-gray-200 dark:hover:bg-zinc-700 disabled:opacity-50"
+                  >
+                    {loadingMore ? '加载中...' : '加载更多'}
+                  </button>
+                </div>
+              )}
             </div>
           )}
         </div>
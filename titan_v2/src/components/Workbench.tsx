@@ -14,12 +14,16 @@ interface WorkbenchProps {
 
 const Workbench: React.FC<WorkbenchProps> = ({ output, realtimeOutput, onAddMessage }) => {
   const [titanOutput, setTitanOutput] = useState<OutputMessage[]>([]);
+  // 正在流式生成的回复（[TOKEN]增量），完整回复到达后清除
+  const [streamingOutput, setStreamingOutput] = useState<{ label: string; content: string } | null>(null);
   const [isConnected, setIsConnected] = useState(false);
   const [fontSize, setFontSize] = useState<'small' | 'medium' | 'large'>('medium');
   const wsRef = useRef<WebSocket | null>(null);
   const outputEndRef = useRef<HTMLDivElement>(null);
   const messageBufferRef = useRef<string[]>([]);
   const bufferTimerRef = useRef<NodeJS.Timeout | null>(null);
+  // 已收到的最大事件序号，重连时据此补发断线期间的输出
+  const lastSeqRef = useRef<number | null>(null);
 
   // 字体大小映射
   const fontSizeClasses = {
@@ -31,13 +35,74 @@ const Workbench: React.FC<WorkbenchProps> = ({ output, realtimeOutput, onAddMess
   // 自动滚动到底部
   useEffect(() => {
     outputEndRef.current?.scrollIntoView({ behavior: 'smooth' });
-  }, [titanOutput]);
+  }, [titanOutput, streamingOutput]);
 
-  // WebSocket连接
+  // WebSocket连接：接收带序号的JSON事件，断线后带resume_from重连补发
   useEffect(() => {
+    let closed = false;
+    let retryTimer: NodeJS.Timeout | null = null;
+
+    const appendText = (text: string) => {
+      // 将消息添加到缓冲区
+      messageBufferRef.current.push(text);
+      
+      // 清除之前的定时器
+      if (bufferTimerRef.current) {
+        clearTimeout(bufferTimerRef.current);
+      }
+      
+      // 设置新的定时器，将短时间内的消息合并为一个输出
+      bufferTimerRef.current = setTimeout(() => {
+        if (messageBufferRef.current.length > 0) {
+          const combinedMessage = messageBufferRef.current.join('\n');
+          const newOutput: OutputMessage = {
+            id: Date.now().toString(),
+            content: combinedMessage,
+            timestamp: new Date()
+          };
+          
+          setTitanOutput(prev => [...prev, newOutput]);
+          messageBufferRef.current = [];
+        }
+      }, 100); // 100ms内合并消息
+    };
+
+    const handleEvent = (event: any) => {
+      if (event.kind === 'replay') {
+        // 完整重放（新客户端或服务端已开始新的运行）时清空已有输出
+        if (event.payload.reset) {
+          setTitanOutput([]);
+          setStreamingOutput(null);
+          messageBufferRef.current = [];
+        }
+        return;
+      }
+      if (typeof event.seq === 'number') {
+        lastSeqRef.current = Math.max(lastSeqRef.current ?? 0, event.seq);
+      }
+      // token增量直接追加到流式输出，不进入合并缓冲区
+      if (event.kind === 'token') {
+        const label = `${event.agent} · round ${event.round}`;
+        const delta = event.payload.delta || '';
+        setStreamingOutput(prev => (prev && prev.label === label)
+          ? { label, content: prev.content + delta }
+          : { label, content: delta });
+        return;
+      }
+      // 该agent本轮的完整回复到达后才移除流式输出；运行结束（含取消）时一并清除，其他事件（stderr、日志等）不影响
+      if (event.kind === 'message') {
+        const label = `${event.agent} · round ${event.round}`;
+        setStreamingOutput(prev => (prev && prev.label === label) ? null : prev);
+      } else if (event.kind === 'task_end') {
+        setStreamingOutput(null);
+      }
+      appendText(event.payload.text ?? '');
+    };
+
     const connectWebSocket = () => {
       try {
-        const ws = new WebSocket('ws://localhost:8000/ws/titan-output');
+        const resume = lastSeqRef.current !== null ? `&resume_from=${lastSeqRef.current}` : '';
+        const ws = new WebSocket(`ws://localhost:8000/ws/titan-output?format=events${resume}`);
         wsRef.current = ws;
 
         ws.onopen = () => {
@@ -45,36 +110,26 @@ const Workbench: React.FC<WorkbenchProps> = ({ output, realtimeOutput, onAddMess
           setIsConnected(true);
         };
 
-        ws.onmessage = (event) => {
-          const message = event.data;
-          
-          // 将消息添加到缓冲区
-          messageBufferRef.current.push(message);
-          
-          // 清除之前的定时器
-          if (bufferTimerRef.current) {
-            clearTimeout(bufferTimerRef.current);
-          }
-          
-          // 设置新的定时器，将短时间内的消息合并为一个输出
-          bufferTimerRef.current = setTimeout(() => {
-            if (messageBufferRef.current.length > 0) {
-              const combinedMessage = messageBufferRef.current.join('\n');
-              const newOutput: OutputMessage = {
-                id: Date.now().toString(),
-                content: combinedMessage,
-                timestamp: new Date()
-              };
-              
-              setTitanOutput(prev => [...prev, newOutput]);
-              messageBufferRef.current = [];
+        ws.onmessage = (message) => {
+          // 一帧可能包含多个事件（合并帧、重连补发帧），以换行分隔
+          (message.data as string).split('\n').forEach(line => {
+            if (!line) {
+              return;
+            }
+            try {
+              handleEvent(JSON.parse(line));
+            } catch (error) {
+              console.error('解析输出事件失败:', error);
             }
-          }, 100); // 100ms内合并消息
+          });
         };
 
         ws.onclose = () => {
           console.log('WebSocket连接已关闭');
           setIsConnected(false);
+          if (!closed) {
+            retryTimer = setTimeout(connectWebSocket, 2000);
+          }
         };
 
         ws.onerror = (error) => {
@@ -91,6 +146,10 @@ const Workbench: React.FC<WorkbenchProps> = ({ output, realtimeOutput, onAddMess
 
     // 清理函数
     return () => {
+      closed = true;
+      if (retryTimer) {
+        clearTimeout(retryTimer);
+      }
       if (wsRef.current) {
         wsRef.current.close();
       }
@@ -175,7 +234,7 @@ const Workbench: React.FC<WorkbenchProps> = ({ output, realtimeOutput, onAddMess
       </div>
       
       <div className="fixed-height-content p-3 custom-scrollbar" style={{ flex: '1 1 auto', minHeight: '0', overflow: 'auto' }}>
-        {titanOutput.length === 0 ? (
+        {titanOutput.length === 0 && !streamingOutput ? (
           <div className="flex flex-col items-center justify-center h-full text-gray-600">
             <svg className="w-10 h-10 mb-2" fill="none" stroke="currentColor" viewBox="0 0 24 24" xmlns="http://www.w3.org/2000/svg">
               <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M19 11H5m14 0a2 2 0 012 2v6a2 2 0 01-2 2H5a2 2 0 01-2-2v-6a2 2 0 012-2m14 0V9a2 2 0 00-2-2M5 11V9a2 2 0 012-2m0 0V5a2 2 0 012-2h6a2 2 0 012 2v2M7 7h10" />
@@ -194,6 +253,16 @@ const Workbench: React.FC<WorkbenchProps> = ({ output, realtimeOutput, onAddMess
                 </div>
               </div>
             ))}
+            {streamingOutput && (
+              <div className="bg-white dark:bg-zinc-800 border border-blue-400 dark:border-blue-600 rounded-lg p-4 shadow-sm">
+                <div className={`font-mono ${fontSizeClasses[fontSize]} text-gray-700 dark:text-gray-200 whitespace-pre-wrap break-words mb-3`}>
+                  {streamingOutput.content}
+                </div>
+                <div className="flex justify-end">
+                  <span className={`text-xs ${fontSizeClasses[fontSize]} text-blue-600`}>{streamingOutput.label}</span>
+                </div>
+              </div>
+            )}
             <div ref={outputEndRef} />
           </div>
         )}
@@ -7,7 +7,27 @@ export interface AgentMessage {
 export interface AgentState {
   name: string;
   status: "idle" | "thinking" | "speaking" | "working" | "waiting";
-  memory: string;
+  memory: string;  // 记忆摘要，完整记忆通过getAgentMemoryPage分页读取
+  agentId?: string;
+  memorySize?: number;
+  memoryRecords?: number;
+}
+
+export interface AgentMemoryRecord {
+  seq: number;
+  role_name: string;
+  role: string;
+  content: string;
+}
+
+export interface AgentMemoryPage {
+  agent_id: string;
+  offset: number;
+  limit: number;
+  total: number;
+  memory_size: number;
+  memory_digest: string;
+  records: AgentMemoryRecord[];
 }
 
 export interface AgentResponse {
@@ -19,21 +39,110 @@ export interface AgentResponse {
 
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000';
 
-// 上传文件到工作区
-export async function uploadFile(file: File): Promise<{ filename: string; path: string; size: number }> {
-  const formData = new FormData();
-  formData.append('file', file);
-  
-  const response = await fetch(`${API_BASE_URL}/api/upload`, {
+export interface UploadResult {
+  filename: string;
+  path: string;
+  size: number;
+  sha256?: string;
+  deduplicated?: boolean;
+}
+
+// 不超过该大小的文件在浏览器中先计算sha256，服务端已有相同内容时无需上传
+const CLIENT_HASH_MAX_BYTES = 256 * 1024 * 1024;
+const UPLOAD_MAX_RETRIES = 5;
+
+async function sha256Hex(file: File): Promise<string | undefined> {
+  if (file.size > CLIENT_HASH_MAX_BYTES || !window.crypto || !window.crypto.subtle) {
+    return undefined;
+  }
+  const digest = await window.crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+  return Array.from(new Uint8Array(digest)).map(byte => ('0' + byte.toString(16)).slice(-2)).join('');
+}
+
+// 未完成上传的upload_id保存在localStorage中，同一文件再次上传（包括刷新页面后）时续传
+function uploadResumeKey(file: File): string {
+  return `titan-upload:${file.name}:${file.size}:${file.lastModified}`;
+}
+
+// 上传文件到工作区：分块上传，连接中断后从服务端已接收的offset续传
+export async function uploadFile(
+  file: File,
+  onProgress?: (uploaded: number, total: number) => void
+): Promise<UploadResult> {
+  const resumeKey = uploadResumeKey(file);
+  const initResponse = await fetch(`${API_BASE_URL}/api/uploads`, {
     method: 'POST',
-    body: formData,
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify({
+      filename: file.name,
+      size: file.size,
+      sha256: await sha256Hex(file),
+      upload_id: localStorage.getItem(resumeKey) || undefined,
+    }),
   });
-  
-  if (!response.ok) {
-    throw new Error(`文件上传失败: ${response.statusText}`);
+
+  if (!initResponse.ok) {
+    throw new Error(`文件上传失败: ${initResponse.statusText}`);
   }
-  
-  return response.json();
+
+  const upload = await initResponse.json();
+  if (upload.status === 'complete') {
+    localStorage.removeItem(resumeKey);
+    onProgress?.(file.size, file.size);
+    return upload;
+  }
+  localStorage.setItem(resumeKey, upload.upload_id);
+
+  let offset: number = upload.offset;
+  let failures = 0;
+  while (offset < file.size) {
+    let response: Response;
+    try {
+      response = await fetch(`${API_BASE_URL}/api/uploads/${upload.upload_id}?offset=${offset}`, {
+        method: 'PUT',
+        body: file.slice(offset, offset + upload.chunk_size),
+      });
+    } catch (error) {
+      failures += 1;
+      if (failures > UPLOAD_MAX_RETRIES) {
+        throw error;
+      }
+      await new Promise(resolve => setTimeout(resolve, 1000 * failures));
+      // 连接中断：以服务端已接收的offset为准继续
+      try {
+        const status = await fetch(`${API_BASE_URL}/api/uploads/${upload.upload_id}`);
+        if (status.ok) {
+          offset = (await status.json()).offset;
+        }
+      } catch (statusError) {
+        console.warn('获取上传状态失败:', statusError);
+      }
+      continue;
+    }
+
+    if (response.status === 409) {
+      // 本地offset与服务端不一致（例如上一个分块实际已写入）
+      offset = (await response.json()).detail.offset;
+      continue;
+    }
+    if (!response.ok) {
+      throw new Error(`文件上传失败: ${response.statusText}`);
+    }
+    offset = (await response.json()).offset;
+    failures = 0;
+    onProgress?.(offset, file.size);
+  }
+
+  const completeResponse = await fetch(`${API_BASE_URL}/api/uploads/${upload.upload_id}/complete`, {
+    method: 'POST',
+  });
+  if (!completeResponse.ok) {
+    throw new Error(`文件上传失败: ${completeResponse.statusText}`);
+  }
+  localStorage.removeItem(resumeKey);
+  return completeResponse.json();
 }
 
 // 发送消息给Agent（包含文件上传）
@@ -91,6 +200,112 @@ export async function getAgentStates(): Promise<AgentState[]> {
   return data.agentStates;
 }
 
+// 按记录分页读取agent记忆
+export async function getAgentMemoryPage(agentId: string, offset = 0, limit = 20): Promise<AgentMemoryPage> {
+  const response = await fetch(`${API_BASE_URL}/api/agent-states/${encodeURIComponent(agentId)}/memory?offset=${offset}&limit=${limit}`);
+
+  if (!response.ok) {
+    throw new Error(`获取agent记忆失败: ${response.statusText}`);
+  }
+
+  return response.json();
+}
+
+// agent状态推送：订阅一次，之后只接收变化的字段
+interface AgentStateRecord {
+  agent_id: string;
+  name: string;
+  role_name: string;
+  status: AgentState["status"];
+  memory: string;
+  memory_digest: string;
+  memory_size: number;
+  memory_records: number;
+}
+
+interface AgentStateChange extends Partial<AgentStateRecord> {
+  version: number;
+  agent_id: string;
+  op: "upsert" | "update" | "clear";
+}
+
+type AgentStateMessage =
+  | { type: "agent_state_snapshot"; version: number; agents: AgentStateRecord[] }
+  | { type: "agent_state_diff"; version: number; changes: AgentStateChange[] };
+
+// 订阅agent状态变更，断线后按已有版本重连追赶；返回取消订阅函数
+export function subscribeAgentStates(onStates: (states: AgentState[]) => void): () => void {
+  const agents = new Map<string, AgentStateRecord>();
+  let version = -1;
+  let socket: WebSocket | null = null;
+  let retryTimer: NodeJS.Timeout | null = null;
+  let closed = false;
+
+  const publish = () => {
+    onStates(Array.from(agents.values()).map(agent => ({
+      name: agent.role_name,
+      status: agent.status,
+      memory: agent.memory,
+      agentId: agent.agent_id,
+      memorySize: agent.memory_size,
+      memoryRecords: agent.memory_records
+    })));
+  };
+
+  const applyChange = (change: AgentStateChange) => {
+    if (change.version <= version) {
+      return;  // 重复的变更
+    }
+    version = change.version;
+    if (change.op === "clear") {
+      agents.clear();
+      return;
+    }
+    const current = agents.get(change.agent_id);
+    const next = { ...(current || { memory: "", memory_digest: "", memory_size: 0, memory_records: 0 }) } as AgentStateRecord;
+    if (change.agent_id !== undefined) next.agent_id = change.agent_id;
+    if (change.name !== undefined) next.name = change.name;
+    if (change.role_name !== undefined) next.role_name = change.role_name;
+    if (change.status !== undefined) next.status = change.status;
+    if (change.memory !== undefined) next.memory = change.memory;
+    if (change.memory_digest !== undefined) next.memory_digest = change.memory_digest;
+    if (change.memory_size !== undefined) next.memory_size = change.memory_size;
+    if (change.memory_records !== undefined) next.memory_records = change.memory_records;
+    agents.set(change.agent_id, next);
+  };
+
+  const connect = () => {
+    const wsUrl = API_BASE_URL.replace(/^http/, 'ws');
+    socket = new WebSocket(`${wsUrl}/ws/agent-states${version >= 0 ? `?since=${version}` : ''}`);
+    socket.onmessage = (event) => {
+      const message: AgentStateMessage = JSON.parse(event.data);
+      if (message.type === "agent_state_snapshot") {
+        agents.clear();
+        message.agents.forEach(agent => agents.set(agent.agent_id, agent));
+        version = message.version;
+      } else {
+        message.changes.forEach(applyChange);
+        version = Math.max(version, message.version);
+      }
+      publish();
+    };
+    socket.onclose = () => {
+      if (!closed) {
+        retryTimer = setTimeout(connect, 2000);
+      }
+    };
+  };
+
+  connect();
+  return () => {
+    closed = true;
+    if (retryTimer) {
+      clearTimeout(retryTimer);
+    }
+    socket?.close();
+  };
+}
+
 
 
 // 保留mock函数用于测试
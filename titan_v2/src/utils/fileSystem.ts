@@ -63,17 +63,51 @@ export const watchWorkspaceChanges = (callback: (files: FileInfo[]) => void) =>
   return () => clearInterval(interval);
 };
 
+// 服务端按文件版本缓存的元数据（编码、换行符、分隔符、表头）
+export interface FileMetadata {
+  encoding: string | null;
+  lineEnding: string | null;
+  delimiter: string | null;
+  hasHeader: boolean | null;
+}
+
+const toFileMetadata = (data: any): FileMetadata | undefined => data ? {
+  encoding: data.encoding,
+  lineEnding: data.line_ending,
+  delimiter: data.delimiter,
+  hasHeader: data.has_header
+} : undefined;
+
 // 获取文件内容
 export interface FileContent {
   content: string;
   size: number;
   lastModified: Date;
   extension: string;
+  encoding?: string;
+  metadata?: FileMetadata;
+  // 只返回了文件的一部分，nextOffset为下一页的起始字节（已到末尾时为null）
+  truncated?: boolean;
+  nextOffset?: number | null;
+}
+
+// offset: 从该字节开始读取一页（默认从头）；tail: 只读取最后N行
+export interface FileRangeOptions {
+  offset?: number;
+  tail?: number;
 }
 
-export const getFileContent = async (filePath: string): Promise<FileContent> => {
+export const getFileContent = async (filePath: string, options: FileRangeOptions = {}): Promise<FileContent> => {
   try {
-    const response = await fetch(`${API_BASE_URL}/api/file/${encodeURIComponent(filePath)}`);
+    const params = new URLSearchParams();
+    if (options.offset !== undefined) {
+      params.set('offset', String(options.offset));
+    }
+    if (options.tail !== undefined) {
+      params.set('tail', String(options.tail));
+    }
+    const query = params.toString() ? `?${params.toString()}` : '';
+    const response = await fetch(`${API_BASE_URL}/api/file/${encodeURIComponent(filePath)}${query}`);
     if (!response.ok) {
       throw new Error(`Failed to fetch file: ${response.statusText}`);
     }
@@ -86,7 +120,11 @@ export const getFileContent = async (filePath: string): Promise<FileContent> =>
       content: data.content,
       size: data.size || 0,
       lastModified: data.lastModified ? new Date(data.lastModified) : new Date(),
-      extension: extension.toLowerCase()
+      extension: extension.toLowerCase(),
+      encoding: data.encoding,
+      metadata: toFileMetadata(data.metadata),
+      truncated: data.truncated,
+      nextOffset: data.next_offset
     };
   } catch (error) {
     console.error('Error fetching file content:', error);
@@ -94,6 +132,47 @@ export const getFileContent = async (filePath: string): Promise<FileContent> =>
   }
 };
 
+// CSV分页预览（仅限工作目录中的文件）
+export interface CsvPreviewPage {
+  columns: string[];
+  selected: string[];
+  rows: string[][];
+  offset: number;
+  limit: number;
+  totalRows: number;
+  skippedRows: number;
+  metadata?: FileMetadata;
+  size: number;
+  lastModified: Date;
+}
+
+export const getCsvPreview = async (
+  filePath: string,
+  offset: number,
+  limit: number,
+  columns?: string[]
+): Promise<CsvPreviewPage> => {
+  const params = new URLSearchParams({ offset: String(offset), limit: String(limit) });
+  (columns || []).forEach(column => params.append('columns', column));
+  const response = await fetch(`${API_BASE_URL}/api/preview/${encodeURIComponent(filePath)}?${params.toString()}`);
+  if (!response.ok) {
+    throw new Error(`Failed to preview file: ${response.statusText}`);
+  }
+  const data = await response.json();
+  return {
+    columns: data.columns,
+    selected: data.selected,
+    rows: data.rows,
+    offset: data.offset,
+    limit: data.limit,
+    totalRows: data.total_rows,
+    skippedRows: data.skipped_rows || 0,
+    metadata: toFileMetadata(data.metadata),
+    size: data.size || 0,
+    lastModified: data.lastModified ? new Date(data.lastModified) : new Date()
+  };
+};
+
 // 删除文件
 export const deleteFile = async (filePath: string): Promise<void> => {
   try {
@@ -127,15 +206,14 @@ export const listFiles = async (directoryPath: string): Promise<string[]> => {
   }
 };
 
-// 读取文件内容
+// 读取完整文件内容（编辑后会整体写回，因此使用流式接口而不是分页接口）
 export const readFile = async (filePath: string): Promise<string> => {
   try {
-    const response = await fetch(`${API_BASE_URL}/api/file/${encodeURIComponent(filePath)}`);
+    const response = await fetch(`${API_BASE_URL}/api/file/${encodeURIComponent(filePath)}?stream=true`);
     if (!response.ok) {
       throw new Error(`Failed to read file: ${response.statusText}`);
     }
-    const data = await response.json();
-    return data.content || '';
+    return await response.text();
   } catch (error) {
     console.error('Error reading file:', error);
     throw error;